@@ -1,6 +1,8 @@
 import ctypes
 from ctypes import create_string_buffer
 
+from discovery import parse_search_reply
+
 def buscar_dispositivos():
     """
     Busca dispositivos ZKTeco en la red local usando SearchDevice.
@@ -21,9 +23,9 @@ def buscar_dispositivos():
         if ret > 0:
             print(f"Se encontraron {ret} dispositivos:")
             # Decodificar el buffer y mostrar los resultados
-            devices = dev_buf.value.decode('utf-8').strip().split("\r\n")
+            devices = parse_search_reply(dev_buf.value.decode('utf-8', errors='ignore'))
             for i, device in enumerate(devices, 1):
-                print(f"Dispositivo {i}: {device}")
+                print(f"Dispositivo {i}: MAC={device.mac} IP={device.ip} SN={device.serial} Tipo={device.device_type}")
         else:
             print("No se encontraron dispositivos en la red.")
     
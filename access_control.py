@@ -0,0 +1,59 @@
+"""
+Apertura controlada por el host: evento de tarjeta -> decisión local -> ControlDevice.
+
+Se usa como callback de la bomba de eventos (ZKTecoDevice.start_event_pump),
+de modo que la puerta se abre apenas llega el evento de GetRTLog, con la
+decisión tomada en el caché de autorizaciones local. Con un Tracer (tracing),
+los eventos muestreados agregan los tramos authorize y control.
+"""
+import time
+
+from rtlog_parser import DOOR_STATUS_EVENT
+
+
+class AccessController:
+    """Decide y abre la puerta para cada evento de tarjeta recibido"""
+
+    def __init__(self, device, cache, open_seconds=5, journal=None, device_id=0, dedup=None, tracer=None):
+        self.device = device
+        self.cache = cache
+        self.open_seconds = open_seconds
+        self.journal = journal  # EventJournal opcional donde se guarda cada evento recibido
+        self.device_id = device_id
+        self.dedup = dedup  # CardDeduplicator opcional: descarta el mismo acercamiento leído dos veces
+        self.tracer = tracer  # Tracer opcional: tramos por etapa de los eventos muestreados
+        self.stats = {"granted": 0, "denied": 0, "open_errors": 0, "decision_total": 0.0}
+
+    def handle_event(self, event):
+        """Procesa un RTLogEvent. Devuelve True/False según la decisión, o None si no es de tarjeta (o es duplicado)"""
+        if self.journal is not None:
+            self.journal.append_event(event, self.device_id)
+        if not event.card or event.event_type == DOOR_STATUS_EVENT:
+            return None
+        if self.dedup is not None and not self.dedup.accept_event(event, self.device_id):
+            return None
+        trace = self.tracer.current() if self.tracer is not None else None
+        start = time.perf_counter()
+        granted = self.cache.is_allowed(event.card, event.door)
+        decided = time.perf_counter()
+        self.stats["decision_total"] += decided - start
+        if trace is not None:
+            trace.add("authorize", start, decided)
+        if not granted:
+            self.stats["denied"] += 1
+            print(f"Acceso denegado: tarjeta {event.card}, puerta {event.door}")
+            return False
+        self.stats["granted"] += 1
+        opened = self.device.control_device(operation_id=1, door_id=event.door, index=1, state=self.open_seconds)
+        if trace is not None:
+            trace.add("control", decided, time.perf_counter())
+        if not opened:
+            self.stats["open_errors"] += 1
+        return True
+
+    def start(self):
+        """Inicia la bomba de eventos del dispositivo con este controlador como callback"""
+        if self.tracer is not None:
+            return self.device.start_event_pump(callback=self.handle_event, tracer=self.tracer,
+                                                device_id=self.device_id)
+        return self.device.start_event_pump(callback=self.handle_event)
@@ -0,0 +1,112 @@
+"""
+API asyncio para ZKTecoDevice.
+
+Las llamadas bloqueantes de ctypes se ejecutan fuera del event loop (en el
+executor por defecto) y se serializan por handle con un asyncio.Lock, ya que
+los handles de PullSDK no son reentrantes. Así un Connect con timeout=4000
+no congela el resto del gateway.
+"""
+import asyncio
+import functools
+import time
+from ctypes import byref, create_string_buffer
+
+from molinete_test import ZKTecoDevice
+from rtlog_pump import AdaptiveBackoff, RTLogPump
+
+
+class AsyncZKTecoDevice:
+    """Versión asíncrona de ZKTecoDevice con los mismos métodos"""
+
+    def __init__(self, commpro=None, device=None, executor=None):
+        self.device = device or ZKTecoDevice(commpro=commpro)
+        self.executor = executor  # None usa el executor por defecto del loop
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self):
+        return self.device.connected
+
+    async def _call(self, fn, *args, **kwargs):
+        """Ejecuta fn en un hilo, de a una llamada por handle"""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def connect(self, ip_address="192.168.0.201", port=14370, timeout=4000, password=""):
+        return await self._call(self.device.connect, ip_address, port, timeout, password)
+
+    async def disconnect(self):
+        return await self._call(self.device.disconnect)
+
+    async def get_device_info(self):
+        return await self._call(self.device.get_device_info)
+
+    async def control_device(self, operation_id=1, door_id=1, index=1, state=3):
+        return await self._call(self.device.control_device, operation_id, door_id, index, state)
+
+    async def test_device_communication(self):
+        return await self._call(self.device.test_device_communication)
+
+    async def read_card(self, timeout=10):
+        """Espera una tarjeta sin retener el handle entre consultas, para que otras llamadas se intercalen"""
+        if not self.device.connected:
+            print("No hay conexión activa")
+            return None
+
+        device = self.device
+        pump = RTLogPump(device.commpro, device.hcommpro)
+        backoff = AdaptiveBackoff()
+        card_buffer = create_string_buffer(64)
+
+        def poll():
+            if device.commpro.GetHIDEventCardNumAsStr(byref(card_buffer)):
+                card_number = card_buffer.value.decode('utf-8', errors='ignore').strip()
+                if card_number and card_number != "0":
+                    return card_number, True
+            events = pump.drain()
+            for event in events:
+                if event.card:
+                    return event.card, True
+            return None, bool(events)
+
+        await self._call(device._clear_previous_events)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                card_number, busy = await self._call(poll)
+            except Exception:
+                card_number, busy = None, False
+            if card_number:
+                print(f"Tarjeta RFID detectada: {card_number}")
+                return card_number
+            await asyncio.sleep(backoff.next(busy))
+
+        print(f"Tiempo de espera agotado ({timeout} segundos). No se detectó ninguna tarjeta RFID.")
+        return None
+
+
+async def _demo(devices=10, latency=0.5):
+    """Conecta varios dispositivos lentos mientras se mide que el loop sigue respondiendo"""
+    from fake_commpro import FakeCommpro
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    handles = [AsyncZKTecoDevice(commpro=FakeCommpro(latency=latency)) for _ in range(devices)]
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(handle.connect() for handle in handles))
+    elapsed = time.perf_counter() - start
+    tick_task.cancel()
+    print(f"{sum(results)}/{devices} conexiones en {elapsed:.2f} s "
+          f"(latencia simulada {latency} s c/u); el loop atendió {ticks} ticks de 10 ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
@@ -0,0 +1,228 @@
+"""
+Caché local de autorizaciones de tarjetas para apertura controlada por el host.
+
+Se carga desde las tablas user y userauthorize del dispositivo y responde en
+O(1) (una búsqueda en dict) si una tarjeta puede pasar por una puerta, sin
+consultar al dispositivo ni a una base remota en cada lectura.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+from device_tables import iter_table_rows
+
+ALL_DOORS = 0xF  # Máscara de bits: puertas 1 a 4
+
+
+class CardGrant(NamedTuple):
+    pin: str
+    doors: int  # Máscara de bits de puertas autorizadas (bit 0 = puerta 1)
+    start: int  # Vigencia AAAAMMDD, 0 = sin límite
+    end: int
+
+
+def normalize_card(card):
+    """Número de tarjeta como int (sin guiones, espacios ni ceros a la izquierda), o None"""
+    if card is None:
+        return None
+    if isinstance(card, int):
+        return card or None
+    card = str(card).strip().replace("-", "")
+    if not card.isdigit():
+        return None
+    return int(card) or None
+
+
+def _to_date(value):
+    """Convierte la vigencia de la tabla user a AAAAMMDD (0 = sin límite)"""
+    value = (value or "").strip()
+    if not value.isdigit():
+        return 0
+    return int(value[:8])
+
+
+def _today():
+    return int(datetime.now().strftime("%Y%m%d"))
+
+
+class CardAuthCache:
+    """Índice tarjeta -> autorización con actualizaciones incrementales y hooks de invalidación"""
+
+    def __init__(self):
+        self._grants = {}  # int(tarjeta) -> CardGrant
+        self._cards_by_pin = {}  # pin -> set(tarjetas)
+        self._hooks = []
+        self._lock = threading.Lock()  # Solo para escrituras; las lecturas no bloquean
+        self._today = _today()
+        self._today_expires = 0.0
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._grants)
+
+    def add_invalidation_hook(self, hook):
+        """Registra hook(card) que se llama cuando cambia una tarjeta (None = se vació el caché)"""
+        self._hooks.append(hook)
+
+    def _notify(self, card):
+        for hook in self._hooks:
+            try:
+                hook(card)
+            except Exception as e:
+                print(f"Error en hook de invalidación: {e}")
+
+    def upsert(self, card, pin="", doors=ALL_DOORS, start=0, end=0):
+        """Agrega o actualiza una tarjeta"""
+        key = normalize_card(card)
+        if key is None:
+            return False
+        pin = str(pin)
+        with self._lock:
+            previous = self._grants.get(key)
+            if previous and previous.pin != pin:
+                self._cards_by_pin.get(previous.pin, set()).discard(key)
+            self._grants[key] = CardGrant(pin, doors, start, end)
+            self._cards_by_pin.setdefault(pin, set()).add(key)
+        self._notify(key)
+        return True
+
+    def remove(self, card):
+        """Quita una tarjeta del caché"""
+        key = normalize_card(card)
+        with self._lock:
+            grant = self._grants.pop(key, None)
+            if grant:
+                self._cards_by_pin.get(grant.pin, set()).discard(key)
+        if grant:
+            self._notify(key)
+        return grant is not None
+
+    def remove_pin(self, pin):
+        """Quita todas las tarjetas de un usuario"""
+        with self._lock:
+            cards = self._cards_by_pin.pop(str(pin), set())
+            for key in cards:
+                self._grants.pop(key, None)
+        for key in cards:
+            self._notify(key)
+        return len(cards)
+
+    def set_doors(self, pin, doors):
+        """Actualiza las puertas autorizadas de todas las tarjetas de un usuario"""
+        pin = str(pin)
+        with self._lock:
+            cards = list(self._cards_by_pin.get(pin, ()))
+            for key in cards:
+                self._grants[key] = self._grants[key]._replace(doors=doors)
+        for key in cards:
+            self._notify(key)
+
+    def snapshot(self):
+        """Copia de las autorizaciones {tarjeta: CardGrant}, para cargarla en otro proceso con load_grants"""
+        with self._lock:
+            return dict(self._grants)
+
+    def load_grants(self, grants):
+        """Reemplaza el contenido con un snapshot() (de este u otro caché)"""
+        cards_by_pin = {}
+        for key, grant in grants.items():
+            cards_by_pin.setdefault(grant.pin, set()).add(key)
+        with self._lock:
+            self._grants = dict(grants)
+            self._cards_by_pin = cards_by_pin
+            self.loaded_at = time.time()
+        self._notify(None)
+        return len(grants)
+
+    def clear(self):
+        with self._lock:
+            self._grants = {}
+            self._cards_by_pin = {}
+        self._notify(None)
+
+    def is_allowed(self, card, door=1):
+        """Decide en O(1) si la tarjeta puede pasar por la puerta indicada (puertas desde 1)"""
+        grant = self._grants.get(card if type(card) is int else normalize_card(card))
+        if grant is None or door < 1 or not grant.doors >> (door - 1) & 1:
+            return False
+        if grant.start or grant.end:
+            now = time.monotonic()
+            if now > self._today_expires:
+                self._today = _today()
+                self._today_expires = now + 60
+            if grant.start and self._today < grant.start:
+                return False
+            if grant.end and self._today > grant.end:
+                return False
+        return True
+
+    def load_rows(self, users, authorizations=None):
+        """Reemplaza el contenido a partir de filas de las tablas user y userauthorize"""
+        doors_by_pin = None
+        if authorizations is not None:
+            doors_by_pin = {}
+            for row in authorizations:
+                try:
+                    doors = int(row.get("AuthorizeDoorId", "0") or 0)
+                except ValueError:
+                    continue
+                pin = row.get("Pin", "")
+                doors_by_pin[pin] = doors_by_pin.get(pin, 0) | doors
+
+        grants = {}
+        cards_by_pin = {}
+        for row in users:
+            key = normalize_card(row.get("CardNo"))
+            if key is None:
+                continue
+            pin = row.get("Pin", "")
+            doors = ALL_DOORS if doors_by_pin is None else doors_by_pin.get(pin, 0)
+            grants[key] = CardGrant(pin, doors, _to_date(row.get("StartTime")), _to_date(row.get("EndTime")))
+            cards_by_pin.setdefault(pin, set()).add(key)
+
+        with self._lock:
+            self._grants = grants
+            self._cards_by_pin = cards_by_pin
+            self.loaded_at = time.time()
+        self._notify(None)
+        return len(grants)
+
+    def load_from_device(self, device):
+        """Carga todas las tarjetas desde un ZKTecoDevice conectado"""
+        users = device.get_device_data("user", "CardNo\tPin\tStartTime\tEndTime")
+        if users is None:
+            return 0
+        # Si el dispositivo no expone userauthorize se asume acceso a todas las puertas
+        authorizations = device.get_device_data("userauthorize", "Pin\tAuthorizeDoorId")
+        count = self.load_rows(
+            iter_table_rows(users),
+            iter_table_rows(authorizations) if authorizations is not None else None,
+        )
+        print(f"Caché de autorizaciones cargado: {count} tarjetas")
+        return count
+
+
+def benchmark(sizes=(100_000, 1_000_000), lookups=1_000_000):
+    """Tiempo de carga y de decisión por tarjeta con 100k y 1M tarjetas"""
+    import random
+
+    for size in sizes:
+        cache = CardAuthCache()
+        users = ({"CardNo": str(10_000_000 + i), "Pin": str(i), "StartTime": "0", "EndTime": "0"}
+                 for i in range(size))
+        start = time.perf_counter()
+        cache.load_rows(users)
+        load_time = time.perf_counter() - start
+
+        cards = [str(10_000_000 + random.randrange(size * 2)) for _ in range(lookups)]
+        is_allowed = cache.is_allowed
+        start = time.perf_counter()
+        granted = sum(1 for card in cards if is_allowed(card))
+        decision_ns = (time.perf_counter() - start) / lookups * 1e9
+        print(f"{size:>9,} tarjetas: carga {load_time:.2f} s, decisión {decision_ns:.0f} ns/tarjeta "
+              f"({granted:,} de {lookups:,} permitidas)")
+
+
+if __name__ == "__main__":
+    benchmark()
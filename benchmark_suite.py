@@ -0,0 +1,322 @@
+"""
+Benchmarks repetibles del camino acercamiento -> apertura.
+
+Mide sobre FakeCommpro (en memoria) o sobre el emulador TCP (emulator.py +
+pullsdk_socket.SocketCommpro):
+
+- connect: tiempo de Connect por dispositivo
+- rtlog_drain: eventos/segundo al vaciar GetRTLog con RTLogPump.drain()
+- parse: costo por evento de ZKTecoDevice._parse_card_event
+- read_card: latencia desde el acercamiento hasta que read_card() devuelve la tarjeta
+- end_to_end: acercamiento -> decisión (CardAuthCache) -> control_device, p50/p99
+  según la cantidad de dispositivos
+
+Los resultados se guardan en JSON para comparar corridas:
+
+    python benchmark_suite.py --backend emulator --devices 1,10,50 --output resultados.json
+    python benchmark_suite.py --compare resultados.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from access_control import AccessController
+from auth_cache import CardAuthCache
+from fake_commpro import FakeCommpro
+from molinete_test import ZKTecoDevice
+from rtlog_parser import synthetic_buffer
+from rtlog_pump import RTLogPump
+
+FIRST_CARD = 20_000_000
+
+
+def percentile(values, fraction):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(seconds):
+    """Resumen en milisegundos de una lista de duraciones"""
+    values = sorted(seconds)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": values[-1] * 1000,
+    }
+
+
+class FakeBackend:
+    """Dispositivos FakeCommpro independientes, con latencia opcional por llamada"""
+
+    name = "fake"
+
+    def __init__(self, devices, latency=0.0):
+        self.fakes = [FakeCommpro(latency=latency, serial_number=f"FAKE{i:04d}") for i in range(devices)]
+
+    def new_device(self, index):
+        return ZKTecoDevice(commpro=self.fakes[index])
+
+    def connect(self, device, index):
+        return device.connect()
+
+    def tap(self, index, card, door=1):
+        self.fakes[index].tap(card, door=door)
+
+    def close(self):
+        pass
+
+
+class EmulatorBackend:
+    """Dispositivos del emulador TCP en un hilo propio, accedidos con SocketCommpro"""
+
+    name = "emulator"
+
+    def __init__(self, devices, latency=0.0):
+        from emulator import EmulatorServer
+        from pullsdk_socket import SocketCommpro
+
+        self.server = EmulatorServer(devices=devices, latency=latency).start_in_thread()
+        self.commpro = SocketCommpro()
+
+    def new_device(self, index):
+        return ZKTecoDevice(commpro=self.commpro)
+
+    def connect(self, device, index):
+        return device.connect(ip_address=self.server.host, port=self.server.ports[index])
+
+    def tap(self, index, card, door=1):
+        self.server.call_in_loop(self.server.devices[index].tap, card, door)
+
+    def close(self):
+        self.server.stop()
+
+
+BACKENDS = {"fake": FakeBackend, "emulator": EmulatorBackend}
+
+
+def bench_connect(backend_class, devices=20, latency=0.0):
+    backend = backend_class(devices, latency)
+    times = []
+    try:
+        for i in range(devices):
+            device = backend.new_device(i)
+            start = time.perf_counter()
+            ok = backend.connect(device, i)
+            elapsed = time.perf_counter() - start
+            if ok:
+                times.append(elapsed)
+                device.disconnect()
+    finally:
+        backend.close()
+    return summarize(times)
+
+
+def bench_rtlog_drain(backend_class, events=20_000, latency=0.0):
+    backend = backend_class(1, latency)
+    try:
+        device = backend.new_device(0)
+        backend.connect(device, 0)
+        for i in range(events):
+            backend.tap(0, FIRST_CARD + i)
+        time.sleep(0.2)  # El emulador registra los acercamientos en su propio hilo
+        pump = RTLogPump(device.commpro, device.hcommpro, buffer_size=64 * 1024, max_drain=events)
+        start = time.perf_counter()
+        received = len(pump.drain())
+        elapsed = time.perf_counter() - start
+        device.disconnect()
+    finally:
+        backend.close()
+    return {"events": received, "seconds": elapsed, "events_per_second": received / elapsed if elapsed else None,
+            "polls": pump.stats["polls"]}
+
+
+def bench_parse(sizes=(1, 10, 100), min_time=0.2):
+    device = ZKTecoDevice(commpro=FakeCommpro())
+    results = {}
+    for size in sizes:
+        buffer = synthetic_buffer(size)
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            for _ in range(100):
+                device._parse_card_event(buffer)
+            calls += 100
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        results[str(size)] = {"ns_per_call": elapsed / calls * 1e9, "ns_per_event": elapsed / calls / size * 1e9}
+    return results
+
+
+def bench_read_card(backend_class, reads=20, delay=0.02, latency=0.0):
+    backend = backend_class(1, latency)
+    times = []
+    try:
+        device = backend.new_device(0)
+        backend.connect(device, 0)
+        for i in range(reads):
+            card = str(FIRST_CARD + i)
+            tapped_at = []
+
+            def tap():
+                tapped_at.append(time.perf_counter())
+                backend.tap(0, card)
+
+            timer = threading.Timer(delay, tap)
+            timer.start()
+            result = device.read_card()
+            returned_at = time.perf_counter()
+            timer.join()
+            if result == card and tapped_at:
+                times.append(returned_at - tapped_at[0])
+        device.disconnect()
+    finally:
+        backend.close()
+    return summarize(times)
+
+
+def bench_end_to_end(backend_class, devices, taps_per_second=200, duration=3.0, latency=0.0):
+    """Latencia desde el acercamiento hasta que control_device termina, con una bomba de eventos por dispositivo"""
+    backend = backend_class(devices, latency)
+    cache = CardAuthCache()
+    tap_times = {}
+    latencies = []
+    lock = threading.Lock()
+    controllers = []
+    try:
+        for i in range(devices):
+            device = backend.new_device(i)
+            backend.connect(device, i)
+            controller = AccessController(device, cache, open_seconds=1)
+
+            def on_event(event, controller=controller):
+                granted = controller.handle_event(event)
+                finished = time.perf_counter()
+                tapped_at = tap_times.get(event.card)
+                if granted is not None and tapped_at is not None:
+                    with lock:
+                        latencies.append(finished - tapped_at)
+
+            device.start_event_pump(callback=on_event)
+            controllers.append(controller)
+
+        total = int(taps_per_second * duration)
+        for i in range(total):
+            cache.upsert(FIRST_CARD + i)
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for i in range(total):
+            target = start + i / taps_per_second
+            pause = target - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+            card = str(FIRST_CARD + i)
+            tap_times[card] = time.perf_counter()
+            backend.tap(rng.randrange(devices), card)
+        deadline = time.perf_counter() + 5
+        while len(latencies) < total and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        for controller in controllers:
+            controller.device.disconnect()
+    finally:
+        backend.close()
+    result = summarize(latencies)
+    result["taps"] = total
+    result["open_errors"] = sum(controller.stats["open_errors"] for controller in controllers)
+    return result
+
+
+def run_suite(backend="fake", device_counts=(1, 10, 50), latency=0.0, taps_per_second=200, duration=3.0):
+    """Ejecuta todos los benchmarks y devuelve un dict serializable a JSON"""
+    backend_class = BACKENDS[backend]
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["connect"] = bench_connect(backend_class, latency=latency)
+        results["rtlog_drain"] = bench_rtlog_drain(backend_class, latency=latency)
+        results["parse"] = bench_parse()
+        results["read_card"] = bench_read_card(backend_class, latency=latency)
+        results["end_to_end"] = {
+            str(count): bench_end_to_end(backend_class, count, taps_per_second, duration, latency)
+            for count in device_counts
+        }
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "backend": backend,
+            "latency_ms": latency * 1000,
+            "taps_per_second": taps_per_second,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}, solo valores numéricos"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(previous, current):
+    """Imprime cada métrica de la corrida actual junto a la anterior y su variación"""
+    before = flatten(previous["results"])
+    after = flatten(current["results"])
+    print(f"{'métrica':<40} {'anterior':>14} {'actual':>14} {'variación':>10}")
+    for name, value in after.items():
+        old = before.get(name)
+        change = f"{(value - old) / old:+.1%}" if old else ""
+        old_text = f"{old:,.3f}" if old is not None else "-"
+        print(f"{name:<40} {old_text:>14} {value:>14,.3f} {change:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del camino acercamiento -> apertura")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="fake")
+    parser.add_argument("--devices", default="1,10,50", help="cantidades de dispositivos para end_to_end")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia simulada por llamada")
+    parser.add_argument("--tap-rate", type=float, default=200, help="acercamientos por segundo (total)")
+    parser.add_argument("--duration", type=float, default=3.0, help="segundos de carga por cantidad de dispositivos")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="archivo JSON de una corrida anterior")
+    args = parser.parse_args(argv)
+
+    previous = None
+    if args.compare:
+        # Se lee antes de correr: --output y --compare pueden ser el mismo archivo
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    report = run_suite(args.backend, [int(count) for count in args.devices.split(",")],
+                       args.latency_ms / 1000, args.tap_rate, args.duration)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {args.output}")
+
+    if previous is not None:
+        compare(previous, report)
+    else:
+        json.dump(report["results"], sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
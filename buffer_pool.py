@@ -0,0 +1,87 @@
+"""
+Buffers de ctypes reutilizables para las llamadas al SDK de un handle.
+
+Cada uso (RT log, parámetros, tarjeta HID...) tiene su propio buffer, que se
+crea una vez y se reutiliza en cada llamada en lugar de asignar uno nuevo.
+Si el SDK responde -3 ("el buffer no es suficiente") el buffer se duplica y la
+llamada se repite, así los eventos en lote no se pierden. El texto se
+decodifica desde una vista (memoryview) del buffer, sin la copia intermedia
+de .value.
+"""
+import ctypes
+import sys
+from ctypes import create_string_buffer
+
+BUFFER_TOO_SMALL = -3
+MAX_BUFFER_SIZE = 16 * 1024 * 1024
+VIEW_THRESHOLD = 1024  # Por debajo, .value es más rápido que memoryview + memchr
+
+try:
+    _libc = ctypes.cdll.msvcrt if sys.platform == "win32" else ctypes.CDLL(None)
+    _memchr = _libc.memchr
+    _memchr.restype = ctypes.c_void_p
+    _memchr.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t]
+except (OSError, AttributeError):
+    _memchr = None
+
+
+def _text_length(buffer, size):
+    """Posición del primer NUL sin pasar de size (size si el SDK llenó el buffer sin terminarlo)"""
+    if _memchr is None:
+        length = bytes(memoryview(buffer).cast("B")).find(b"\0")
+        return size if length < 0 else length
+    found = _memchr(ctypes.addressof(buffer), 0, size)
+    return size if found is None else found - ctypes.addressof(buffer)
+
+
+def buffer_text(buffer):
+    """Texto hasta el primer NUL de un buffer de ctypes (o hasta el final si no hay NUL)"""
+    size = ctypes.sizeof(buffer)
+    if size < VIEW_THRESHOLD:
+        return buffer.value.decode("utf-8", errors="ignore")  # .value se detiene en el tamaño del arreglo
+    length = _text_length(buffer, size)
+    return str(memoryview(buffer).cast("B")[:length], "utf-8", "ignore")
+
+
+class BufferPool:
+    """Buffers por nombre de uso; cada handle (o hilo que lo use) tiene su propio pool"""
+
+    def __init__(self, max_size=MAX_BUFFER_SIZE):
+        self.max_size = max_size
+        self.grown = 0  # Veces que un buffer tuvo que agrandarse
+        self._buffers = {}
+
+    def get(self, name, size):
+        """Buffer de al menos size bytes para este uso (se reutiliza entre llamadas)"""
+        buffer = self._buffers.get(name)
+        if buffer is None or len(buffer) < size:
+            buffer = create_string_buffer(size)
+            self._buffers[name] = buffer
+        return buffer
+
+    def grow(self, name):
+        """Duplica el buffer de este uso; devuelve None si ya alcanzó max_size"""
+        size = len(self._buffers[name]) * 2
+        if size > self.max_size:
+            return None
+        self.grown += 1
+        return self.get(name, size)
+
+    def call(self, name, size, fn):
+        """Ejecuta fn(buffer, tamaño) agrandando el buffer mientras devuelva -3.
+
+        Devuelve (resultado, buffer).
+        """
+        buffer = self.get(name, size)
+        while True:
+            ret = fn(buffer, len(buffer))
+            if ret != BUFFER_TOO_SMALL:
+                return ret, buffer
+            larger = self.grow(name)
+            if larger is None:
+                return ret, buffer
+            buffer = larger
+
+    def text(self, name):
+        """Texto devuelto por el SDK en el buffer de este uso"""
+        return buffer_text(self._buffers[name])
@@ -0,0 +1,151 @@
+"""
+Alta masiva de tarjetas con SetDeviceData en bloques por debajo del límite de 4 MB.
+
+Las tarjetas se leen de un iterable y se empaquetan en el bloque más grande
+que no supere el límite (error -106 de PullSDK). Un hilo arma el siguiente
+bloque mientras el anterior se envía. Si un bloque falla se divide a la
+mitad hasta aislar las filas rechazadas, que se informan una por una.
+"""
+import queue
+import threading
+import time
+
+from device_tables import format_table_row
+
+MAX_PAYLOAD = 4 * 1024 * 1024  # Límite de PullSDK por llamada
+PAYLOAD_MARGIN = 4 * 1024  # Margen para cabeceras del protocolo
+ERROR_DATA_OVER_LIMIT = -106
+
+
+class EnrollResult:
+    """Resumen de una carga masiva"""
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = []  # (fila, código de error)
+        self.chunks = 0
+        self.elapsed = 0.0
+
+    def __repr__(self):
+        return (f"EnrollResult(enviadas={self.sent}, fallidas={len(self.failed)}, "
+                f"bloques={self.chunks}, tiempo={self.elapsed:.2f}s)")
+
+
+def _card_row(card):
+    """Acepta dicts de la tabla user o tuplas (pin, tarjeta)"""
+    if isinstance(card, dict):
+        return card
+    pin, card_number = card
+    return {"Pin": pin, "CardNo": card_number}
+
+
+def iter_chunks(cards, max_bytes):
+    """Agrupa las filas codificadas en bloques de hasta max_bytes (int o función que lo devuelve)"""
+    limit = max_bytes if callable(max_bytes) else lambda: max_bytes
+    chunk = []
+    size = 0
+    for card in cards:
+        row = _card_row(card)
+        encoded = format_table_row(row)
+        if chunk and size + len(encoded) + 2 > limit():
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append((row, encoded))
+        size += len(encoded) + 2
+    if chunk:
+        yield chunk
+
+
+def _payload(chunk):
+    return b"\r\n".join(encoded for _, encoded in chunk) + b"\r\n"
+
+
+def _authorize_payload(chunk, doors):
+    return b"".join(
+        format_table_row({"Pin": row["Pin"], "AuthorizeTimezoneId": 1, "AuthorizeDoorId": doors}) + b"\r\n"
+        for row, _ in chunk
+    )
+
+
+class BulkEnroller:
+    """Sube tarjetas a un ZKTecoDevice conectado"""
+
+    def __init__(self, device, table="user", max_bytes=MAX_PAYLOAD - PAYLOAD_MARGIN, doors=None, progress=None):
+        self.device = device
+        self.table = table
+        self.max_bytes = max_bytes
+        self.doors = doors  # Máscara de puertas para userauthorize, None para no escribirla
+        self.progress = progress  # progress(enviadas, fallidas)
+
+    def _send(self, chunk, result):
+        """Envía un bloque; si falla lo divide hasta aislar las filas con error"""
+        ret = self.device.set_device_data(self.table, _payload(chunk))
+        if ret == 0 and self.doors is not None:
+            ret = self.device.set_device_data("userauthorize", _authorize_payload(chunk, self.doors))
+        if ret == 0:
+            result.sent += len(chunk)
+        elif len(chunk) == 1:
+            result.failed.append((chunk[0][0], ret))
+        else:
+            if ret == ERROR_DATA_OVER_LIMIT:
+                # El dispositivo acepta menos de lo previsto: achicar los próximos bloques
+                self.max_bytes = max(1024, len(_payload(chunk)) // 2)
+            middle = len(chunk) // 2
+            self._send(chunk[:middle], result)
+            self._send(chunk[middle:], result)
+            return
+        if self.progress:
+            self.progress(result.sent, len(result.failed))
+
+    def enroll(self, cards):
+        """Sube todas las tarjetas del iterable y devuelve un EnrollResult"""
+        result = EnrollResult()
+        start = time.perf_counter()
+        chunks = queue.Queue(maxsize=2)  # Un bloque en vuelo y otro preparado
+
+        def produce():
+            try:
+                for chunk in iter_chunks(cards, lambda: self.max_bytes):
+                    chunks.put(chunk)
+            finally:
+                chunks.put(None)
+
+        producer = threading.Thread(target=produce, name="bulk-enroll", daemon=True)
+        producer.start()
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            result.chunks += 1
+            self._send(chunk, result)
+        producer.join()
+        result.elapsed = time.perf_counter() - start
+        print(f"Carga masiva finalizada: {result.sent} tarjetas enviadas, "
+              f"{len(result.failed)} con error, {result.chunks} bloques en {result.elapsed:.2f} s")
+        return result
+
+
+def enroll_cards(device, cards, **options):
+    """Atajo: BulkEnroller(device, **options).enroll(cards)"""
+    return BulkEnroller(device, **options).enroll(cards)
+
+
+def benchmark(cards=10_000, latency=0.05, max_payload=256 * 1024):
+    """Sube tarjetas a un FakeCommpro que impone un límite de tamaño y tiene latencia por llamada"""
+    from fake_commpro import FakeCommpro
+    from molinete_test import ZKTecoDevice
+
+    fake = FakeCommpro(latency=latency, max_payload=max_payload)
+    device = ZKTecoDevice(commpro=fake)
+    device.connect()
+    rows = ((str(i), str(20_000_000 + i)) for i in range(1, cards + 1))
+    bad_rows = [("x", "1"), ("", "2")]  # Filas que el dispositivo rechaza
+    result = enroll_cards(device, list(rows) + bad_rows, max_bytes=max_payload * 2, doors=1)
+    print(result, f"filas en el dispositivo: {len(fake.tables['user'])}", f"rechazadas: {result.failed}")
+    device.disconnect()
+    return result
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,178 @@
+"""
+Perfil de capacidades por dispositivo (número de serie + firmware) guardado en disco.
+
+Qué funciones del SDK responden depende del modelo y del firmware. En lugar
+de probarlas en vivo en cada arranque (como rfid/zkemkeeper_test.py), se
+prueban una vez, el resultado se guarda en un JSON por backend y número de
+serie, y al conectar solo se lee el perfil. Se vuelve a probar cuando cambia
+la versión de firmware del dispositivo.
+
+zkemkeeper casi nunca lanza excepciones: una función no soportada devuelve
+False y deja el motivo en GetLastError. Por eso una función "funciona" si
+devuelve éxito, o si falla con un código que significa "sin datos" (por
+ejemplo GetStrCardNumber sin tarjeta presente); con cualquier otro código
+(-100 = no soportado) no funciona, y el código queda en profile.errors.
+
+El archivo se guarda en el directorio de datos del usuario (ver
+default_profile_path), no junto al código.
+
+    store = ProfileStore()
+    profile = ensure_profile(store, serial, firmware, "com", lambda: probe_com(zkem, 1))
+    if profile.works("GetHIDEventCardNumAsStr"):
+        ...
+"""
+import json
+import os
+import sys
+import threading
+import time
+from typing import NamedTuple, Optional
+
+PROFILE_FILE = "device_profiles.json"
+COM_NO_ERROR = (0, 1)  # GetLastError: 0 = sin datos (o repetido), 1 = correcto; -100 = no soportado
+
+# Fuentes de número de tarjeta por COM, de la más barata a la más cara
+CARD_SOURCES = ("GetStrCardNumber", "GetHIDEventCardNumAsStr")
+
+# Funciones de zkemkeeper que se pueden probar sin efectos sobre el dispositivo (no registran
+# eventos, no consumen el log en tiempo real ni descargan el historial)
+COM_PROBES = [
+    ("GetFirmwareVersion", lambda zkem, machine: zkem.GetFirmwareVersion(machine)),
+    ("GetDeviceMAC", lambda zkem, machine: zkem.GetDeviceMAC(machine)),
+    ("GetSerialNumber", lambda zkem, machine: zkem.GetSerialNumber(machine)),
+    ("GetDeviceIP", lambda zkem, machine: zkem.GetDeviceIP(machine)),
+    ("GetProductCode", lambda zkem, machine: zkem.GetProductCode(machine)),
+    ("GetVendor", lambda zkem, machine: zkem.GetVendor()),
+    ("GetPlatform", lambda zkem, machine: zkem.GetPlatform(machine)),
+    ("GetCardFun", lambda zkem, machine: zkem.GetCardFun(machine)),
+    ("GetLastError", lambda zkem, machine: zkem.GetLastError()),
+    ("GetStrCardNumber", lambda zkem, machine: zkem.GetStrCardNumber()),
+    ("ReadCard", lambda zkem, machine: zkem.ReadCard(machine, "")),
+    ("GetHIDEventCardNumAsStr", lambda zkem, machine: zkem.GetHIDEventCardNumAsStr()),
+    ("PollCard", lambda zkem, machine: zkem.PollCard()),
+    ("SSR_GetDeviceDataCount", lambda zkem, machine: zkem.SSR_GetDeviceDataCount(machine, "user", "", "")),
+]
+
+
+class CapabilityProfile(NamedTuple):
+    serial: str
+    firmware: str
+    backend: str
+    functions: dict  # nombre -> True si funciona
+    probed_at: float
+    errors: Optional[dict] = None  # nombre -> código de error de las que fallaron (None si lanzó excepción)
+
+    def works(self, name):
+        return self.functions.get(name, False)
+
+
+def default_profile_path():
+    """ZK_DEVICE_PROFILES si está definida; si no, device_profiles.json en %LOCALAPPDATA%\\zkteco
+    (Windows) o en $XDG_STATE_HOME/zkteco (por defecto ~/.local/state/zkteco)"""
+    path = os.environ.get("ZK_DEVICE_PROFILES")
+    if path:
+        return path
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "zkteco", PROFILE_FILE)
+
+
+def com_last_error(zkem):
+    """Código de GetLastError (pywin32 devuelve (resultado, código) por el parámetro de salida), o None"""
+    try:
+        result = zkem.GetLastError()
+    except Exception:
+        return None
+    return result[-1] if isinstance(result, tuple) else result
+
+
+def com_succeeded(result):
+    """Resultado de una llamada zkemkeeper: bool, o tupla cuyo primer elemento indica el éxito"""
+    return bool(result[0] if isinstance(result, tuple) else result)
+
+
+def probe_com_call(zkem, machine, call):
+    """(funciona, código de error, resultado) de una prueba COM"""
+    try:
+        result = call(zkem, machine)
+    except Exception as e:
+        return False, None, e
+    if com_succeeded(result):
+        return True, None, result
+    code = com_last_error(zkem)
+    return code in COM_NO_ERROR, code, result
+
+
+def probe_com(zkem, machine=1):
+    """(funciones, errores) de COM_PROBES"""
+    functions = {}
+    errors = {}
+    for name, call in COM_PROBES:
+        works, code, _ = probe_com_call(zkem, machine, call)
+        functions[name] = works
+        if not works:
+            errors[name] = code
+    return functions, errors
+
+
+def probe_pullsdk(device):
+    """Pruebas sobre un ZKTecoDevice conectado: tablas y filtros por comparación del firmware"""
+    codes = {
+        "GetDeviceDataCount": device.get_device_data_count("user"),
+        "TransactionTable": device.get_device_data_count("transaction"),
+        "FilteredTransactionRead": device.get_device_data_count("transaction", "Time_second>0"),
+    }
+    return {name: code >= 0 for name, code in codes.items()}, {name: code for name, code in codes.items() if code < 0}
+
+
+def _key(backend, serial):
+    return f"{backend}:{serial}"
+
+
+class ProfileStore:
+    """Perfiles por (backend, número de serie) en un archivo JSON (se lee una vez y se reemplaza de
+    forma atómica). El mismo equipo puede tener perfiles distintos por COM y por PullSDK"""
+
+    def __init__(self, path=None):
+        self.path = path or default_profile_path()
+        self._lock = threading.Lock()
+        self._profiles = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    profiles = [CapabilityProfile(**data) for data in json.load(f).values()]
+                self._profiles = {_key(profile.backend, profile.serial): profile for profile in profiles}
+            except (ValueError, TypeError) as e:
+                print(f"Perfiles de dispositivos ilegibles en {self.path}, se volverán a probar: {e}")
+
+    def get(self, backend, serial, firmware=None):
+        """Perfil guardado del dispositivo en ese backend, o None si no existe o es de otro firmware"""
+        profile = self._profiles.get(_key(backend, serial))
+        if profile is None or (firmware is not None and profile.firmware != firmware):
+            return None
+        return profile
+
+    def save(self, profile):
+        with self._lock:
+            self._profiles[_key(profile.backend, profile.serial)] = profile
+            data = {key: saved._asdict() for key, saved in self._profiles.items()}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(temporary, self.path)
+
+
+def ensure_profile(store, serial, firmware, backend, probe):
+    """Perfil guardado si el firmware no cambió; si no, prueba (probe() -> (funciones, errores)) y lo guarda"""
+    profile = store.get(backend, serial, firmware)
+    if profile is not None:
+        return profile
+    if store.get(backend, serial) is not None:
+        print(f"Firmware de {serial} cambió a {firmware}: se vuelven a probar las funciones del SDK")
+    functions, errors = probe()
+    profile = CapabilityProfile(serial, firmware, backend, functions, time.time(), errors)
+    store.save(profile)
+    return profile
@@ -0,0 +1,85 @@
+"""
+Descarte de lecturas duplicadas de tarjeta provenientes de varias fuentes y dispositivos.
+
+Cada tarjeta aceptada queda registrada con el instante de aceptación en un
+OrderedDict en orden de llegada: una nueva lectura de la misma tarjeta dentro
+de la ventana se descarta, venga de la misma fuente (GetStrCardNumber), de
+otra (GetHIDEventCardNumAsStr, GetRTLog) o de otro dispositivo. Como las
+entradas quedan ordenadas por instante, las vencidas se quitan desde el
+frente y la memoria queda acotada por max_cards (se descarta la menos
+reciente). Cada lectura cuesta O(1) amortizado.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from auth_cache import normalize_card
+
+
+class CardDeduplicator:
+    """Ventana de tiempo por tarjeta con memoria acotada y contadores de descarte"""
+
+    def __init__(self, window=2.0, max_cards=100_000, per_device=False):
+        self.window = window
+        self.max_cards = max_cards
+        self.per_device = per_device  # True: la misma tarjeta en dos dispositivos no es duplicado
+        self.stats = {"accepted": 0, "suppressed": 0, "expired": 0, "evicted": 0}
+        self.suppressed_by_source = defaultdict(int)
+        self._last = OrderedDict()  # clave -> instante de la última lectura aceptada
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._last)
+
+    def accept(self, card, device_id=0, source="", now=None):
+        """True si la lectura es nueva y debe procesarse; False si es un duplicado dentro de la ventana"""
+        number = normalize_card(card)
+        if number is None:
+            return False
+        key = (device_id, number) if self.per_device else number
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last = self._last
+            limit = now - self.window
+            while last:
+                oldest_key, oldest = next(iter(last.items()))
+                if oldest > limit:
+                    break
+                del last[oldest_key]
+                self.stats["expired"] += 1
+            if key in last:
+                self.stats["suppressed"] += 1
+                self.suppressed_by_source[source] += 1
+                return False
+            last[key] = now
+            if len(last) > self.max_cards:
+                last.popitem(last=False)
+                self.stats["evicted"] += 1
+            self.stats["accepted"] += 1
+            return True
+
+    def accept_event(self, event, device_id=0, source="GetRTLog"):
+        """accept() para un RTLogEvent"""
+        return self.accept(event.card, device_id, source)
+
+    def clear(self):
+        with self._lock:
+            self._last.clear()
+
+
+def benchmark(events=1_000_000, cards=5_000, window=2.0, rate=5_000):
+    """Lecturas/segundo con varias fuentes intercaladas (cada acercamiento reportado dos veces)"""
+    dedup = CardDeduplicator(window=window)
+    start = time.perf_counter()
+    for i in range(events):
+        now = i / rate
+        card = 10_000_000 + (i // 2 * 7919) % cards
+        dedup.accept(card, source="HID" if i & 1 else "GetStrCardNumber", now=now)
+    elapsed = time.perf_counter() - start
+    print(f"{events:,} lecturas en {elapsed:.2f} s: {events / elapsed:,.0f} lecturas/s, "
+          f"{len(dedup):,} tarjetas en memoria, {dedup.stats}, {dict(dedup.suppressed_by_source)}")
+    return events / elapsed
+
+
+if __name__ == "__main__":
+    benchmark()
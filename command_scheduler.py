@@ -0,0 +1,227 @@
+"""
+Cola de comandos por dispositivo con prioridades, fusión de aperturas repetidas,
+límite de ritmo y rechazo temprano.
+
+La usa cada línea de TurnstileFleet: las llamadas al SDK de un dispositivo
+siguen ejecutándose de a una, pero ya no en orden de llegada:
+
+- EMERGENCY (cancelar alarma, normal abierto, aperturas de emergencia) pasa
+  delante de todo y nunca se rechaza ni se demora por el límite de ritmo.
+- Una apertura pendiente para la misma puerta absorbe a las repetidas (se
+  queda con la duración más larga y todos reciben el mismo Future).
+- Las aperturas normales respetan un límite de comandos por segundo por
+  dispositivo (balde de fichas); mientras esperan ficha, pasan los comandos
+  sin límite de ritmo de su misma prioridad (lecturas) y los de menor.
+- La cola está acotada: si está llena, o si la espera estimada supera
+  max_wait, el Future vuelve ya resuelto con queue.Full.
+
+stats() informa la profundidad por prioridad y la espera de los comandos.
+
+    python command_scheduler.py   # ráfaga de aperturas + una emergencia sobre un dispositivo lento
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+EMERGENCY = 0  # Cancelar alarma, normal abierto (evacuación), aperturas de emergencia
+NORMAL = 1  # Aperturas y lecturas de eventos
+BACKGROUND = 2  # Información del dispositivo, pruebas de comunicación
+PRIORITY_NAMES = ("emergency", "normal", "background")
+EMERGENCY_OPERATIONS = (2, 4)  # ControlDevice: 2 = cancelar alarma, 4 = normal abierto
+
+
+class TokenBucket:
+    """rate fichas por segundo con hasta burst acumuladas"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Segundos hasta que haya una ficha (0 si ya hay)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class Command:
+    __slots__ = ("future", "fn", "args", "kwargs", "priority", "key", "rate_limited", "delayed", "enqueued_at")
+
+    def __init__(self, fn, args, kwargs, priority, key, rate_limited):
+        self.future = Future()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.key = key
+        self.rate_limited = rate_limited
+        self.delayed = False  # Tuvo que esperar ficha del límite de ritmo
+        self.enqueued_at = time.monotonic()
+
+
+class CommandQueue:
+    """Comandos pendientes de un dispositivo, por prioridad y en orden de llegada dentro de cada una"""
+
+    def __init__(self, max_pending=256, rate=None, burst=None, max_wait=None):
+        self.max_pending = max_pending  # Sin contar las emergencias
+        self.max_wait = max_wait  # Segundos de espera estimada a partir de los cuales se rechaza
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.service_time = 0.0  # Promedio móvil de la duración de cada comando
+        self._queues = [deque() for _ in PRIORITY_NAMES]
+        self._by_key = {}  # Clave de fusión -> comando pendiente
+        self._lock = threading.Lock()
+        self._waits = [[0, 0.0, 0.0] for _ in PRIORITY_NAMES]  # cantidad, suma y máximo de la espera
+        self.counters = {"executed": 0, "coalesced": 0, "rejected": 0, "rate_limited": 0}
+
+    def __len__(self):
+        return sum(len(pending) for pending in self._queues)
+
+    def expected_wait(self, priority):
+        """Espera estimada de un comando nuevo: lo que tiene delante por la duración promedio"""
+        ahead = sum(len(pending) for pending in self._queues[:priority + 1])
+        return ahead * self.service_time
+
+    def push(self, fn, args=(), kwargs=None, priority=NORMAL, key=None, merge=None, rate_limited=False):
+        """Encola fn(*args, **kwargs) y devuelve su Future.
+
+        key identifica comandos equivalentes: si ya hay uno pendiente con la misma clave, se
+        devuelve su Future (merge(args_pendientes, args_nuevos) puede combinar los argumentos).
+        """
+        with self._lock:
+            pending = self._by_key.get(key) if key is not None else None
+            if pending is not None:
+                if merge is not None:
+                    pending.args = merge(pending.args, args)
+                self.counters["coalesced"] += 1
+                return pending.future
+            if priority != EMERGENCY:
+                reason = None
+                if len(self) - len(self._queues[EMERGENCY]) >= self.max_pending:
+                    reason = f"cola llena ({self.max_pending} comandos pendientes)"
+                elif self.max_wait is not None and self.expected_wait(priority) > self.max_wait:
+                    reason = f"espera estimada mayor a {self.max_wait:.1f} s"
+                if reason:
+                    self.counters["rejected"] += 1
+                    future = Future()
+                    future.set_exception(queue.Full(f"Comando rechazado: {reason}"))
+                    return future
+            command = Command(fn, args, kwargs or {}, priority, key, rate_limited)
+            self._queues[priority].append(command)
+            if key is not None:
+                self._by_key[key] = command
+            return command.future
+
+    def release_key(self, key):
+        """Los comandos que lleguen con esta clave ya no se fusionan con el pendiente actual"""
+        with self._lock:
+            self._by_key.pop(key, None)
+
+    def pop(self):
+        """(comando, 0) del próximo que puede ejecutarse, o (None, segundos) si solo quedan comandos
+        esperando ficha del límite de ritmo (None, 0 si la cola está vacía).
+
+        Si el primero de una prioridad espera ficha, se ejecuta el primero de esa prioridad que
+        no tiene límite de ritmo (todos los limitados comparten el mismo balde y también esperan).
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            for pending in self._queues:
+                if not pending:
+                    continue
+                index = 0
+                command = pending[0]
+                if command.rate_limited and self.bucket is not None:
+                    delay = self.bucket.wait_time(now)
+                    if delay:
+                        wait = delay if not wait else min(wait, delay)
+                        index = None
+                        for i, queued in enumerate(pending):
+                            if not queued.rate_limited:
+                                index = i
+                                break
+                            queued.delayed = True
+                        if index is None:
+                            continue
+                        command = pending[index]
+                    else:
+                        self.bucket.take()
+                if index:
+                    del pending[index]
+                else:
+                    pending.popleft()
+                if command.key is not None and self._by_key.get(command.key) is command:
+                    del self._by_key[command.key]
+                if command.delayed:
+                    self.counters["rate_limited"] += 1
+                stats = self._waits[command.priority]
+                waited = now - command.enqueued_at
+                stats[0] += 1
+                stats[1] += waited
+                stats[2] = max(stats[2], waited)
+                return command, 0.0
+            return None, wait
+
+    def done(self, elapsed):
+        """Registra la duración de un comando ejecutado (para estimar la espera)"""
+        with self._lock:
+            self.counters["executed"] += 1
+            self.service_time = elapsed if not self.service_time else 0.8 * self.service_time + 0.2 * elapsed
+
+    def stats(self):
+        """Profundidad por prioridad, espera promedio/máxima (ms) y contadores"""
+        with self._lock:
+            result = dict(self.counters)
+            result["depth"] = {name: len(pending) for name, pending in zip(PRIORITY_NAMES, self._queues)}
+            result["wait_avg_ms"] = {name: stats[1] / stats[0] * 1000 if stats[0] else 0.0
+                                     for name, stats in zip(PRIORITY_NAMES, self._waits)}
+            result["wait_max_ms"] = {name: stats[2] * 1000 for name, stats in zip(PRIORITY_NAMES, self._waits)}
+            result["service_ms"] = self.service_time * 1000
+            return result
+
+
+def benchmark(opens=200, latency=0.02, rate=20.0, max_pending=64):
+    """Ráfaga de aperturas repetidas sobre un dispositivo lento y una emergencia al final"""
+    import contextlib
+    import io
+
+    from fake_commpro import FakeCommpro
+    from fleet import TurnstileFleet
+    from molinete_test import ZKTecoDevice
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        device = ZKTecoDevice(commpro=FakeCommpro(latency=latency))
+        device.connect()
+        fleet = TurnstileFleet(max_pending=max_pending, rate=rate)
+        fleet.add_device("molinete", device)
+        start = time.monotonic()
+        futures = [fleet.control_device("molinete", door_id=1 + i % 4, state=5) for i in range(opens)]
+        futures += [fleet.read_events("molinete") for _ in range(max_pending)]
+        emergency = fleet.control_device("molinete", operation_id=2)
+        emergency.result()
+        emergency_ms = (time.monotonic() - start) * 1000
+        for future in futures:
+            try:
+                future.result()
+            except queue.Full:
+                pass
+        stats = fleet.queue_stats()["molinete"]
+        fleet.shutdown()
+
+    print(f"Latencia simulada: {latency * 1000:.0f} ms  Límite: {rate:.0f} aperturas/s  Cola: {max_pending}")
+    print(f"{opens} aperturas + {max_pending} lecturas: {len(set(map(id, futures)))} comandos distintos, "
+          f"{stats['coalesced']} fusionados, {stats['rejected']} rechazados, {stats['executed']} ejecutados")
+    print(f"Emergencia atendida a los {emergency_ms:.0f} ms; espera promedio por prioridad (ms): "
+          + ", ".join(f"{name}={wait:.0f}" for name, wait in stats["wait_avg_ms"].items()))
+    return stats
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,3 @@
+# rfid/zkemkeeper_test.py es un script interactivo (pide la IP del dispositivo y termina con
+# sys.exit si no está PyWin32), no un módulo de pruebas
+collect_ignore = ["rfid/zkemkeeper_test.py"]
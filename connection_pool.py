@@ -0,0 +1,222 @@
+"""
+Administrador de conexiones persistentes con verificación periódica y reconexión.
+
+Mantiene un handle abierto por dispositivo. Un hilo de fondo hace una
+consulta liviana (GetDeviceParam de DeviceID) sobre cada handle ocioso; si
+falla, lo descarta y reconecta con espera exponencial. Así, después de un
+corte de red, el handle ya está repuesto cuando llega el siguiente comando
+y este no paga el timeout de 4000 ms contra un handle muerto.
+
+Las verificaciones y reconexiones de distintos dispositivos corren en paralelo
+sobre un pool de hilos, así que un dispositivo caído (4 s de timeout por
+intento) no demora el mantenimiento de los demás. El handle solo se usa a
+través de lease(), que lo bloquea mientras dura el uso.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class ManagedConnection:
+    """Estado de la conexión de un dispositivo"""
+
+    def __init__(self, device_id, device, connect_params):
+        self.device_id = device_id
+        self.device = device
+        self.connect_params = connect_params
+        self.lock = threading.Lock()  # Los handles de PullSDK no son reentrantes
+        self.ready = threading.Event()
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_ok = 0.0
+        self.reconnects = 0
+        self.maintaining = False  # Hay una verificación o reconexión en curso en el pool
+
+    @property
+    def healthy(self):
+        return self.ready.is_set()
+
+
+class ConnectionManager:
+    """Entrega handles listos y los repone en segundo plano cuando se caen"""
+
+    def __init__(self, check_interval=5.0, backoff_initial=0.5, backoff_max=30.0, max_workers=16):
+        self.check_interval = check_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_workers = max_workers
+        self._connections = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, device_id, device, **connect_params):
+        """Registra un dispositivo; se conecta en segundo plano"""
+        self._connections[device_id] = ManagedConnection(device_id, device, connect_params)
+        self._wakeup.set()
+
+    def remove(self, device_id):
+        conn = self._connections.pop(device_id, None)
+        if conn:
+            with conn.lock:
+                if conn.device.connected:
+                    conn.device.disconnect()
+
+    def status(self):
+        """{device_id: (conectado, fallas consecutivas, reconexiones)}"""
+        return {device_id: (conn.healthy, conn.failures, conn.reconnects)
+                for device_id, conn in self._connections.items()}
+
+    def wait_ready(self, device_id, wait=0.0):
+        """True si el handle está listo (esperando hasta wait segundos). Para usarlo, lease()"""
+        return self._connections[device_id].ready.wait(wait)
+
+    @contextmanager
+    def lease(self, device_id, wait=0.0):
+        """Uso exclusivo del handle: with manager.lease(id) as device: device.control_device(...)"""
+        conn = self._connections[device_id]
+        if not conn.ready.wait(wait):
+            yield None
+            return
+        with conn.lock:
+            yield conn.device
+        conn.last_ok = time.monotonic()
+
+    def report_failure(self, device_id):
+        """Marca el handle como caído (por ejemplo, tras un comando fallido) para reponerlo ya"""
+        conn = self._connections.get(device_id)
+        if conn:
+            conn.ready.clear()
+            conn.next_attempt = 0.0
+            self._wakeup.set()
+
+    def _connect(self, conn):
+        device = conn.device
+        if device.connected:
+            device.disconnect()
+        if device.connect(**conn.connect_params):
+            if conn.last_ok:
+                conn.reconnects += 1
+            conn.failures = 0
+            conn.last_ok = time.monotonic()
+            conn.ready.set()
+            return True
+        conn.failures += 1
+        delay = min(self.backoff_max, self.backoff_initial * 2 ** (conn.failures - 1))
+        conn.next_attempt = time.monotonic() + delay
+        print(f"Reconexión de {conn.device_id} fallida ({conn.failures}); próximo intento en {delay:.1f} s")
+        return False
+
+    def _check(self, conn):
+        """Verifica un handle ocioso; si está en uso se omite (el uso mismo prueba que vive)"""
+        if not conn.lock.acquire(blocking=False):
+            return
+        try:
+            if conn.device.ping():
+                conn.last_ok = time.monotonic()
+                return
+            print(f"Conexión con {conn.device_id} perdida; reconectando en segundo plano")
+            conn.ready.clear()
+            conn.next_attempt = 0.0
+            self._connect(conn)
+        finally:
+            conn.lock.release()
+
+    def _reconnect(self, conn):
+        with conn.lock:
+            self._connect(conn)
+
+    def _maintain(self, conn, task):
+        try:
+            task(conn)
+        except Exception as e:
+            print(f"Error en el mantenimiento de {conn.device_id}: {e}")
+        finally:
+            with self._lock:
+                conn.maintaining = False
+            self._wakeup.set()  # Reprograma la próxima pasada según el nuevo estado
+
+    def run_once(self):
+        """Una pasada de mantenimiento: encola en el pool las verificaciones y reconexiones que
+        tocan (una a la vez por dispositivo) y devuelve sus Futures sin esperarlas"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="connection-check")
+        now = time.monotonic()
+        futures = []
+        for conn in list(self._connections.values()):
+            if not conn.healthy:
+                task = self._reconnect if now >= conn.next_attempt else None
+            else:
+                task = self._check if now - conn.last_ok >= self.check_interval else None
+            if task is None:
+                continue
+            with self._lock:
+                if conn.maintaining:
+                    continue
+                conn.maintaining = True
+            futures.append(self._executor.submit(self._maintain, conn, task))
+        return futures
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error en el mantenimiento de conexiones: {e}")
+            pending = [conn.next_attempt for conn in self._connections.values()
+                       if not conn.healthy and not conn.maintaining]
+            timeout = self.check_interval / 2
+            if pending:
+                timeout = max(0.01, min(timeout, min(pending) - time.monotonic()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="connection-manager", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for device_id in list(self._connections):
+            self.remove(device_id)
+
+
+def _demo():
+    """Simula un corte de red y muestra que el comando posterior no espera la reconexión"""
+    from fake_commpro import FakeCommpro
+    from molinete_test import ZKTecoDevice
+
+    fake = FakeCommpro()
+    manager = ConnectionManager(check_interval=0.2, backoff_initial=0.1).start()
+    manager.add("molinete-1", ZKTecoDevice(commpro=fake))
+    manager.wait_ready("molinete-1", wait=2)
+
+    fake.simulate_outage()
+    time.sleep(0.5)
+    fake.restore()
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    with manager.lease("molinete-1") as device:
+        ok = device is not None and device.control_device(state=5)
+    print(f"Comando tras el corte: {'exitoso' if ok else 'fallido'} en {(time.perf_counter() - start) * 1000:.1f} ms; "
+          f"estado: {manager.status()}")
+    manager.stop()
+
+
+if __name__ == "__main__":
+    _demo()
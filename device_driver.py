@@ -0,0 +1,418 @@
+"""
+Interfaz común de dispositivo sobre los distintos backends.
+
+Todos los drivers exponen los métodos de ZKTecoDevice (connect, disconnect,
+ping, get_device_info, read_card, read_events, control_device,
+get_device_data, set_device_data, start_event_pump...), así la flota, el
+administrador de conexiones, el caché de autorizaciones, la carga masiva y la
+sincronización del log funcionan igual con cualquiera de ellos:
+
+- PullSDKDriver: plcommpro.dll (o cualquier objeto con la misma interfaz)
+- SocketDriver: protocolo TCP en Python puro (pullsdk_socket), sin DLL
+- FakeDriver: dispositivo en memoria para pruebas (fake_commpro)
+- ComDriver: zkemkeeper por COM (rfid/ConnectionTurnstile)
+
+Cada driver declara en capabilities qué caminos rápidos tiene, para que las
+capas de arriba elijan (por ejemplo, tabla completa en una transferencia o
+una fila por vez). Los métodos de tablas son obligatorios: un backend sin
+ese camino devuelve -13 (comando no disponible) o None, como ComDriver con
+las tablas distintas de user.
+load_profile() ajusta esas capacidades al firmware del dispositivo conectado
+con el perfil guardado en disco (capability_profile), sin volver a probar.
+
+    driver = open_driver("socket")
+    driver.connect(ip_address="192.168.1.201")
+    if driver.supports("bulk_table_write"):
+        ...
+"""
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import NamedTuple
+
+from capability_profile import ensure_profile, probe_pullsdk
+from card_dedup import CardDeduplicator
+from device_tables import render_rows
+from molinete_test import ZKTecoDevice
+from rtlog_parser import RTLogEvent
+from rtlog_pump import AdaptiveBackoff
+
+
+class Capabilities(NamedTuple):
+    bulk_table_read: bool = False  # Tabla completa en una transferencia (GetDeviceData / SSR_GetDeviceData)
+    bulk_table_write: bool = False  # Muchas filas por llamada (SetDeviceData)
+    filtered_table_read: bool = False  # Filtros por comparación en la lectura (Time_second>N)
+    event_polling: bool = False  # Los eventos se consultan (GetRTLog, GetStrCardNumber)
+    door_control: bool = False
+    device_params: bool = False  # Lectura/escritura de parámetros (GetDeviceParam)
+
+
+class DeviceDriver(ABC):
+    """Interfaz común: todos los métodos abstractos son obligatorios"""
+
+    name = ""
+    capabilities = Capabilities()
+    connected = False
+    profile = None  # CapabilityProfile del dispositivo conectado, si se cargó
+
+    def supports(self, capability):
+        return getattr(self.capabilities, capability)
+
+    @abstractmethod
+    def connect(self, ip_address="192.168.0.201", port=14370, timeout=4000, password=""):
+        ...
+
+    @abstractmethod
+    def disconnect(self):
+        ...
+
+    @abstractmethod
+    def ping(self):
+        ...
+
+    @abstractmethod
+    def get_device_info(self):
+        ...
+
+    @abstractmethod
+    def test_device_communication(self):
+        ...
+
+    @abstractmethod
+    def read_card(self):
+        ...
+
+    @abstractmethod
+    def read_events(self):
+        ...
+
+    @abstractmethod
+    def control_device(self, operation_id=1, door_id=1, index=1, state=3):
+        ...
+
+    @abstractmethod
+    def start_event_pump(self, callback=None, queue_size=1024, **options):
+        ...
+
+    @abstractmethod
+    def stop_event_pump(self):
+        ...
+
+    @abstractmethod
+    def load_profile(self, store):
+        """Carga (o prueba y guarda) el perfil del dispositivo conectado y ajusta capabilities"""
+
+    @abstractmethod
+    def get_device_data(self, table, fields="*", filter_text="", options=""):
+        """Texto de GetDeviceData, o None si falla o la tabla no está disponible"""
+
+    @abstractmethod
+    def get_device_data_count(self, table, filter_text="", options=""):
+        """Cantidad de registros, o un código de error negativo"""
+
+    @abstractmethod
+    def set_device_data(self, table, data, options=""):
+        """0, o un código de error negativo (-13 si el backend no escribe tablas)"""
+
+
+class PullSDKDriver(ZKTecoDevice, DeviceDriver):
+    """plcommpro.dll; commpro permite inyectar otra implementación con la misma interfaz"""
+
+    name = "pullsdk"
+    capabilities = Capabilities(bulk_table_read=True, bulk_table_write=True, event_polling=True,
+                                door_control=True, device_params=True)
+
+    def identity(self):
+        """(número de serie, versión de firmware) leídos con GetDeviceParam, o None si falla"""
+        if not self.connected:
+            return None
+        params = self.params.get(["~SerialNumber", "FirmVer"])
+        if params is None:
+            return None
+        return params.get("~SerialNumber", ""), params.get("FirmVer", "")
+
+    def load_profile(self, store):
+        identity = self.identity()
+        if not identity or not identity[0]:
+            print("No se pudo identificar el dispositivo; se usan las capacidades por defecto")
+            return None
+        self.profile = ensure_profile(store, *identity, self.name, lambda: probe_pullsdk(self))
+        self.capabilities = type(self).capabilities._replace(
+            filtered_table_read=self.profile.works("FilteredTransactionRead"))
+        return self.profile
+
+
+class SocketDriver(PullSDKDriver):
+    """Protocolo TCP del controlador en Python puro: funciona sin la DLL y fuera de Windows.
+    Sin tablas: su formato de tablas solo lo entiende emulator.py (ver pullsdk_socket)"""
+
+    name = "socket"
+    capabilities = PullSDKDriver.capabilities._replace(bulk_table_read=False, bulk_table_write=False)
+
+    def __init__(self, commpro=None, **device_options):
+        from pullsdk_socket import SocketCommpro
+
+        super().__init__(commpro=commpro or SocketCommpro(), **device_options)
+
+
+class FakeDriver(PullSDKDriver):
+    """Dispositivo en memoria para pruebas; fake.tap(tarjeta) simula un acercamiento"""
+
+    name = "fake"
+    capabilities = PullSDKDriver.capabilities._replace(filtered_table_read=True)
+
+    def __init__(self, metrics=None, label=None, **fake_options):
+        from fake_commpro import FakeCommpro
+
+        self.fake = FakeCommpro(**fake_options)
+        super().__init__(commpro=self.fake, metrics=metrics, label=label)
+
+
+class EventPoller:
+    """Bomba de eventos genérica: llama a driver.read_events() en un hilo con espera adaptativa.
+
+    Sin callback, los eventos quedan en la cola acotada events (como en RTLogPump).
+    Con tracer, el tramo poll de cada evento muestreado incluye el parseo (read_events).
+    read_events() se llama desde el hilo del poller: el driver debe admitirlo. ComDriver lo
+    hace a través del hilo COM de su ConnectionTurnstile, así que este hilo no necesita
+    CoInitialize ni una interfaz marshalled.
+    """
+
+    def __init__(self, driver, callback=None, queue_size=1024, min_interval=0.01, max_interval=0.1,
+                 tracer=None, device_id=0):
+        self.driver = driver
+        self.callback = callback
+        self.tracer = tracer
+        self.device_id = device_id
+        self.events = None if callback else queue.Queue(maxsize=queue_size)
+        self.backoff = AdaptiveBackoff(min_interval, max_interval)
+        self.stats = {"polls": 0, "events": 0, "dropped": 0, "errors": 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run(self):
+        while not self._stop.is_set():
+            busy = False
+            try:
+                self.stats["polls"] += 1
+                started_at = time.perf_counter()
+                events = self.driver.read_events()
+                received_at = time.perf_counter()
+                for event in events:
+                    busy = True
+                    self._dispatch(event, (started_at, received_at, received_at))
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error al leer eventos: {e}")
+            interval = self.backoff.next(busy)
+            if not busy:
+                self._stop.wait(interval)
+
+    def _dispatch(self, event, timings):
+        if self.callback:
+            if self.tracer is not None:
+                self.tracer.begin(event, self.device_id, timings)
+            try:
+                self.callback(event)
+            finally:
+                if self.tracer is not None:
+                    self.tracer.end()
+        else:
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return
+        self.stats["events"] += 1
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="event-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class ComDriver(DeviceDriver):
+    """zkemkeeper por COM (requiere Windows y pywin32). Las tarjetas se consultan con
+    las fuentes que el perfil del dispositivo marca como disponibles (GetStrCardNumber,
+    GetHIDEventCardNumAsStr); solo la tabla user se lee en bloque. Todas las llamadas a zkem,
+    incluidas las del EventPoller, se ejecutan en el hilo COM dueño de la interfaz
+    (ConnectionTurnstile.ComApartment)."""
+
+    name = "com"
+    default_capabilities = Capabilities(bulk_table_read=True, event_polling=True, door_control=True)
+
+    def __init__(self, turnstile=None, dedup_window=2.0, profile_store=None, metrics=None, label=None):
+        if turnstile is None:
+            from rfid.ConnectionTurnstile import ConnectionTurnstile
+
+            turnstile = ConnectionTurnstile(profile_store=profile_store, metrics=metrics, label=label)
+        self.turnstile = turnstile
+        self.dedup = CardDeduplicator(window=dedup_window)
+        self.event_pump = None
+
+    @property
+    def zkem(self):
+        return self.turnstile.zkem
+
+    @property
+    def connected(self):
+        return self.turnstile.connected
+
+    @property
+    def machine_number(self):
+        return self.turnstile.device_id
+
+    @property
+    def profile(self):
+        return self.turnstile.profile
+
+    @property
+    def card_sources(self):
+        return self.turnstile.card_sources
+
+    @property
+    def capabilities(self):
+        """Las del perfil del dispositivo una vez cargado (en segundo plano después de connect)"""
+        if self.profile is None:
+            return self.default_capabilities
+        return self.default_capabilities._replace(bulk_table_read=self.profile.works("SSR_GetDeviceDataCount"))
+
+    def connect(self, ip_address="192.168.0.201", port=14370, timeout=4000, password=""):
+        """Vuelve apenas hay conexión; la información y el perfil se cargan en segundo plano"""
+        if password:
+            if not self.turnstile._init_com():
+                return False
+            self.zkem.SetCommPassword(int(password))
+        return self.turnstile.connect(ip_address, port, background_info=True)
+
+    def load_profile(self, store):
+        self.turnstile.wait_device_info()
+        self.turnstile.profile_store = store
+        self.turnstile._load_profile()
+        return self.profile
+
+    def disconnect(self):
+        self.stop_event_pump()
+        return self.turnstile.disconnect()
+
+    def ping(self):
+        if not self.connected:
+            return False
+        try:
+            return bool(self.zkem.GetSerialNumber(self.machine_number)[0])
+        except Exception:
+            return False
+
+    def get_device_info(self):
+        """Misma forma que PullSDK: "Campo=valor,Campo=valor" """
+        if not self.connected:
+            print("No hay conexión activa")
+            return None
+        self.turnstile.wait_device_info()
+        self.turnstile._get_device_info()
+        return ",".join(f"{key}={value}" for key, value in self.turnstile.device_info.items())
+
+    def test_device_communication(self):
+        ok = self.ping()
+        print("Comunicación exitosa" if ok else "Error en comunicación")
+        return ok
+
+    def read_events(self):
+        """Consulta las fuentes de tarjeta una vez; las lecturas repetidas se descartan"""
+        if not self.connected:
+            return []
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        events = []
+        for source in self.card_sources:
+            result, card = getattr(self.zkem, source)()
+            if result and card and card != "0" and self.dedup.accept(card, self.machine_number, source):
+                events.append(RTLogEvent(now, "0", str(card), 1, 0, 0, 1))
+        return events
+
+    def read_card(self, timeout=10):
+        if not self.connected:
+            print("No hay conexión activa")
+            return None
+        deadline = time.time() + timeout
+        backoff = AdaptiveBackoff(0.01, 0.1)
+        while time.time() < deadline:
+            events = self.read_events()
+            if events:
+                print(f"Tarjeta RFID detectada: {events[0].card}")
+                return events[0].card
+            time.sleep(backoff.next(False))
+        print(f"Tiempo de espera agotado ({timeout} segundos). No se detectó ninguna tarjeta RFID.")
+        return None
+
+    def control_device(self, operation_id=1, door_id=1, index=1, state=3):
+        """Solo apertura de puerta (operation_id=1): ACUnlock con la demora en décimas de segundo"""
+        if not self.connected:
+            print("No hay conexión activa")
+            return False
+        if operation_id != 1:
+            print(f"Operación {operation_id} no disponible por COM")
+            return False
+        try:
+            return bool(self.zkem.ACUnlock(self.machine_number, state * 10))
+        except Exception as e:
+            print(f"Error al controlar el dispositivo: {e}")
+            return False
+
+    def get_device_data(self, table, fields="*", filter_text="", options=""):
+        """Solo la tabla user, en el mismo formato de texto que GetDeviceData"""
+        if not self.connected:
+            print("No hay conexión activa")
+            return None
+        if table != "user":
+            print(f"La tabla {table} no está disponible por COM")
+            return None
+        rows = list(self.turnstile.iter_users())
+        return render_rows(rows, fields)
+
+    def get_device_data_count(self, table, filter_text="", options=""):
+        if not self.connected:
+            return -8
+        try:
+            result, count = self.zkem.SSR_GetDeviceDataCount(self.machine_number, table, filter_text, options)
+            return count if result else -12
+        except Exception:
+            return -13
+
+    def set_device_data(self, table, data, options=""):
+        return -13  # Comando no disponible: la escritura en bloque no está expuesta por COM
+
+    def start_event_pump(self, callback=None, queue_size=1024, **options):
+        if not self.connected:
+            print("No hay conexión activa")
+            return None
+        if self.event_pump is None:
+            self.event_pump = EventPoller(self, callback, queue_size, **options)
+        return self.event_pump.start()
+
+    def stop_event_pump(self):
+        if self.event_pump is not None:
+            self.event_pump.stop()
+            self.event_pump = None
+
+
+DRIVERS = {"pullsdk": PullSDKDriver, "socket": SocketDriver, "fake": FakeDriver, "com": ComDriver}
+
+
+def open_driver(kind="pullsdk", **options):
+    """Crea un driver por nombre: pullsdk, socket, fake o com"""
+    try:
+        driver_class = DRIVERS[kind]
+    except KeyError:
+        raise ValueError(f"Driver desconocido: {kind} (opciones: {', '.join(DRIVERS)})") from None
+    return driver_class(**options)
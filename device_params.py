@@ -0,0 +1,170 @@
+"""
+Parámetros de dispositivo con caché por clave, consultas agrupadas y diferencias.
+
+Cada dispositivo tiene un ParamStore. Los pedidos de todos los que lo usan
+(get_device_info, test_device_communication, paneles que consultan la flota)
+se resuelven desde el caché mientras cada valor esté vigente; lo que falta se
+pide en la menor cantidad de llamadas GetDeviceParam posible, y en la última
+se agregan las claves ya pedidas antes que estén vencidas, para que la
+próxima consulta no necesite otra llamada. Dos hilos que piden lo mismo a la
+vez hacen una sola llamada, y la llamada al dispositivo (hasta 4 s de
+timeout) no bloquea a quienes leen valores vigentes del caché.
+
+    store = ParamStore(fetch)  # fetch(nombres) -> (código, {nombre: valor})
+    store.get(["DeviceID", "~SerialNumber"])
+    store.snapshot()
+    ...
+    store.diff()  # {"Door1Drivertime": ("5", "8")}
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_TTL = 30.0
+STATIC_TTL = 3600.0  # Propiedades de solo lectura: número de serie, firmware, modelo
+MAX_ITEMS_PER_CALL = 30  # Límite conservador de parámetros por GetDeviceParam
+
+
+def is_static(name):
+    """Los parámetros con ~ son de solo lectura en PullSDK; FirmVer tampoco cambia sin reiniciar"""
+    return name.startswith("~") or name == "FirmVer"
+
+
+def parse_params(text):
+    """ "Campo=valor,Campo=valor" -> dict"""
+    return dict(item.split("=", 1) for item in text.split(",") if "=" in item)
+
+
+def format_params(params):
+    return ",".join(f"{name}={value}" for name, value in params.items())
+
+
+class ParamStore:
+    """Caché de parámetros de un dispositivo con vencimiento por clave"""
+
+    def __init__(self, fetch, ttl=DEFAULT_TTL, ttls=None, static_ttl=STATIC_TTL, max_items=MAX_ITEMS_PER_CALL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})  # Vencimiento por clave, en segundos
+        self.static_ttl = static_ttl
+        self.max_items = max_items
+        self.last_error = 0
+        self.stats = {"hits": 0, "misses": 0, "calls": 0, "piggybacked": 0, "shared": 0, "errors": 0}
+        self._values = {}  # nombre -> (valor, instante de lectura)
+        self._wanted = {}  # nombre -> None, en orden de primer pedido
+        self._snapshot = {}
+        self._inflight = {}  # nombre -> Future de la lectura en curso que lo trae
+        self._lock = threading.Lock()
+
+    def ttl_for(self, name):
+        if name in self.ttls:
+            return self.ttls[name]
+        return self.static_ttl if is_static(name) else self.ttl
+
+    def _expired(self, name, now, max_age=None):
+        entry = self._values.get(name)
+        if entry is None:
+            return True
+        age = now - entry[1]
+        return age >= (self.ttl_for(name) if max_age is None else max_age)
+
+    def get(self, names, max_age=None):
+        """Valores de los parámetros pedidos (dict), o None si falla la lectura de alguno que faltaba.
+
+        max_age=0 fuerza la lectura del dispositivo (por ejemplo, para probar la comunicación).
+        La llamada al dispositivo se hace sin el bloqueo tomado: los pedidos que se resuelven desde
+        el caché no esperan a una lectura en curso, y quien pide una clave que ya se está leyendo
+        espera esa misma lectura en lugar de hacer otra.
+        """
+        if isinstance(names, str):
+            names = [name for name in names.split(",") if name]
+        batch = None
+        with self._lock:
+            for name in names:
+                self._wanted.setdefault(name, None)
+            now = time.monotonic()
+            missing = [name for name in names if self._expired(name, now, max_age)]
+            self.stats["hits"] += len(names) - len(missing)
+            waits = {self._inflight[name] for name in missing if name in self._inflight}
+            own = [name for name in missing if name not in self._inflight]
+            self.stats["misses"] += len(missing)
+            self.stats["shared"] += len(missing) - len(own)
+            if own:
+                batch = self._plan(own, now)
+                future = Future()
+                for name in batch:
+                    self._inflight[name] = future
+        ok = True
+        if batch is not None:
+            ok = self._refresh(batch, future)
+        for pending in waits:
+            ok = pending.result() and ok
+        if not ok:
+            return None
+        with self._lock:
+            return {name: self._values[name][0] for name in names if name in self._values}
+
+    def _plan(self, missing, now):
+        """Claves a pedir: las que faltan y, hasta completar la última tanda de max_items, claves
+        vencidas que ya se pidieron antes (y que nadie está leyendo)"""
+        pending = set(missing)
+        extra = [name for name in self._wanted
+                 if name not in pending and name not in self._inflight and self._expired(name, now)]
+        room = -len(missing) % self.max_items
+        self.stats["piggybacked"] += len(extra[:room])
+        return missing + extra[:room]
+
+    def _refresh(self, batch_names, future):
+        """Pide las claves en tandas de max_items (sin el bloqueo) y resuelve future con True/False"""
+        ok = True
+        try:
+            for start in range(0, len(batch_names), self.max_items):
+                chunk = batch_names[start:start + self.max_items]
+                ret, values = self.fetch(chunk)
+                read_at = time.monotonic()
+                with self._lock:
+                    self.stats["calls"] += 1
+                    if ret < 0:
+                        self.last_error = ret
+                        self.stats["errors"] += 1
+                        ok = False
+                        break
+                    for name in chunk:
+                        if name in values:
+                            self._values[name] = (values[name], read_at)
+                        else:
+                            self._values.pop(name, None)
+        except Exception:
+            ok = False
+            raise
+        finally:
+            with self._lock:
+                for name in batch_names:
+                    if self._inflight.get(name) is future:
+                        del self._inflight[name]
+            future.set_result(ok)
+        return ok
+
+    def invalidate(self, names=None):
+        """Descarta valores del caché (todos si names es None), por ejemplo después de SetDeviceParam"""
+        with self._lock:
+            if names is None:
+                self._values.clear()
+            else:
+                for name in names:
+                    self._values.pop(name, None)
+
+    def snapshot(self):
+        """Guarda los valores actuales como referencia para diff() y los devuelve"""
+        with self._lock:
+            self._snapshot = {name: value for name, (value, _) in self._values.items()}
+            return dict(self._snapshot)
+
+    def diff(self):
+        """{nombre: (antes, ahora)} de lo que cambió desde el último snapshot() (antes es None si es nuevo).
+
+        Las claves descartadas con invalidate() no cuentan como cambio hasta que se vuelven a leer.
+        """
+        with self._lock:
+            return {name: (self._snapshot.get(name), value) for name, (value, _) in self._values.items()
+                    if self._snapshot.get(name) != value}
@@ -0,0 +1,107 @@
+"""
+Utilidades para las tablas de datos de PullSDK (user, userauthorize, transaction...).
+
+GetDeviceData devuelve una línea de cabecera con los nombres de campo y luego
+una fila por registro, con valores separados por coma y filas por \\r\\n.
+"""
+
+
+def iter_table_rows(data):
+    """Recorre las filas de un resultado de GetDeviceData como dicts, sin armar una lista"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).split(b"\0", 1)[0].decode("utf-8", errors="ignore")
+    start = 0
+    header = None
+    length = len(data)
+    while start < length:
+        end = data.find("\r\n", start)
+        if end < 0:
+            end = length
+        line = data[start:end]
+        start = end + 2
+        if not line:
+            continue
+        if header is None:
+            header = line.split(",")
+            continue
+        yield dict(zip(header, line.split(",")))
+
+
+def format_table_row(row):
+    """Convierte un dict en una fila de SetDeviceData: "Campo=valor\\tCampo=valor" (bytes)"""
+    return "\t".join(f"{field}={value}" for field, value in row.items()).encode()
+
+
+def _parse_condition(condition):
+    """ "Campo=valor", "Campo>valor"... -> (campo, operador, valor), o None"""
+    for operator in (">=", "<=", ">", "<", "="):
+        field, sep, value = condition.partition(operator)
+        if sep:
+            return field.strip(), operator, value.strip()
+    return None
+
+
+def _matches(row, field, operator, value):
+    actual = row.get(field)
+    if operator == "=":
+        return actual == value
+    try:
+        actual, value = int(actual), int(value)
+    except (TypeError, ValueError):
+        return False
+    if operator == ">":
+        return actual > value
+    if operator == ">=":
+        return actual >= value
+    if operator == "<":
+        return actual < value
+    return actual <= value
+
+
+def select_rows(rows, filter_text):
+    """Filtra filas con condiciones "Campo=valor" separadas por coma (filtro de GetDeviceData).
+
+    También admite comparaciones numéricas (Time_second>N), como los firmwares
+    que permiten leer la tabla transaction de forma incremental.
+    """
+    conditions = [parsed for parsed in map(_parse_condition, filter_text.split(",")) if parsed]
+    if not conditions:
+        return list(rows)
+    if all(operator == "=" for _, operator, _ in conditions):
+        return [row for row in rows if all(row.get(field) == value for field, _, value in conditions)]
+    return [row for row in rows if all(_matches(row, *condition) for condition in conditions)]
+
+
+def render_rows(rows, fieldnames):
+    """Arma el texto de GetDeviceData: cabecera con los campos y una fila por registro"""
+    fieldnames = fieldnames.strip()
+    if fieldnames in ("", "*"):
+        fields = list(rows[0]) if rows else []
+    else:
+        fields = fieldnames.split("\t")
+    lines = [",".join(fields)] + [",".join(row.get(field, "") for field in fields) for row in rows]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def parse_row_payload(payload):
+    """Filas de SetDeviceData -> lista de dicts, o None si alguna no trae un Pin numérico"""
+    rows = []
+    for line in payload.split("\r\n"):
+        if not line:
+            continue
+        row = dict(pair.split("=", 1) for pair in line.split("\t") if "=" in pair)
+        if not row.get("Pin") or not row["Pin"].isdigit():
+            return None
+        rows.append(row)
+    return rows
+
+
+def upsert_rows(rows, new_rows):
+    """Inserta o actualiza (por Pin) las filas nuevas en la tabla"""
+    index = {row.get("Pin"): i for i, row in enumerate(rows)}
+    for row in new_rows:
+        if row["Pin"] in index:
+            rows[index[row["Pin"]]].update(row)
+        else:
+            index[row["Pin"]] = len(rows)
+            rows.append(row)
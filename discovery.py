@@ -0,0 +1,212 @@
+"""
+Descubrimiento de dispositivos en varias subredes a la vez, con caché por TTL.
+
+Cada destino (broadcast dirigido, subred en notación CIDR o IP puntual) se
+consulta en paralelo. Las respuestas "MAC=...,IP=...,SN=...,Device=..." se
+convierten en registros estructurados y se guardan por destino: una nueva
+consulta devuelve lo que está en caché y solo vuelve a escanear los
+destinos vencidos.
+"""
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import create_string_buffer
+from typing import NamedTuple
+
+SEARCH_PORT = 65535
+SEARCH_MESSAGE = b"CallSecurityDevice"
+
+
+class DeviceRecord(NamedTuple):
+    mac: str
+    ip: str
+    serial: str
+    device_type: str
+    netmask: str = ""
+    gateway: str = ""
+    version: str = ""
+
+
+_FIELDS = {"MAC": "mac", "IP": "ip", "SN": "serial", "Device": "device_type",
+           "NetMask": "netmask", "GATEIPAddress": "gateway", "Ver": "version"}
+
+
+def parse_search_reply(text):
+    """Convierte las líneas de SearchDevice (o respuestas UDP) en DeviceRecord"""
+    records = []
+    for line in text.replace("\r\n", "\n").split("\n"):
+        values = {}
+        for pair in line.split(","):
+            key, sep, value = pair.partition("=")
+            field = _FIELDS.get(key.strip())
+            if sep and field:
+                values[field] = value.strip()
+        if values.get("mac") or values.get("ip"):
+            values.setdefault("mac", "")
+            values.setdefault("ip", "")
+            values.setdefault("serial", "")
+            values.setdefault("device_type", "")
+            records.append(DeviceRecord(**values))
+    return records
+
+
+def broadcast_address(target):
+    """Subred CIDR -> broadcast dirigido; cualquier otra dirección se usa tal cual"""
+    if "/" in target:
+        return str(ipaddress.ip_network(target, strict=False).broadcast_address)
+    return target
+
+
+class DllSearch:
+    """Búsqueda con SearchDevice de plcommpro.dll"""
+
+    def __init__(self, commpro, buffer_size=64 * 1024):
+        self.commpro = commpro
+        self.buffer_size = buffer_size
+
+    def __call__(self, target):
+        buffer = create_string_buffer(self.buffer_size)
+        ret = self.commpro.SearchDevice(b"UDP", broadcast_address(target).encode(), buffer)
+        if ret <= 0:
+            return []
+        return parse_search_reply(buffer.value.decode("utf-8", errors="ignore"))
+
+
+class UdpSearch:
+    """Búsqueda directa por UDP, sin DLL. target admite "dirección[:puerto]" """
+
+    def __init__(self, port=SEARCH_PORT, timeout=1.0):
+        self.port = port
+        self.timeout = timeout
+
+    def __call__(self, target):
+        address, _, port = target.partition(":") if "/" not in target else (target, "", "")
+        address = broadcast_address(address)
+        port = int(port) if port else self.port
+        records = {}
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.sendto(SEARCH_MESSAGE, (address, port))
+            deadline = time.monotonic() + self.timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, _ = sock.recvfrom(4096)
+                except socket.timeout:
+                    break
+                for record in parse_search_reply(data.decode("utf-8", errors="ignore")):
+                    records[record.mac or record.ip] = record
+        return list(records.values())
+
+
+class DiscoveryEngine:
+    """Consulta varios destinos en paralelo y guarda los resultados por destino con TTL"""
+
+    def __init__(self, search=None, ttl=300.0, max_workers=16):
+        self.search = search or UdpSearch()
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="discovery")
+        self._cache = {}  # destino -> (instante, [DeviceRecord])
+        self._lock = threading.Lock()
+        self.last_added = []
+        self.last_removed = []
+
+    def _scan(self, target):
+        try:
+            return self.search(target)
+        except Exception as e:
+            print(f"Error al buscar dispositivos en {target}: {e}")
+            return None
+
+    def discover(self, targets, force=False):
+        """Devuelve {mac_o_ip: DeviceRecord} de todos los destinos; solo escanea los vencidos"""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._merge(targets)
+            stale = [target for target in targets
+                     if force or target not in self._cache or now - self._cache[target][0] > self.ttl]
+        futures = {target: self._executor.submit(self._scan, target) for target in stale}
+        for target, future in futures.items():
+            records = future.result()
+            if records is not None:
+                with self._lock:
+                    self._cache[target] = (time.monotonic(), records)
+        with self._lock:
+            devices = self._merge(targets)
+        self.last_added = [devices[key] for key in devices.keys() - previous.keys()]
+        self.last_removed = [previous[key] for key in previous.keys() - devices.keys()]
+        return devices
+
+    def _merge(self, targets):
+        devices = {}
+        for target in targets:
+            for record in self._cache.get(target, (0, []))[1]:
+                devices[record.mac or record.ip] = record
+        return devices
+
+    def invalidate(self, target=None):
+        """Fuerza a volver a escanear un destino (o todos)"""
+        with self._lock:
+            if target is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(target, None)
+
+
+class UdpResponder:
+    """Responde a la búsqueda UDP como lo haría un dispositivo (para pruebas locales)"""
+
+    def __init__(self, records, host="127.0.0.1", port=0, delay=0.0):
+        self.records = records
+        self.delay = delay
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, peer = self.sock.recvfrom(1024)
+            except OSError:
+                return
+            if data != SEARCH_MESSAGE:
+                continue
+            if self.delay:
+                time.sleep(self.delay)
+            for record in self.records:
+                reply = (f"MAC={record.mac},IP={record.ip},NetMask={record.netmask},"
+                         f"GATEIPAddress={record.gateway},SN={record.serial},"
+                         f"Device={record.device_type},Ver={record.version}")
+                self.sock.sendto(reply.encode(), peer)
+
+    def close(self):
+        self.sock.close()
+
+
+def _demo(subnets=8, delay=0.3):
+    """Varias "subredes" locales con latencia de respuesta: primer escaneo en paralelo y luego desde caché"""
+    responders = [
+        UdpResponder([DeviceRecord(f"00:17:61:00:{i:02x}:01", f"10.{i}.0.201", f"SN{i:04d}", "TS2011")], delay=delay)
+        for i in range(subnets)
+    ]
+    targets = [f"{host}:{port}" for host, port in (responder.address for responder in responders)]
+    engine = DiscoveryEngine(UdpSearch(timeout=delay + 0.2), ttl=60)
+    for attempt in ("primer escaneo", "desde caché"):
+        start = time.perf_counter()
+        devices = engine.discover(targets)
+        print(f"{attempt}: {len(devices)} dispositivos en {(time.perf_counter() - start) * 1000:.1f} ms")
+    for record in devices.values():
+        print(f"  {record.mac}  {record.ip}  {record.serial}  {record.device_type}")
+    for responder in responders:
+        responder.close()
+
+
+if __name__ == "__main__":
+    _demo()
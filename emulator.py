@@ -0,0 +1,297 @@
+"""
+Emulador de controladores C2-260/TS2011 para pruebas de carga y latencia.
+
+Cada dispositivo emulado escucha en su propio puerto TCP y habla el mismo
+protocolo que pullsdk_socket.SocketCommpro: conexión, GetDeviceParam,
+GetRTLog (con los números de tarjeta de cada acercamiento), ControlDevice y
+las tablas user/userauthorize/transaction. Un solo proceso asyncio atiende
+cientos de dispositivos.
+
+Se puede configurar la tasa de acercamientos de tarjeta (miles por segundo
+en total), la latencia de cada respuesta y la inyección de errores con los
+códigos de ZKTecoDevice._print_error_description.
+
+Uso:
+    python emulator.py --devices 200 --base-port 14370 --tap-rate 2000 --latency-ms 2 --error-rate 0.001
+"""
+import argparse
+import asyncio
+import random
+import struct
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from device_tables import parse_row_payload, render_rows, select_rows, upsert_rows
+from pullsdk_socket import (
+    CMD_CONNECT, CMD_CONTROL, CMD_DATACOUNT, CMD_DISCONNECT, CMD_GETDATA, CMD_GETPARAM, CMD_RTLOG,
+    CMD_SETDATA, CMD_SETPARAM, EMULATOR_TAG, HEADER, MESSAGE_END, MESSAGE_START, PAGE, REPLY_ERROR, REPLY_OK, SESSION,
+    crc16, encode_frame, encode_time, pack_rtlog_record,
+)
+
+DEFAULT_ERROR_CODES = (-2, -5, -12, -104)  # Sin respuesta, largo incorrecto, comando fallido, error de RT log
+MAX_RTLOG_RECORDS = 1000  # Registros por respuesta de GetRTLog
+PAGE_ROWS = 2000  # Filas por página de GetDeviceData
+PAGE_BYTES = 60_000
+
+
+class EmulatedDevice:
+    """Estado de un controlador: parámetros, tablas, log en tiempo real e historial de transacciones"""
+
+    def __init__(self, serial_number, users=0, latency=0.0, error_rate=0.0, error_codes=DEFAULT_ERROR_CODES,
+                 rtlog_capacity=100_000, transaction_capacity=100_000, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.random = random.Random(seed)
+        self.params = {
+            "DeviceID": "1",
+            "~DeviceName": "TS2011",
+            "~SerialNumber": serial_number,
+            "~ZKFPVersion": "10",
+            "FirmVer": "AC Ver 4.3.4 Apr 28 2017",
+            "Door1SensorType": "0",
+            "Door1Drivertime": "5",
+            "Door1Intertime": "0",
+            "IPAddress": "127.0.0.1",
+        }
+        self.tables = {"user": [], "userauthorize": [], "transaction": deque(maxlen=transaction_capacity)}
+        self.rt_log = deque(maxlen=rtlog_capacity)  # Si se llena se pierden los más antiguos
+        self.stats = {"requests": 0, "errors_injected": 0, "taps": 0, "opens": 0}
+        for pin in range(1, users + 1):
+            self.tables["user"].append({"CardNo": str(10_000_000 + pin), "Pin": str(pin), "Password": "",
+                                        "Group": "0", "StartTime": "0", "EndTime": "0"})
+            self.tables["userauthorize"].append({"Pin": str(pin), "AuthorizeTimezoneId": "1", "AuthorizeDoorId": "15"})
+
+    def tap(self, card=None, door=1, pin=None, event_type=0, in_out=0, verify_mode=1):
+        """Registra un acercamiento de tarjeta (si no se indica, una de un usuario al azar)"""
+        users = self.tables["user"]
+        if card is None:
+            if users:
+                user = users[self.random.randrange(len(users))]
+                card, pin = user["CardNo"], user["Pin"]
+            else:
+                card = self.random.randrange(1, 99_999_999)
+        pin = pin or 0
+        self.rt_log.append(pack_rtlog_record(card, pin, door, event_type, in_out, verify_mode))
+        self.tables["transaction"].append({
+            "Cardno": str(card), "Pin": str(pin), "Verified": str(verify_mode), "DoorID": str(door),
+            "EventType": str(event_type), "InOutState": str(in_out), "Time_second": str(encode_time(datetime.now())),
+        })
+        self.stats["taps"] += 1
+
+    def handle(self, command, data):
+        """Procesa un comando y devuelve (comando de respuesta, datos)"""
+        self.stats["requests"] += 1
+        if command not in (CMD_CONNECT, CMD_DISCONNECT) and self.error_rate and self.random.random() < self.error_rate:
+            self.stats["errors_injected"] += 1
+            return REPLY_ERROR, struct.pack("<b", self.random.choice(self.error_codes))
+
+        if command == CMD_GETPARAM:
+            names = [name for name in data.decode("utf-8", errors="ignore").split(",") if name]
+            return REPLY_OK, ",".join(f"{name}={self.params.get(name, '')}" for name in names).encode()
+        if command == CMD_SETPARAM:
+            for pair in data.decode("utf-8", errors="ignore").split(","):
+                key, sep, value = pair.partition("=")
+                if sep:
+                    self.params[key] = value
+            return REPLY_OK, b""
+        if command == CMD_RTLOG:
+            count = min(len(self.rt_log), MAX_RTLOG_RECORDS)
+            return REPLY_OK, b"".join(self.rt_log.popleft() for _ in range(count))
+        if command == CMD_CONTROL:
+            if len(data) < 5:
+                return REPLY_ERROR, struct.pack("<b", -11)
+            if data[0] == 1:
+                self.stats["opens"] += 1
+            return REPLY_OK, b""
+        if command == CMD_DATACOUNT:
+            parts = data.decode("utf-8", errors="ignore").split("\0")
+            rows = self.tables.get(parts[0])
+            if rows is None:
+                return REPLY_ERROR, struct.pack("<b", -100)
+            return REPLY_OK, struct.pack("<I", len(select_rows(rows, parts[1] if len(parts) > 1 else "")))
+        if command == CMD_GETDATA:
+            first, _ = PAGE.unpack_from(data, 0)
+            parts = data[PAGE.size:].decode("utf-8", errors="ignore").split("\0")
+            rows = self.tables.get(parts[0])
+            if rows is None:
+                return REPLY_ERROR, struct.pack("<b", -100)
+            selected = select_rows(rows, parts[2] if len(parts) > 2 else "")
+            fields = parts[1] if len(parts) > 1 else "*"
+            # Página: tantas filas como entren en una trama
+            text = render_rows(selected[first:first + PAGE_ROWS], fields).encode()
+            count = min(PAGE_ROWS, max(0, len(selected) - first))
+            while len(text) > PAGE_BYTES and count > 1:
+                count //= 2
+                text = render_rows(selected[first:first + count], fields).encode()
+            more = first + count < len(selected)
+            return REPLY_OK, PAGE.pack(count, more) + text
+        if command == CMD_SETDATA:
+            parts = data.decode("utf-8", errors="ignore").split("\0")
+            rows = self.tables.get(parts[0])
+            if rows is None or parts[0] == "transaction":
+                return REPLY_ERROR, struct.pack("<b", -100)
+            new_rows = parse_row_payload(parts[1] if len(parts) > 1 else "")
+            if new_rows is None:
+                return REPLY_ERROR, struct.pack("<b", -11)
+            upsert_rows(rows, new_rows)
+            return REPLY_OK, b""
+        if command == CMD_DISCONNECT:
+            return REPLY_OK, b""
+        return REPLY_ERROR, struct.pack("<b", -13)
+
+
+class EmulatorServer:
+    """Levanta un servidor TCP por dispositivo emulado y genera acercamientos de tarjeta"""
+
+    def __init__(self, devices=1, host="127.0.0.1", base_port=0, tap_rate=0.0, **device_options):
+        self.host = host
+        self.base_port = base_port
+        self.tap_rate = tap_rate  # Acercamientos por segundo, en total
+        self.devices = [EmulatedDevice(f"EMU{i:05d}", seed=i, **device_options) for i in range(devices)]
+        self.ports = []
+        self._servers = []
+        self._loop = None
+        self._thread = None
+        self._tap_task = None
+        self._clients = {}  # StreamWriter -> tarea que atiende la conexión
+
+    async def _serve_client(self, device, reader, writer):
+        session_id = 0
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                header = await reader.readexactly(5)
+                start, _, command, length = HEADER.unpack(header)
+                rest = await reader.readexactly(length + 3)
+                if start != MESSAGE_START or rest[-1] != MESSAGE_END:
+                    break
+                body = header[1:] + rest[:length]
+                if struct.unpack_from("<H", rest, length)[0] != crc16(body):
+                    break
+                data = rest[:length]
+                prefix = b""
+                if session_id and length >= SESSION.size:
+                    prefix = data[:SESSION.size]
+                    data = data[SESSION.size:]
+                if device.latency:
+                    await asyncio.sleep(device.latency)
+                if command == CMD_CONNECT:
+                    session_id = device.random.randrange(1, 0xFFFF)
+                    reply, payload = REPLY_OK, struct.pack("<H", session_id) + EMULATOR_TAG
+                else:
+                    reply, payload = device.handle(command, data)
+                writer.write(encode_frame(reply, prefix + payload))
+                await writer.drain()
+                if command == CMD_DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def _tap_loop(self):
+        tick = 0.01
+        carry = 0.0
+        next_device = 0
+        while True:
+            await asyncio.sleep(tick)
+            carry += self.tap_rate * tick
+            taps = int(carry)
+            carry -= taps
+            for _ in range(taps):
+                self.devices[next_device].tap()
+                next_device = (next_device + 1) % len(self.devices)
+
+    async def start(self):
+        for i, device in enumerate(self.devices):
+            port = self.base_port + i if self.base_port else 0
+            server = await asyncio.start_server(
+                lambda r, w, device=device: self._serve_client(device, r, w), self.host, port)
+            self._servers.append(server)
+            self.ports.append(server.sockets[0].getsockname()[1])
+        if self.tap_rate:
+            self._tap_task = asyncio.create_task(self._tap_loop())
+
+    async def close(self):
+        """Deja de aceptar conexiones, cierra las abiertas y espera a que terminen sus tareas"""
+        if self._tap_task:
+            self._tap_task.cancel()
+            await asyncio.gather(self._tap_task, return_exceptions=True)
+            self._tap_task = None
+        for server in self._servers:
+            server.close()
+        clients = list(self._clients.items())
+        for writer, _ in clients:
+            writer.close()
+        await asyncio.gather(*(task for _, task in clients), return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+
+    def start_in_thread(self):
+        """Ejecuta el emulador en un hilo propio (útil para benchmarks en el mismo proceso)"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="emulator", daemon=True)
+        self._thread.start()
+        ready.wait(30)
+        return self
+
+    def call_in_loop(self, fn, *args):
+        """Ejecuta fn dentro del loop del emulador (por ejemplo device.tap) sin condiciones de carrera"""
+        self._loop.call_soon_threadsafe(fn, *args)
+
+    def stop(self):
+        """Cierra servidores y conexiones dentro del loop y recién después lo detiene"""
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self.close(), self._loop).result(10)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(10)
+            self._loop = None
+
+    def connect_string(self, index, timeout=4000):
+        return f"protocol=TCP,ipaddress={self.host},port={self.ports[index]},timeout={timeout},passwd="
+
+
+async def _main(args):
+    server = EmulatorServer(
+        devices=args.devices, host=args.host, base_port=args.base_port, tap_rate=args.tap_rate,
+        users=args.users, latency=args.latency_ms / 1000, error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(",")],
+    )
+    await server.start()
+    print(f"Emulando {args.devices} dispositivos en {args.host}:{server.ports[0]}-{server.ports[-1]} "
+          f"({args.tap_rate:.0f} tarjetas/s, latencia {args.latency_ms} ms, errores {args.error_rate:.2%})")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            totals = {key: sum(device.stats[key] for device in server.devices) for key in server.devices[0].stats}
+            print(f"[{time.strftime('%H:%M:%S')}] {totals}")
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulador de molinetes ZKTeco")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=14370)
+    parser.add_argument("--tap-rate", type=float, default=1.0, help="acercamientos de tarjeta por segundo (total)")
+    parser.add_argument("--users", type=int, default=100, help="usuarios con tarjeta por dispositivo")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-codes", default=",".join(str(code) for code in DEFAULT_ERROR_CODES))
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        print("Emulador detenido")
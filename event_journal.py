@@ -0,0 +1,373 @@
+"""
+Diario de eventos de acceso: solo anexar, registros binarios de ancho fijo,
+escritos sobre archivos mapeados en memoria (mmap) que rotan por segmentos.
+
+Cada registro ocupa 32 bytes: instante (microsegundos), tarjeta (int64),
+dispositivo, código de evento, puerta, sentido y un CRC32. Anexar es copiar
+32 bytes al mapa; un hilo de fondo hace el fsync (mmap.flush) en grupo cada
+commit_interval segundos o cada commit_records registros, y recién entonces
+actualiza en la cabecera del segmento la cantidad de registros confirmados.
+El fsync corre fuera del bloqueo de append(): solo se toma el bloqueo para
+leer hasta dónde confirmar, así que anexar nunca espera al disco. Al rotar,
+el segmento lleno queda pendiente y el mismo hilo lo confirma y lo cierra.
+
+Los campos numéricos fuera de rango (por ejemplo el -1 que deja el parser
+cuando un campo no se puede leer) se guardan como el máximo del campo
+(puerta 255, evento 65535, sentido 255), que significa "desconocido"; una
+tarjeta que no entra en 64 bits se guarda como 0 (sin tarjeta).
+
+Tras un corte, al abrir el diario se conservan los registros confirmados y
+los siguientes cuyo CRC sea válido; desde el primer registro inválido (una
+escritura a medias) el segmento se trunca, es decir, se vuelve a poner en
+ceros.
+
+    journal = EventJournal("diario")
+    journal.append_event(event, device_id=3)   # RTLogEvent de la bomba de eventos
+    for record in journal.read():
+        ...
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+from auth_cache import normalize_card
+
+MAGIC = b"ZKJRNL01"
+HEADER = struct.Struct("<8sHBxIQ")  # magic, versión, cerrado, tamaño de registro, registros confirmados
+HEADER_SIZE = mmap.ALLOCATIONGRANULARITY if mmap.ALLOCATIONGRANULARITY >= 4096 else 4096
+BODY = struct.Struct("<qqIHBB4x")  # microsegundos, tarjeta, dispositivo, evento, puerta, sentido
+CRC = struct.Struct("<I")
+RECORD_SIZE = BODY.size + CRC.size
+ZERO_CHUNK = bytes(64 * 1024)
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".seg"
+
+
+class JournalRecord(NamedTuple):
+    timestamp: float  # Segundos desde la época
+    device_id: int
+    door: int
+    card: int  # 0 = sin tarjeta
+    event_code: int
+    direction: int  # InOutState del evento
+
+
+UNKNOWN_DOOR = 0xFF
+UNKNOWN_EVENT = 0xFFFF
+UNKNOWN_DIRECTION = 0xFF
+MAX_DEVICE_ID = 0xFFFFFFFF
+MAX_CARD = 2 ** 63 - 1
+
+
+def pack_body(timestamp, device_id, door, card, event_code, direction):
+    """Registro sin el CRC (BODY); los campos fuera de rango quedan como "desconocido" """
+    if not 0 <= door <= UNKNOWN_DOOR:
+        door = UNKNOWN_DOOR
+    if not 0 <= event_code <= UNKNOWN_EVENT:
+        event_code = UNKNOWN_EVENT
+    if not 0 <= direction <= UNKNOWN_DIRECTION:
+        direction = UNKNOWN_DIRECTION
+    if not 0 <= device_id <= MAX_DEVICE_ID:
+        raise ValueError(f"ID de dispositivo fuera de rango: {device_id}")
+    if card is None or not 0 <= card <= MAX_CARD:
+        card = 0
+    return BODY.pack(int(timestamp * 1_000_000), card, device_id, event_code, door, direction)
+
+
+def pack_record(timestamp, device_id, door, card, event_code, direction):
+    body = pack_body(timestamp, device_id, door, card, event_code, direction)
+    return body + CRC.pack(zlib.crc32(body))
+
+
+def unpack_record(data, offset=0):
+    """JournalRecord del registro en offset, o None si está vacío o su CRC no coincide"""
+    body = data[offset:offset + BODY.size]
+    (crc,) = CRC.unpack_from(data, offset + BODY.size)
+    if crc != zlib.crc32(body):
+        return None
+    micros, card, device_id, event_code, door, direction = BODY.unpack(body)
+    return JournalRecord(micros / 1_000_000, device_id, door, card, event_code, direction)
+
+
+@lru_cache(maxsize=4096)
+def event_timestamp(text):
+    """Hora "AAAA-MM-DD HH:MM:SS" de GetRTLog como segundos desde la época (hora local)"""
+    try:
+        return datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+class _Segment:
+    """Un archivo del diario mapeado completo en memoria"""
+
+    def __init__(self, path, size=None):
+        self.path = path
+        create = size is not None and not os.path.exists(path)
+        self.file = open(path, "w+b" if create else "r+b")
+        if create:
+            self.file.truncate(size)
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        self.capacity = (len(self.mm) - HEADER_SIZE) // RECORD_SIZE
+        if create:
+            HEADER.pack_into(self.mm, 0, MAGIC, 1, 0, RECORD_SIZE, 0)
+            self.mm.flush(0, HEADER_SIZE)
+        magic, _, closed, record_size, committed = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or record_size != RECORD_SIZE:
+            self.close()
+            raise ValueError(f"{path} no es un segmento del diario de eventos")
+        self.closed = bool(closed)
+        self.committed = committed
+        self.count = committed
+
+    def offset(self, index):
+        return HEADER_SIZE + index * RECORD_SIZE
+
+    def recover(self):
+        """Conserva los registros válidos que siguen a los confirmados y pone en ceros el resto.
+
+        Devuelve la cantidad de registros (completos o a medias) descartados.
+        """
+        index = self.committed
+        while index < self.capacity and unpack_record(self.mm, self.offset(index)) is not None:
+            index += 1
+        self.count = index
+        discarded = 0
+        position = self.offset(index)
+        end = self.offset(self.capacity)
+        while position < end:
+            chunk = min(len(ZERO_CHUNK), end - position)
+            if self.mm[position:position + chunk] != ZERO_CHUNK[:chunk]:
+                discarded += sum(1 for i in range(0, chunk, RECORD_SIZE)
+                                 if self.mm[position + i:position + i + RECORD_SIZE] != ZERO_CHUNK[:RECORD_SIZE])
+                self.mm[position:position + chunk] = ZERO_CHUNK[:chunk]
+            position += chunk
+        self.commit()
+        return discarded
+
+    def commit(self, count=None):
+        """fsync de los registros hasta count (por defecto todos) y luego de la cabecera con el total
+        confirmado. Otros hilos pueden seguir escribiendo registros después de count mientras tanto"""
+        count = self.count if count is None else count
+        if count <= self.committed:
+            return
+        start = self.offset(self.committed) // mmap.PAGESIZE * mmap.PAGESIZE
+        self.mm.flush(start, self.offset(count) - start)
+        self.committed = count
+        HEADER.pack_into(self.mm, 0, MAGIC, 1, int(self.closed), RECORD_SIZE, self.committed)
+        self.mm.flush(0, HEADER_SIZE)
+
+    def seal(self):
+        """Marca el segmento como completo y recorta el archivo a los registros escritos"""
+        self.closed = True
+        self.commit()
+        HEADER.pack_into(self.mm, 0, MAGIC, 1, 1, RECORD_SIZE, self.committed)
+        self.mm.flush(0, HEADER_SIZE)
+        used = self.offset(self.count)
+        self.mm.close()
+        self.file.truncate(used)
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+    def close(self):
+        if not self.mm.closed:
+            self.mm.close()
+        self.file.close()
+
+
+class EventJournal:
+    """Diario de eventos persistente con confirmación (fsync) en grupo"""
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, commit_interval=0.01,
+                 commit_records=8192, max_segments=None):
+        self.directory = directory
+        self.segment_size = HEADER_SIZE + (segment_size - HEADER_SIZE) // RECORD_SIZE * RECORD_SIZE
+        self.commit_interval = commit_interval
+        self.commit_records = commit_records
+        self.max_segments = max_segments  # Segmentos completos a conservar (None = todos)
+        self.stats = {"appended": 0, "commits": 0, "rotations": 0, "recovered_discarded": 0}
+        self._lock = threading.Lock()  # Protege el segmento actual y los contadores; nunca durante un fsync
+        self._commit_lock = threading.Lock()  # Un solo commit() a la vez
+        self._committed_cond = threading.Condition(self._lock)
+        self._retired = []  # (número, segmento lleno) pendientes de confirmar y cerrar
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._sequence = 0  # Registros anexados desde que se abrió el diario
+        self._committed_sequence = 0
+        os.makedirs(directory, exist_ok=True)
+
+        numbers = self._segment_numbers()
+        self._number = numbers[-1] if numbers else 1
+        segment = _Segment(self._path(self._number), self.segment_size) if numbers else None
+        if segment is not None and segment.closed:
+            segment.close()
+            segment = None
+            self._number += 1
+        if segment is None:
+            segment = _Segment(self._path(self._number), self.segment_size)
+        else:
+            self.stats["recovered_discarded"] = segment.recover()
+        self._segment = segment
+
+        self._thread = threading.Thread(target=self._run, name="event-journal", daemon=True)
+        self._thread.start()
+
+    def _path(self, number):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:08d}{SEGMENT_SUFFIX}")
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                number = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+                if number.isdigit():
+                    numbers.append(int(number))
+        return sorted(numbers)
+
+    def append(self, timestamp, device_id, door, card, event_code, direction=0, sync=False):
+        """Anexa un registro. Con sync=True espera a que esté en disco (comparte el fsync con otros)"""
+        record = pack_record(timestamp, device_id, door, card, event_code, direction)
+        with self._lock:
+            segment = self._segment
+            if segment.count >= segment.capacity:
+                segment = self._rotate()
+            position = segment.offset(segment.count)
+            segment.mm[position:position + RECORD_SIZE] = record
+            segment.count += 1
+            self._sequence += 1
+            sequence = self._sequence
+            self.stats["appended"] += 1
+            pending = segment.count - segment.committed
+            if pending >= self.commit_records:
+                self._wakeup.set()
+            if sync:
+                self._wakeup.set()
+                while self._committed_sequence < sequence and not self._stop.is_set():
+                    self._committed_cond.wait(1.0)
+        return sequence
+
+    def append_event(self, event, device_id=0, sync=False):
+        """Anexa un RTLogEvent (de rtlog_parser) leído del dispositivo device_id"""
+        timestamp = event_timestamp(event.time) or time.time()
+        return self.append(timestamp, device_id, event.door, normalize_card(event.card),
+                           event.event_type, event.in_out, sync)
+
+    def _rotate(self):
+        """Pasa a un segmento nuevo (con self._lock tomado); el lleno lo cierra el próximo commit()"""
+        self._retired.append((self._number, self._segment))
+        self.stats["rotations"] += 1
+        self._number += 1
+        self._segment = _Segment(self._path(self._number), self.segment_size)
+        self._wakeup.set()
+        return self._segment
+
+    def commit(self):
+        """Confirma (fsync) todo lo anexado hasta ahora. El fsync se hace sin bloquear append()"""
+        with self._commit_lock:
+            with self._lock:
+                retired = list(self._retired)
+                segment, count, sequence = self._segment, self._segment.count, self._sequence
+            flushed = count > segment.committed
+            for number, old in retired:
+                old.commit()  # Ya no recibe registros: se confirma completo
+                with self._lock:
+                    self._retired.remove((number, old))  # read() pasa a leerlo del archivo
+                old.seal()
+                flushed = True
+            segment.commit(count)
+            if retired and self.max_segments:
+                for number in self._segment_numbers()[:-(self.max_segments + 1)]:
+                    os.remove(self._path(number))
+            with self._lock:
+                if flushed:
+                    self.stats["commits"] += 1
+                self._committed_sequence = max(self._committed_sequence, sequence)
+                self._committed_cond.notify_all()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.commit_interval)
+            self._wakeup.clear()
+            try:
+                self.commit()
+            except Exception as e:
+                print(f"Error al confirmar el diario de eventos: {e}")
+
+    def read(self, since=None):
+        """Recorre todos los registros en orden; since filtra por instante (segundos)"""
+        with self._lock:
+            current, count = self._number, self._segment.count
+            numbers = [number for number in self._segment_numbers() if number <= current]
+        for number in numbers:
+            data = None
+            with self._lock:
+                # Segmento actual o lleno sin cerrar: se lee del mapa, que tiene lo no confirmado
+                mapped = dict(self._retired)
+                if self._number == current:
+                    mapped[current] = self._segment
+                segment = mapped.get(number)
+                if segment is not None:
+                    end = count if number == current else segment.count
+                    data = segment.mm[HEADER_SIZE:HEADER_SIZE + end * RECORD_SIZE]
+            if data is None:
+                data = self._read_segment(number)
+            for offset in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+                record = unpack_record(data, offset)
+                if record is None:
+                    break
+                if since is None or record.timestamp >= since:
+                    yield record
+
+    def _read_segment(self, number):
+        try:
+            with open(self._path(number), "rb") as f:
+                header = f.read(HEADER_SIZE)
+                _, _, _, _, committed = HEADER.unpack_from(header, 0)
+                return f.read(committed * RECORD_SIZE)
+        except FileNotFoundError:
+            return b""  # Eliminado por la retención mientras se leía
+
+    def close(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(5)
+        self.commit()
+        with self._lock:
+            self._segment.close()
+
+
+def benchmark(events=1_000_000, directory=None):
+    """Eventos/segundo sostenidos, con rotación de segmentos y fsync en grupo"""
+    import shutil
+    import tempfile
+
+    directory = directory or tempfile.mkdtemp(prefix="journal-bench-")
+    journal = EventJournal(directory, segment_size=8 * 1024 * 1024)
+    start = time.perf_counter()
+    now = time.time()
+    for i in range(events):
+        journal.append(now, i % 64, 1 + i % 4, 10_000_000 + i, 0, i & 1)
+    journal.commit()
+    elapsed = time.perf_counter() - start
+    journal.close()
+    stats = journal.stats
+    print(f"{events:,} eventos en {elapsed:.2f} s: {events / elapsed:,.0f} eventos/s "
+          f"({stats['commits']} fsync, {stats['rotations']} rotaciones)")
+
+    start = time.perf_counter()
+    reopened = EventJournal(directory, segment_size=8 * 1024 * 1024)
+    count = sum(1 for _ in reopened.read())
+    print(f"Reapertura y lectura de {count:,} registros en {time.perf_counter() - start:.2f} s")
+    reopened.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    return events / elapsed
+
+
+if __name__ == "__main__":
+    benchmark()
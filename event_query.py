@@ -0,0 +1,258 @@
+"""
+Consultas sobre los eventos de acceso guardados en el diario (event_journal).
+
+Los eventos se cargan en columnas de NumPy ordenadas por tiempo, más un
+índice tarjeta -> filas (las filas ordenadas por tarjeta y, dentro de cada
+tarjeta, por tiempo). Los rangos de tiempo se resuelven con búsqueda binaria
+y los conteos por grupo con operaciones vectorizadas, sin bucles de Python
+por evento.
+
+    store = EventStore.from_journal("diario")
+    store.card_events(12345678, since=..., until=...)
+    store.hourly_counts(since=..., until=...)
+    store.inside_at(datetime(2026, 10, 17, 14, 0))
+
+Uso desde la línea de comandos:
+    python event_query.py diario tarjeta 12345678 --desde 2026-09-01 --hasta 2026-10-01
+    python event_query.py diario por-hora --desde 2026-10-17
+    python event_query.py diario adentro "2026-10-17 14:00"
+    python event_query.py - benchmark --eventos 10000000
+
+Requiere NumPy (pip install numpy, ver requirements.txt); el resto del paquete no lo necesita.
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # Dependencia opcional, solo para este módulo
+    np = None
+
+from event_journal import HEADER, HEADER_SIZE, SEGMENT_PREFIX, SEGMENT_SUFFIX
+
+PASS_EVENTS = (0,)  # Apertura normal con tarjeta: cuenta como paso por el molinete
+ENTRY = 0  # InOutState: 0 = entrada, 1 = salida
+MICROS = 1_000_000
+
+if np is not None:
+    # Mismo formato que los registros de 32 bytes de event_journal
+    JOURNAL_DTYPE = np.dtype([("micros", "<i8"), ("card", "<i8"), ("device_id", "<u4"), ("event_code", "<u2"),
+                              ("door", "u1"), ("direction", "u1"), ("padding", "V4"), ("crc", "<u4")])
+
+
+class HourlyCounts(NamedTuple):
+    hours: "np.ndarray"  # Inicio de cada hora (segundos desde la época)
+    doors: "np.ndarray"  # Puertas presentes en el rango
+    counts: "np.ndarray"  # counts[i, j] = eventos en la puerta doors[i] durante hours[j]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("event_query requiere NumPy. Instálelo con: pip install numpy")
+
+
+def _micros(moment):
+    """datetime, segundos (int/float) o None -> microsegundos desde la época"""
+    if moment is None:
+        return None
+    if isinstance(moment, datetime):
+        moment = moment.timestamp()
+    return int(moment * MICROS)
+
+
+def _event_mask(codes, event_codes):
+    if len(event_codes) == 1:
+        return codes == event_codes[0]
+    return np.isin(codes, event_codes)
+
+
+class EventStore:
+    """Eventos en columnas ordenadas por tiempo con índice por tarjeta"""
+
+    def __init__(self, micros, device_id, door, card, event_code, direction):
+        _require_numpy()
+        order = np.argsort(micros, kind="stable")
+        self.micros = np.ascontiguousarray(micros[order], dtype=np.int64)
+        self.device_id = np.ascontiguousarray(device_id[order], dtype=np.uint32)
+        self.door = np.ascontiguousarray(door[order], dtype=np.uint8)
+        self.card = np.ascontiguousarray(card[order], dtype=np.int64)
+        self.event_code = np.ascontiguousarray(event_code[order], dtype=np.uint16)
+        self.direction = np.ascontiguousarray(direction[order], dtype=np.uint8)
+        # Índice tarjeta -> filas: orden estable por tarjeta conserva el orden por tiempo
+        self.card_order = np.argsort(self.card, kind="stable")
+        self.cards_sorted = self.card[self.card_order]
+
+    def __len__(self):
+        return len(self.micros)
+
+    @classmethod
+    def from_records(cls, records):
+        """Desde un arreglo estructurado con el formato de JOURNAL_DTYPE"""
+        return cls(records["micros"], records["device_id"], records["door"], records["card"],
+                   records["event_code"], records["direction"])
+
+    @classmethod
+    def from_journal(cls, directory):
+        """Carga los registros confirmados de todos los segmentos del diario sin parsearlos uno por uno"""
+        _require_numpy()
+        parts = []
+        for name in sorted(os.listdir(directory)):
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+                continue
+            with open(os.path.join(directory, name), "rb") as f:
+                committed = HEADER.unpack(f.read(HEADER.size))[4]
+                f.seek(HEADER_SIZE)
+                parts.append(np.fromfile(f, dtype=JOURNAL_DTYPE, count=committed))
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=JOURNAL_DTYPE)
+        return cls.from_records(records)
+
+    def _time_slice(self, since=None, until=None):
+        """Rango [since, until) de filas en orden de tiempo, por búsqueda binaria"""
+        start = 0 if since is None else int(np.searchsorted(self.micros, _micros(since), "left"))
+        end = len(self.micros) if until is None else int(np.searchsorted(self.micros, _micros(until), "left"))
+        return slice(start, max(start, end))
+
+    def card_rows(self, card, since=None, until=None):
+        """Índices (en orden de tiempo) de los eventos de una tarjeta dentro del rango"""
+        card = int(card)
+        left = np.searchsorted(self.cards_sorted, card, "left")
+        right = np.searchsorted(self.cards_sorted, card, "right")
+        rows = self.card_order[left:right]
+        if since is not None or until is not None:
+            times = self.micros[rows]
+            start = 0 if since is None else np.searchsorted(times, _micros(since), "left")
+            end = len(rows) if until is None else np.searchsorted(times, _micros(until), "left")
+            rows = rows[start:end]
+        return rows
+
+    def card_events(self, card, since=None, until=None):
+        """Eventos de una tarjeta: lista de (instante, dispositivo, puerta, evento, sentido)"""
+        rows = self.card_rows(card, since, until)
+        return [(datetime.fromtimestamp(micros / MICROS), int(device_id), int(door), int(event_code), int(direction))
+                for micros, device_id, door, event_code, direction in zip(
+                    self.micros[rows].tolist(), self.device_id[rows].tolist(), self.door[rows].tolist(),
+                    self.event_code[rows].tolist(), self.direction[rows].tolist())]
+
+    def hourly_counts(self, since=None, until=None, event_codes=PASS_EVENTS):
+        """Eventos por puerta y por hora dentro del rango.
+
+        Un solo bincount de (hora - primera hora) * 256 + puerta, que se reorganiza
+        como una tabla horas x 256 puertas.
+        """
+        window = self._time_slice(since, until)
+        micros = self.micros[window]
+        door = self.door[window]
+        if event_codes is not None:
+            keep = _event_mask(self.event_code[window], event_codes)
+            micros, door = micros[keep], door[keep]
+        if not len(micros):
+            return HourlyCounts(np.zeros(0, np.int64), np.zeros(0, np.uint8), np.zeros((0, 0), np.int64))
+        hour_index = micros // (3600 * MICROS)
+        first_hour = int(hour_index[0])
+        hours = int(hour_index[-1]) - first_hour + 1
+        counts = np.bincount((hour_index - first_hour) * 256 + door, minlength=hours * 256).reshape(hours, 256).T
+        doors = np.flatnonzero(counts.any(axis=1)).astype(np.uint8)
+        return HourlyCounts((first_hour + np.arange(hours)) * 3600, doors, counts[doors])
+
+    def inside_at(self, moment, lookback=24 * 3600, event_codes=PASS_EVENTS):
+        """Tarjetas cuyo último paso antes de moment (dentro de lookback segundos) fue una entrada"""
+        until = _micros(moment) + 1
+        window = self._time_slice((until - 1) / MICROS - lookback, until / MICROS)
+        card = self.card[window]
+        direction = self.direction[window]
+        keep = card != 0
+        if event_codes is not None:
+            keep &= _event_mask(self.event_code[window], event_codes)
+        card, direction = card[keep], direction[keep]
+        # Último evento de cada tarjeta: primera aparición recorriendo al revés
+        cards, last = np.unique(card[::-1], return_index=True)
+        return cards[direction[::-1][last] == ENTRY]
+
+
+def synthetic_store(events=10_000_000, cards=50_000, devices=64, days=30, seed=0):
+    """Eventos aleatorios para medir: horario laboral, entradas y salidas alternadas"""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    start = int(datetime(2026, 9, 1).timestamp()) * MICROS
+    micros = start + rng.integers(0, days * 86400 * MICROS, events, dtype=np.int64)
+    return EventStore(
+        micros,
+        rng.integers(1, devices + 1, events, dtype=np.uint32),
+        rng.integers(1, 5, events, dtype=np.uint8),
+        10_000_000 + rng.integers(0, cards, events, dtype=np.int64),
+        np.where(rng.random(events) < 0.97, 0, 27).astype(np.uint16),
+        rng.integers(0, 2, events, dtype=np.uint8),
+    )
+
+
+def benchmark(events=10_000_000):
+    start = time.perf_counter()
+    store = synthetic_store(events)
+    print(f"{len(store):,} eventos indexados en {time.perf_counter() - start:.2f} s")
+    month = (datetime(2026, 9, 1), datetime(2026, 10, 1))
+    queries = [
+        ("tarjeta en el mes", lambda: store.card_events(10_000_123, *month)),
+        ("por puerta y hora, un día", lambda: store.hourly_counts(datetime(2026, 9, 15), datetime(2026, 9, 16))),
+        ("por puerta y hora, un mes", lambda: store.hourly_counts(*month)),
+        ("adentro a las 14:00", lambda: store.inside_at(datetime(2026, 9, 15, 14, 0))),
+    ]
+    results = {}
+    for label, query in queries:
+        start = time.perf_counter()
+        result = query()
+        elapsed = time.perf_counter() - start
+        results[label] = elapsed
+        size = result.counts.sum() if isinstance(result, HourlyCounts) else len(result)
+        print(f"{label:<28} {elapsed * 1000:>9.1f} ms  ({size:,} resultados)")
+    return results
+
+
+def _parse_moment(text):
+    return datetime.fromisoformat(text) if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consultas sobre el diario de eventos de acceso")
+    parser.add_argument("diario", help="directorio del diario de eventos (- para benchmark)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    card = commands.add_parser("tarjeta", help="eventos de una tarjeta")
+    card.add_argument("numero", type=int)
+    hourly = commands.add_parser("por-hora", help="pasos por puerta y por hora")
+    inside = commands.add_parser("adentro", help="tarjetas adentro en un instante")
+    inside.add_argument("momento")
+    inside.add_argument("--ventana-horas", type=float, default=24)
+    for command in (card, hourly):
+        command.add_argument("--desde")
+        command.add_argument("--hasta")
+    bench = commands.add_parser("benchmark", help="mide las consultas con eventos sintéticos")
+    bench.add_argument("--eventos", type=int, default=10_000_000)
+    args = parser.parse_args(argv)
+
+    if args.command == "benchmark":
+        benchmark(args.eventos)
+        return
+    store = EventStore.from_journal(args.diario)
+    if args.command == "tarjeta":
+        for moment, device_id, door, event_code, direction in store.card_events(
+                args.numero, _parse_moment(args.desde), _parse_moment(args.hasta)):
+            print(f"{moment:%Y-%m-%d %H:%M:%S}  dispositivo {device_id}  puerta {door}  "
+                  f"evento {event_code}  {'entrada' if direction == ENTRY else 'salida'}")
+    elif args.command == "por-hora":
+        result = store.hourly_counts(_parse_moment(args.desde), _parse_moment(args.hasta))
+        print("hora              " + "".join(f"{f'puerta {door}':>10}" for door in result.doors))
+        for j, hour in enumerate(result.hours):
+            if result.counts[:, j].any():
+                print(f"{datetime.fromtimestamp(hour):%Y-%m-%d %H:00}  "
+                      + "".join(f"{count:>10}" for count in result.counts[:, j]))
+    else:
+        cards = store.inside_at(datetime.fromisoformat(args.momento), lookback=args.ventana_horas * 3600)
+        print(f"{len(cards)} tarjetas adentro")
+        for card_number in cards:
+            print(card_number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Sustituto en memoria de plcommpro.dll (PullSDK) para probar sin hardware.
+
+Expone los mismos nombres de función que la DLL y escribe sobre los mismos
+buffers de ctypes, por lo que puede inyectarse en ZKTecoDevice(commpro=...).
+"""
+import ctypes
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from device_tables import parse_row_payload, render_rows, select_rows, upsert_rows
+
+
+def _read_arg(arg):
+    """Obtiene el texto de un argumento de entrada (buffer de ctypes o bytes)"""
+    if arg is None:
+        return ""
+    if isinstance(arg, (bytes, bytearray)):
+        return bytes(arg).decode("utf-8", errors="ignore")
+    if isinstance(arg, str):
+        return arg
+    return arg.value.decode("utf-8", errors="ignore")
+
+
+def _write_buffer(buffer, data):
+    """Copia data (terminado en NUL) dentro de un buffer de ctypes"""
+    target = getattr(buffer, "_obj", buffer)  # Admite byref(buffer)
+    size = ctypes.sizeof(target)
+    if len(data) + 1 > size:
+        return False
+    ctypes.memmove(target, data + b"\0", len(data) + 1)
+    return True
+
+
+class FakeCommpro:
+    """Dispositivo PullSDK simulado: parámetros, eventos en tiempo real y control de puertas"""
+
+    def __init__(self, latency=0.0, serial_number="FAKE0001", max_payload=4 * 1024 * 1024):
+        self.latency = latency  # Segundos de espera artificial por llamada
+        self.max_payload = max_payload  # Límite de SetDeviceData (error -106 si se supera)
+        self.last_error = 0
+        self.online = True  # False simula un corte de red: Connect falla y los handles quedan inválidos
+        self.handles = set()
+        self.params = {
+            "DeviceID": "1",
+            "~DeviceName": "TS2011",
+            "~SerialNumber": serial_number,
+            "~ZKFPVersion": "10",
+            "FirmVer": "AC Ver 4.3.4 Apr 28 2017",
+            "Door1SensorType": "0",
+            "Door1Drivertime": "5",
+            "Door1Intertime": "0",
+            "IPAddress": "192.168.0.201",
+        }
+        self.tables = {"user": [], "userauthorize": [], "transaction": []}  # Filas como dict
+        self.commands = []  # Historial de ControlDevice
+        self.tap_times = {}  # Tarjeta -> instante (perf_counter) del último acercamiento
+        self._rt_log = deque()
+        self._hid_card = None
+        self._next_handle = 1
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _fail(self, error_code):
+        self.last_error = error_code
+        return error_code
+
+    def tap(self, card, door=1, pin="0", event_type=0, in_out=0, verify_mode=1):
+        """Simula el acercamiento de una tarjeta al lector"""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        record = f"{timestamp},{pin},{card},{door},{event_type},{in_out},{verify_mode}"
+        with self._lock:
+            self.tap_times[str(card)] = time.perf_counter()
+            self._rt_log.append(record.encode())
+            self._hid_card = str(card)
+
+    def add_user(self, pin, card, doors=15, start_time="0", end_time="0"):
+        """Agrega un usuario con tarjeta y autorización sobre las puertas indicadas (máscara de bits)"""
+        self.tables["user"].append({"CardNo": str(card), "Pin": str(pin), "Password": "", "Group": "0",
+                                    "StartTime": str(start_time), "EndTime": str(end_time)})
+        self.tables["userauthorize"].append({"Pin": str(pin), "AuthorizeTimezoneId": "1",
+                                             "AuthorizeDoorId": str(doors)})
+
+    def _select(self, table, filter_text):
+        rows = self.tables.get(table)
+        if rows is None:
+            return None
+        return select_rows(rows, filter_text)
+
+    def simulate_outage(self):
+        """Corta la red: invalida todos los handles abiertos hasta llamar a restore()"""
+        with self._lock:
+            self.online = False
+            self.handles.clear()
+
+    def restore(self):
+        self.online = True
+
+    def pending_events(self):
+        """Cantidad de eventos aún no leídos con GetRTLog"""
+        return len(self._rt_log)
+
+    def Connect(self, params):
+        self._delay()
+        if not self.online:
+            self.last_error = -2
+            return 0
+        if "ipaddress=" not in _read_arg(params):
+            self.last_error = -11
+            return 0
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self.handles.add(handle)
+        return handle
+
+    def Disconnect(self, hcommpro):
+        with self._lock:
+            self.handles.discard(hcommpro)
+
+    def PullLastError(self):
+        return self.last_error
+
+    def GetDeviceParam(self, hcommpro, buffer, buffer_size, items):
+        self._delay()
+        if hcommpro not in self.handles:
+            return self._fail(-2)
+        names = [name for name in _read_arg(items).split(",") if name]
+        data = ",".join(f"{name}={self.params.get(name, '')}" for name in names)
+        if not _write_buffer(buffer, data.encode()):
+            return self._fail(-3)
+        return 0
+
+    def GetRTLog(self, hcommpro, buffer, buffer_size):
+        """Entrega todos los eventos pendientes que quepan en el buffer, separados por \\r\\n"""
+        self._delay()
+        if hcommpro not in self.handles:
+            return self._fail(-2)
+        capacity = min(buffer_size, ctypes.sizeof(buffer)) - 1
+        records = []
+        used = 0
+        with self._lock:
+            while self._rt_log:
+                record = self._rt_log[0] + b"\r\n"
+                if used + len(record) > capacity:
+                    break
+                records.append(self._rt_log.popleft())
+                used += len(record)
+            if self._rt_log and not records:
+                return self._fail(-3)
+        if not records:
+            _write_buffer(buffer, b"")
+            return 0
+        _write_buffer(buffer, b"".join(record + b"\r\n" for record in records))
+        return len(records)
+
+    def GetHIDEventCardNumAsStr(self, card_buffer):
+        with self._lock:
+            card, self._hid_card = self._hid_card, None
+        if not card:
+            return 0
+        return 1 if _write_buffer(card_buffer, card.encode()) else 0
+
+    def ControlDevice(self, hcommpro, operation_id, door_id, index, state, reserved, options):
+        self._delay()
+        if hcommpro not in self.handles:
+            return self._fail(-2)
+        self.commands.append((operation_id, door_id, index, state, time.perf_counter()))
+        return 0
+
+    def GetDeviceDataCount(self, hcommpro, table, filter_text, options):
+        self._delay()
+        rows = self._select(_read_arg(table), _read_arg(filter_text))
+        if rows is None:
+            return self._fail(-100)
+        return len(rows)
+
+    def GetDeviceData(self, hcommpro, buffer, buffer_size, table, fieldnames, filter_text, options):
+        """Devuelve la cabecera con los campos y una fila por registro, separadas por \\r\\n"""
+        self._delay()
+        if hcommpro not in self.handles:
+            return self._fail(-2)
+        rows = self._select(_read_arg(table), _read_arg(filter_text))
+        if rows is None:
+            return self._fail(-100)
+        if not _write_buffer(buffer, render_rows(rows, _read_arg(fieldnames)).encode()):
+            return self._fail(-3)
+        return len(rows)
+
+    def SetDeviceData(self, hcommpro, table, data, options):
+        """Inserta o actualiza filas "Campo=valor\\tCampo=valor" separadas por \\r\\n"""
+        self._delay()
+        if hcommpro not in self.handles:
+            return self._fail(-2)
+        payload = _read_arg(data)
+        if len(payload.encode()) > self.max_payload:
+            return self._fail(-106)
+        rows = self.tables.get(_read_arg(table))
+        if rows is None:
+            return self._fail(-100)
+        parsed = parse_row_payload(payload)
+        if parsed is None:
+            return self._fail(-11)
+        with self._lock:
+            upsert_rows(rows, parsed)
+        return 0
@@ -0,0 +1,219 @@
+"""
+Controlador de varios molinetes a la vez sobre handles de ZKTecoDevice.
+
+Cada dispositivo tiene su propia "línea" de ejecución: sus llamadas al SDK se
+ejecutan en orden y de a una (los handles de PullSDK no son reentrantes),
+mientras que las líneas de distintos dispositivos avanzan en paralelo sobre
+un pool de hilos compartido. Un dispositivo lento ya no bloquea a los demás.
+
+Dentro de cada línea las llamadas pasan por una CommandQueue (command_scheduler):
+las emergencias van primero, las aperturas temporizadas repetidas de una puerta
+se fusionan, las aperturas normales respetan el límite de ritmo del dispositivo
+y una cola llena rechaza el comando de inmediato (el Future termina con
+queue.Full). Cerrar (estado 0) y normal abierto (255) nunca se fusionan: se
+ejecutan en orden, y las aperturas que lleguen después ya no se fusionan con
+las anteriores.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from command_scheduler import BACKGROUND, EMERGENCY, EMERGENCY_OPERATIONS, NORMAL, CommandQueue
+
+
+class _DeviceLane:
+    """Cola de llamadas serializadas de un dispositivo"""
+
+    def __init__(self, device, connect_params, queue_options):
+        self.device = device
+        self.connect_params = connect_params
+        self.commands = CommandQueue(**queue_options)
+        self.running = False
+        self.timer = None  # Reactivación pendiente cuando solo quedan comandos esperando el límite de ritmo
+        self.lock = threading.Lock()
+
+
+def _control(device, operation_id, door_id, index, state):
+    return device.control_device(operation_id, door_id, index, state)
+
+
+def _longer_open(pending, new):
+    """Fusiona dos aperturas temporizadas de la misma puerta: queda la de mayor duración"""
+    return pending[:3] + (max(pending[3], new[3]),)
+
+
+def _is_timed_open(operation_id, state):
+    """ControlDevice de salida (1) con 1-254 segundos; 0 es cerrar y 255 normal abierto"""
+    return operation_id == 1 and 0 < state < 255
+
+
+def _open_key(priority, door_id, index):
+    return ("control", priority, 1, door_id, index)
+
+
+class TurnstileFleet:
+    """Administra muchos dispositivos (ZKTecoDevice o cualquier DeviceDriver) identificados por un ID propio"""
+
+    def __init__(self, max_workers=32, max_pending=256, rate=None, burst=None, max_wait=None):
+        """max_pending, rate (aperturas/s), burst y max_wait (s) son los valores por defecto de
+        la cola de comandos de cada dispositivo (ver command_scheduler.CommandQueue)"""
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet")
+        self._lanes = {}
+        self.queue_options = {"max_pending": max_pending, "rate": rate, "burst": burst, "max_wait": max_wait}
+
+    def add_device(self, device_id, device, queue_options=None, **connect_params):
+        """Registra un dispositivo. connect_params se pasan a device.connect(); queue_options
+        reemplaza para este dispositivo las opciones de la cola de comandos de la flota"""
+        self._lanes[device_id] = _DeviceLane(device, connect_params, {**self.queue_options, **(queue_options or {})})
+
+    def remove_device(self, device_id):
+        lane = self._lanes.pop(device_id, None)
+        if lane and lane.device.connected:
+            lane.device.disconnect()
+
+    def device_ids(self):
+        return list(self._lanes)
+
+    def submit(self, device_id, fn, *args, **kwargs):
+        """Encola fn(device, *args, **kwargs) en la línea del dispositivo y devuelve un Future"""
+        return self._enqueue(device_id, fn, args, kwargs)
+
+    def _enqueue(self, device_id, fn, args=(), kwargs=None, priority=NORMAL, key=None, merge=None,
+                 rate_limited=False):
+        lane = self._lanes[device_id]
+        with lane.lock:
+            future = lane.commands.push(fn, args, kwargs, priority, key, merge, rate_limited)
+            if future.done():
+                return future  # Rechazado
+            if lane.timer is not None and not rate_limited:
+                # Solo había comandos esperando ficha: este puede ejecutarse ya
+                lane.timer.cancel()
+                lane.timer = None
+            elif lane.running:
+                return future
+            lane.running = True
+        self._executor.submit(self._run_lane, lane)
+        return future
+
+    def _wake_lane(self, lane, timer):
+        with lane.lock:
+            if lane.timer is not timer:
+                return  # Cancelado: otro comando ya reactivó la línea
+            lane.timer = None
+        self._executor.submit(self._run_lane, lane)
+
+    def _run_lane(self, lane):
+        while True:
+            with lane.lock:
+                command, wait = lane.commands.pop()
+                if command is None:
+                    if wait:
+                        lane.timer = threading.Timer(wait, self._wake_lane)
+                        lane.timer.args = (lane, lane.timer)
+                        lane.timer.daemon = True
+                        lane.timer.start()
+                    else:
+                        lane.running = False
+                    return
+            if not command.future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                command.future.set_result(command.fn(lane.device, *command.args, **command.kwargs))
+            except Exception as e:
+                command.future.set_exception(e)
+            lane.commands.done(time.perf_counter() - start)
+
+    def connect(self, device_id):
+        lane = self._lanes[device_id]
+        return self.submit(device_id, lambda device: device.connect(**lane.connect_params))
+
+    def connect_all(self, timeout=None):
+        """Conecta todos los dispositivos en paralelo. Devuelve {device_id: bool}"""
+        futures = {device_id: self.connect(device_id) for device_id in self._lanes}
+        return {device_id: future.result(timeout) for device_id, future in futures.items()}
+
+    def disconnect_all(self, timeout=None):
+        futures = [self.submit(device_id, lambda device: device.disconnect()) for device_id in self._lanes]
+        for future in futures:
+            future.result(timeout)
+
+    def control_device(self, device_id, operation_id=1, door_id=1, index=1, state=3, emergency=None):
+        """Encola un ControlDevice. Cancelar alarma y normal abierto son emergencias (o emergency=True);
+        las aperturas temporizadas pendientes de la misma puerta se fusionan y respetan el límite de
+        ritmo. Cerrar o dejar normal abierto una salida corta la fusión con las aperturas anteriores"""
+        if emergency is None:
+            emergency = operation_id in EMERGENCY_OPERATIONS
+        priority = EMERGENCY if emergency else NORMAL
+        key = None
+        if _is_timed_open(operation_id, state):
+            key = _open_key(priority, door_id, index)
+        elif operation_id == 1 and device_id in self._lanes:
+            commands = self._lanes[device_id].commands
+            for open_priority in (EMERGENCY, NORMAL):
+                commands.release_key(_open_key(open_priority, door_id, index))
+        return self._enqueue(device_id, _control, (operation_id, door_id, index, state), priority=priority,
+                             key=key, merge=_longer_open, rate_limited=not emergency)
+
+    def get_device_info(self, device_id):
+        return self._enqueue(device_id, lambda device: device.get_device_info(), priority=BACKGROUND)
+
+    def test_device_communication(self, device_id):
+        return self._enqueue(device_id, lambda device: device.test_device_communication(), priority=BACKGROUND)
+
+    def read_events(self, device_id):
+        """Vacía el log en tiempo real del dispositivo. El Future devuelve la lista de eventos"""
+        return self.submit(device_id, lambda device: device.read_events())
+
+    def read_all_events(self, timeout=None):
+        """Lee los eventos de todos los dispositivos en paralelo. Devuelve {device_id: [eventos]}"""
+        futures = {device_id: self.read_events(device_id) for device_id in self._lanes}
+        return {device_id: future.result(timeout) for device_id, future in futures.items()}
+
+    def queue_stats(self):
+        """{device_id: profundidad por prioridad, esperas y contadores de su cola de comandos}"""
+        return {device_id: lane.commands.stats() for device_id, lane in self._lanes.items()}
+
+    def shutdown(self):
+        self.disconnect_all()
+        self._executor.shutdown(wait=True)
+
+
+def benchmark(devices=50, commands=20, latency=0.005, max_workers=64):
+    """Compara aperturas/segundo secuenciales contra la flota usando FakeCommpro con latencia"""
+    import contextlib
+    import io
+
+    from fake_commpro import FakeCommpro
+    from molinete_test import ZKTecoDevice
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        handles = [ZKTecoDevice(commpro=FakeCommpro(latency=latency)) for _ in range(devices)]
+        for device in handles:
+            device.connect()
+
+        start = time.perf_counter()
+        for device in handles[:5]:
+            for _ in range(commands):
+                device.control_device(state=5)
+        sequential_rate = 5 * commands / (time.perf_counter() - start)
+
+        fleet = TurnstileFleet(max_workers=max_workers)
+        for i, device in enumerate(handles):
+            fleet.add_device(f"lane-{i}", device)
+        start = time.perf_counter()
+        futures = [fleet.control_device(device_id, state=5)
+                   for _ in range(commands) for device_id in fleet.device_ids()]
+        ok = sum(1 for future in futures if future.result())
+        fleet_rate = len(futures) / (time.perf_counter() - start)
+        fleet.shutdown()
+
+    print(f"Dispositivos: {devices}  Latencia simulada: {latency * 1000:.1f} ms")
+    print(f"Secuencial: {sequential_rate:.0f} comandos/s")
+    print(f"Flota:      {fleet_rate:.0f} comandos/s ({ok}/{len(futures)} exitosos, "
+          f"x{fleet_rate / sequential_rate:.1f})")
+    return sequential_rate, fleet_rate
+
+
+if __name__ == "__main__":
+    benchmark()
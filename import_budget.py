@@ -0,0 +1,78 @@
+"""
+Control del tiempo de importación de los módulos que usa el gateway.
+
+Cada módulo se importa en un intérprete nuevo con -X importtime y se toma el
+tiempo acumulado de su propia importación (incluye lo que importa, pero no el
+arranque del intérprete). Se repite varias veces y se queda con el mínimo
+para no medir ruido. Falla si algún módulo supera el presupuesto o si
+importarlo termina el proceso (sys.exit, pip install, errores).
+
+    python import_budget.py                      # todos los módulos, presupuesto por defecto
+    python import_budget.py --presupuesto-ms 15 device_driver fleet
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+DEFAULT_BUDGET_MS = 50.0
+
+GATEWAY_MODULES = (
+    "device_driver",
+    "fleet",
+    "connection_pool",
+    "access_control",
+    "auth_cache",
+    "card_dedup",
+    "capability_profile",
+    "event_journal",
+    "transaction_sync",
+    "molinete_test",
+    "rfid.ConnectionTurnstile",
+)
+
+
+def import_time_ms(module, runs=5):
+    """Mínimo de varias importaciones en frío (ms), o None si la importación falla"""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        # Formato: "import time: self [us] | cumulative | imported package"; el módulo pedido va sin sangría
+        for line in result.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module and not parts[2][1:].startswith(" "):
+                micros = int(parts[1])
+                best = micros if best is None else min(best, micros)
+    return None if best is None else best / 1000
+
+
+def check(modules=GATEWAY_MODULES, budget_ms=DEFAULT_BUDGET_MS, runs=5):
+    """Imprime el tiempo de cada módulo; True si todos están dentro del presupuesto"""
+    ok = True
+    for module in modules:
+        elapsed = import_time_ms(module, runs)
+        if elapsed is None:
+            print(f"✗ {module:<28} la importación falló o terminó el proceso")
+            ok = False
+        elif elapsed > budget_ms:
+            print(f"✗ {module:<28} {elapsed:>7.1f} ms (presupuesto {budget_ms:.0f} ms)")
+            ok = False
+        else:
+            print(f"✓ {module:<28} {elapsed:>7.1f} ms")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica el tiempo de importación de los módulos del gateway")
+    parser.add_argument("modulos", nargs="*", default=GATEWAY_MODULES)
+    parser.add_argument("--presupuesto-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args(argv)
+    sys.exit(0 if check(args.modulos, args.presupuesto_ms, args.repeticiones) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,91 @@
-from ctypes import windll, byref, create_string_buffer, c_int, c_char_p, c_long, c_ulong, c_void_p, c_bool, POINTER
+import ctypes
+from ctypes import byref, create_string_buffer, c_int, c_char_p, c_long, c_ulong, c_void_p, c_bool, POINTER
 import os
-import sys
+import threading
 import time
 
-class ZKTecoDevice:
-    def __init__(self):
-        self.commpro = None
-        self.hcommpro = 0
-        self.connected = False
-        self.machine_number = 1
-        
-        # Cargar la librería del SDK
+from buffer_pool import BufferPool, buffer_text
+from device_params import ParamStore, format_params, parse_params
+from rtlog_parser import DOOR_STATUS_EVENT, parse_cards
+from rtlog_pump import AdaptiveBackoff, RTLogPump
+
+INFO_PARAMS = ["DeviceID", "Door1SensorType", "Door1Drivertime", "Door1Intertime", "~ZKFPVersion"]
+COMMUNICATION_PARAMS = ["DeviceID", "~DeviceName", "~SerialNumber", "Door1SensorType"]
+
+_commpro_library = None
+
+
+def load_commpro():
+    """Carga plcommpro.dll una sola vez, en el primer connect (no al importar ni al crear el dispositivo).
+
+    Devuelve la librería o None si no está disponible.
+    """
+    global _commpro_library
+    if _commpro_library is None:
         try:
-            self.commpro = windll.LoadLibrary("plcommpro.dll")
+            _commpro_library = ctypes.windll.LoadLibrary("plcommpro.dll")
             print("Librería SDK cargada correctamente")
         except Exception as e:
             print(f"Error al cargar la librería: {e}")
-            sys.exit(1)
+            return None
+    return _commpro_library
+
+
+class _SerializedCommpro:
+    """Misma interfaz que commpro, con cada llamada hecha bajo el bloqueo del dispositivo
+    (los handles de PullSDK no son reentrantes: la bomba de eventos, las líneas de la flota y
+    AccessController llaman desde hilos distintos)"""
+
+    def __init__(self, target, lock):
+        self._target = target
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+        lock = self._lock
+
+        def call(*args):
+            with lock:
+                return attribute(*args)
+
+        self.__dict__[name] = call  # Las próximas búsquedas no pasan por __getattr__
+        return call
+
+
+class ZKTecoDevice:
+    def __init__(self, commpro=None, metrics=None, label=None):
+        """commpro: objeto con la interfaz de plcommpro.dll (por defecto la DLL, cargada en connect).
+        metrics: SdkMetrics opcional que mide cada llamada al SDK bajo el nombre label (o la IP).
+
+        Todas las llamadas al SDK de este dispositivo se serializan con self.lock (reentrante);
+        las secuencias que usan un buffer compartido (llamada + lectura del buffer) lo toman completo."""
+        self.commpro = commpro
+        self.lock = threading.RLock()
+        self.metrics = metrics
+        self.label = label
+        self.hcommpro = 0
+        self.connected = False
+        self.machine_number = 1
+        self.event_pump = None
+        self._poll_pump = None  # RTLogPump sin hilo para read_events()
+        self.buffers = BufferPool()  # Buffers reutilizables de las llamadas de este handle
+        self.params = ParamStore(self._fetch_params)  # GetDeviceParam agrupado y con caché
+        # Sin commpro inyectado (por ejemplo FakeCommpro), plcommpro.dll se carga en el primer connect
     
     def connect(self, ip_address="192.168.0.201", port=14370, timeout=4000, password=""):
         if self.connected:
             print("Ya está conectado al dispositivo")
             return True
+        if self.commpro is None:
+            self.commpro = load_commpro()
+            if self.commpro is None:
+                return False
+        if not isinstance(self.commpro, _SerializedCommpro):
+            if self.metrics is not None:
+                self.commpro = self.metrics.wrap(self.commpro, self.label or ip_address)
+            self.commpro = _SerializedCommpro(self.commpro, self.lock)
             
         try:
             params = f"protocol=TCP,ipaddress={ip_address},port={port},timeout={timeout},passwd={password}"
@@ -30,6 +94,7 @@ class ZKTecoDevice:
             
             if self.hcommpro != 0:
                 self.connected = True
+                self.params.invalidate()  # Puede ser otro dispositivo en la misma dirección
                 print(f"Conectado al dispositivo: {ip_address}:{port}")
                 return True
             else:
@@ -46,6 +111,7 @@ class ZKTecoDevice:
             return
             
         try:
+            self.stop_event_pump()
             self.commpro.Disconnect(self.hcommpro)
             self.connected = False
             self.hcommpro = 0
@@ -58,34 +124,46 @@ class ZKTecoDevice:
             print("No hay conexión activa")
             return
         
+        info = None
         try:
-            # Obtener parámetros del dispositivo usando GetDeviceParam
-            buffer = create_string_buffer(2048)
-            items = "DeviceID,Door1SensorType,Door1Drivertime,Door1Intertime,~ZKFPVersion"
-            p_items = create_string_buffer(items.encode())
-            ret = self.commpro.GetDeviceParam(self.hcommpro, buffer, 2048, p_items)
+            # Obtener parámetros del dispositivo (GetDeviceParam, desde el caché si están vigentes)
+            params = self.params.get(INFO_PARAMS)
             
-            if ret >= 0:
-                print(f"Información del dispositivo: {buffer.value.decode()}")
+            if params is not None:
+                info = format_params(params)
+                print(f"Información del dispositivo: {info}")
             else:
                 error_code = self.commpro.PullLastError()
                 print(f"Error al obtener información del dispositivo. Código: {error_code}")
             
             # Verificar eventos recientes
-            rt_log = create_string_buffer(256)
-            ret = self.commpro.GetRTLog(self.hcommpro, rt_log, 256)
+            with self.lock:
+                ret, rt_log = self.buffers.call("rtlog", 4096, self._get_rt_log)
+                recent = buffer_text(rt_log) if ret > 0 else ""
+                error_code = self.commpro.PullLastError() if ret < 0 else 0
             
             if ret >= 0:
                 if ret == 0:
                     print("No hay eventos recientes en el dispositivo")
                 else:
-                    print(f"Eventos recientes detectados: {rt_log.value.decode()}")
+                    print(f"Eventos recientes detectados: {recent}")
             else:
-                error_code = self.commpro.PullLastError()
                 print(f"Error al verificar eventos del dispositivo. Código: {error_code}")
                 
         except Exception as e:
             print(f"Error al obtener información del dispositivo: {e}")
+        
+        return info
+
+    def _fetch_params(self, names):
+        """Una llamada GetDeviceParam para ParamStore: (código, {nombre: valor})"""
+        if not self.connected:
+            return -8, {}
+        items = ",".join(names).encode()
+        with self.lock:
+            ret, buffer = self.buffers.call(
+                "params", 2048, lambda buffer, size: self.commpro.GetDeviceParam(self.hcommpro, buffer, size, items))
+            return ret, parse_params(buffer_text(buffer)) if ret >= 0 else {}
 
     def read_card(self):
         if not self.connected:
@@ -101,39 +179,38 @@ class ZKTecoDevice:
             
             # Esperar a que se detecte una tarjeta RFID
             timeout = time.time() + 10  # 10 segundos de timeout
+            pump = RTLogPump(self.commpro, self.hcommpro, buffers=self.buffers)
+            backoff = AdaptiveBackoff()
+            card_buffer = self.buffers.get("hid_card", 64)
             
             while time.time() < timeout:
+                busy = False
                 try:
-                    # Crear buffer para el número de tarjeta HID
-                    card_buffer = create_string_buffer(64)
-                    
                     # Obtener el número de tarjeta HID del evento más reciente
-                    ret = self.commpro.GetHIDEventCardNumAsStr(byref(card_buffer))
-                    
-                    if ret:  # True indica éxito
-                        card_number = card_buffer.value.decode('utf-8', errors='ignore').strip()
-                        if card_number and card_number != "0" and len(card_number) > 0:
-                            print(f"Tarjeta RFID detectada: {card_number}")
-                            return card_number
+                    with self.lock:
+                        ret = self.commpro.GetHIDEventCardNumAsStr(byref(card_buffer))
+                        card_number = card_buffer.value.decode('utf-8', errors='ignore').strip() if ret else ""
                     
-                    # También verificar eventos en tiempo real como respaldo
-                    rt_log = create_string_buffer(256)
-                    ret_rt = self.commpro.GetRTLog(self.hcommpro, rt_log, 256)
+                    if card_number and card_number != "0":
+                        print(f"Tarjeta RFID detectada: {card_number}")
+                        return card_number
                     
-                    if ret_rt > 0:
-                        event_data = rt_log.value.decode('utf-8', errors='ignore').strip()
-                        if event_data:
-                            print(f"Evento detectado: {event_data}")
-                            card_number = self._parse_card_event(event_data)
-                            if card_number:
-                                print(f"Tarjeta RFID detectada (evento): {card_number}")
-                                return card_number
+                    # También verificar eventos en tiempo real como respaldo (vaciando todo el log)
+                    with self.lock:
+                        events = pump.drain()
+                    for event in events:
+                        busy = True
+                        print(f"Evento detectado: {event}")
+                        if event.card and event.event_type != DOOR_STATUS_EVENT:
+                            print(f"Tarjeta RFID detectada (evento): {event.card}")
+                            return event.card
                     
                 except Exception as e:
                     # Error en esta iteración, pero continuar intentando
                     pass
                 
-                time.sleep(0.2)  # Pausa entre lecturas
+                # Consulta inmediata si hubo actividad, espera creciente (hasta 100 ms) si no
+                time.sleep(backoff.next(busy))
             
             print("Tiempo de espera agotado (10 segundos). No se detectó ninguna tarjeta RFID.")
             return None
@@ -148,8 +225,8 @@ class ZKTecoDevice:
             # Leer y descartar eventos previos que puedan estar en el buffer
             count = 0
             while count < 10:  # Máximo 10 intentos para evitar bucle infinito
-                rt_log = create_string_buffer(256)
-                ret = self.commpro.GetRTLog(self.hcommpro, rt_log, 256)
+                with self.lock:
+                    ret, _ = self.buffers.call("rtlog", 4096, self._get_rt_log)
                 if ret <= 0:
                     break
                 count += 1
@@ -158,36 +235,142 @@ class ZKTecoDevice:
         except Exception as e:
             print(f"Error al limpiar eventos previos: {e}")
 
+    def _get_rt_log(self, buffer, size):
+        return self.commpro.GetRTLog(self.hcommpro, buffer, size)
+
     def _parse_card_event(self, event_data):
-        """Extrae el número de tarjeta del evento"""
+        """Extrae el número de tarjeta del primer registro con tarjeta del buffer"""
         try:
             if not event_data:
                 return None
             
-            # Buscar CardNo en el evento
-            if "CardNo=" in event_data:
-                # Extraer el número después de CardNo=
-                parts = event_data.split("CardNo=")
-                if len(parts) > 1:
-                    card_part = parts[1].split("\t")[0].split(",")[0].strip()
-                    if card_part and card_part.isdigit():
-                        return card_part
+            # Un buffer de GetRTLog puede traer varios registros separados por \r\n
+            cards = parse_cards(event_data)
+            return cards[0] if cards else None
+            
+        except Exception as e:
+            print(f"Error al parsear evento de tarjeta: {e}")
+            return None
+
+    def ping(self):
+        """Verificación liviana de que el handle sigue vivo (GetDeviceParam de DeviceID)"""
+        if not self.connected:
+            return False
+        try:
+            with self.lock:
+                buffer = self.buffers.get("ping", 64)  # No comparte el buffer de _fetch_params
+                return self.commpro.GetDeviceParam(self.hcommpro, buffer, len(buffer), b"DeviceID") >= 0
+        except Exception:
+            return False
+
+    def get_device_data(self, table, fields="*", filter_text="", options=""):
+        """Lee una tabla completa del dispositivo (user, userauthorize, transaction...).
+        
+        Devuelve el texto crudo de GetDeviceData (cabecera + filas) o None si falla.
+        Los campos se indican separados por tabulador, o "*" para todos.
+        """
+        if not self.connected:
+            print("No hay conexión activa")
+            return None
+        
+        try:
+            p_table = create_string_buffer(table.encode())
+            p_fields = create_string_buffer(fields.encode())
+            p_filter = create_string_buffer(filter_text.encode())
+            p_options = create_string_buffer(options.encode())
+            
+            # Dimensionar el buffer según la cantidad de registros y agrandarlo si no alcanza
+            count = self.commpro.GetDeviceDataCount(self.hcommpro, p_table, p_filter, p_options)
+            size = max(64 * 1024, count * 256)
+            while True:
+                buffer = create_string_buffer(size)
+                ret = self.commpro.GetDeviceData(self.hcommpro, buffer, size, p_table, p_fields, p_filter, p_options)
+                if ret == -3 and size < 64 * 1024 * 1024:
+                    size *= 2
+                    continue
+                break
             
-            # Intentar otros formatos posibles
-            card_indicators = ["Cardno=", "Card=", "CardNumber="]
-            for indicator in card_indicators:
-                if indicator in event_data:
-                    parts = event_data.split(indicator)
-                    if len(parts) > 1:
-                        card_part = parts[1].split("\t")[0].split(",")[0].strip()
-                        if card_part and card_part.replace("-", "").isdigit():
-                            return card_part.replace("-", "")
+            if ret >= 0:
+                return buffer_text(buffer)
             
+            error_code = self.commpro.PullLastError()
+            print(f"Error al leer la tabla {table}. Código: {error_code}")
+            self._print_error_description(error_code)
             return None
             
         except Exception as e:
-            print(f"Error al parsear evento de tarjeta: {e}")
+            print(f"Error al leer la tabla {table}: {e}")
+            return None
+
+    def get_device_data_count(self, table, filter_text="", options=""):
+        """Cantidad de registros de una tabla (GetDeviceDataCount), o el código de error (negativo)"""
+        if not self.connected:
+            print("No hay conexión activa")
+            return -8
+
+        try:
+            return self.commpro.GetDeviceDataCount(self.hcommpro, create_string_buffer(table.encode()),
+                                                   create_string_buffer(filter_text.encode()),
+                                                   create_string_buffer(options.encode()))
+        except Exception as e:
+            print(f"Error al contar los registros de la tabla {table}: {e}")
+            return -99
+
+    def set_device_data(self, table, data, options=""):
+        """Escribe filas en una tabla del dispositivo con SetDeviceData.
+        
+        data son filas "Campo=valor\tCampo=valor" separadas por \r\n (str o bytes).
+        Devuelve 0 si tuvo éxito o el código de error (negativo).
+        """
+        if not self.connected:
+            print("No hay conexión activa")
+            return -8
+        
+        try:
+            if isinstance(data, str):
+                data = data.encode()
+            p_table = create_string_buffer(table.encode())
+            p_data = create_string_buffer(data)
+            p_options = create_string_buffer(options.encode())
+            ret = self.commpro.SetDeviceData(self.hcommpro, p_table, p_data, p_options)
+            if ret >= 0:
+                return 0
+            error_code = self.commpro.PullLastError() or ret
+            return error_code
+        except Exception as e:
+            print(f"Error al escribir en la tabla {table}: {e}")
+            return -99
+
+    def read_events(self):
+        """Vacía el log en tiempo real una vez y devuelve los RTLogEvent leídos (sin hilo de fondo)"""
+        if not self.connected:
+            return []
+        with self.lock:
+            if self._poll_pump is None or self._poll_pump.hcommpro != self.hcommpro:
+                self._poll_pump = RTLogPump(self.commpro, self.hcommpro, buffers=self.buffers)
+            return self._poll_pump.drain()
+
+    def start_event_pump(self, callback=None, queue_size=1024, **options):
+        """Inicia la lectura continua de eventos en tiempo real en segundo plano.
+        
+        Si no se indica callback, los eventos quedan en la cola acotada event_pump.events.
+        La bomba usa sus propios buffers y cada GetRTLog toma el bloqueo del dispositivo, así que
+        las demás llamadas (control_device, parámetros) se intercalan sin pisarse.
+        """
+        if not self.connected:
+            print("No hay conexión activa")
             return None
+        
+        if self.event_pump is None:
+            self.event_pump = RTLogPump(self.commpro, self.hcommpro, callback=callback,
+                                        queue_size=queue_size, **options)
+        return self.event_pump.start()
+
+    def stop_event_pump(self):
+        """Detiene la lectura continua de eventos"""
+        if self.event_pump is not None:
+            self.event_pump.stop()
+            self.event_pump = None
 
     def _print_error_description(self, error_code):
         """Imprime la descripción del código de error"""
@@ -275,14 +458,11 @@ class ZKTecoDevice:
         try:
             print("Probando comunicación con el dispositivo...")
             
-            # Probar obtener información básica del dispositivo
-            buffer = create_string_buffer(1024)
-            items = "DeviceID,~DeviceName,~SerialNumber,Door1SensorType"
-            p_items = create_string_buffer(items.encode())
-            ret = self.commpro.GetDeviceParam(self.hcommpro, buffer, 1024, p_items)
+            # Probar obtener información básica del dispositivo (siempre del dispositivo, no del caché)
+            params = self.params.get(COMMUNICATION_PARAMS, max_age=0)
             
-            if ret >= 0:
-                device_info = buffer.value.decode('utf-8', errors='ignore')
+            if params is not None:
+                device_info = format_params(params)
                 print(f"Comunicación exitosa. Info del dispositivo: {device_info}")
                 return True
             else:
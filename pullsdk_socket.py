@@ -0,0 +1,457 @@
+"""
+Transporte TCP en Python puro para los controladores ZKTeco (C2/C3/TS2011), sin plcommpro.dll.
+
+SocketCommpro expone los mismos nombres de función que la DLL (Connect,
+GetDeviceParam, GetRTLog, ControlDevice, GetDeviceData...) y escribe sobre
+los mismos buffers de ctypes, así que se usa con
+ZKTecoDevice(commpro=SocketCommpro()) y el resto del código no cambia.
+Funciona en Linux y reutiliza un buffer de recepción por conexión.
+
+Trama (enteros little-endian):
+    0xAA | 0x01 | comando | largo (2 bytes) | datos | CRC-16 (2 bytes) | 0x55
+El CRC-16/ARC se calcula desde el byte 0x01 hasta el final de los datos.
+En una sesión los datos empiezan con el ID de sesión y el número de
+petición (2 bytes cada uno). La respuesta usa el comando 0xC8 (éxito) o
+0xC9 (error, seguido del código de error con signo).
+
+Los eventos en tiempo real viajan en registros binarios de 16 bytes y se
+entregan con el mismo texto que GetRTLog de la DLL. CMD_RTLOG los borra del
+equipo, así que los que no entran en el buffer del llamador quedan en la
+sesión y se entregan en las llamadas siguientes (sin consultar al equipo).
+
+Las tablas (user, userauthorize, transaction) NO usan los comandos de tabla
+del firmware C3: CMD_DATACOUNT, la cabecera PAGE y la transferencia en texto
+(el mismo de GetDeviceData/SetDeviceData, paginado en tramas de hasta 64 KB)
+son un formato propio de este módulo que solo entiende emulator.py. El
+emulador se identifica al conectar (EMULATOR_TAG después del ID de sesión);
+contra cualquier otro equipo las llamadas de tablas devuelven -13 (comando no
+disponible) sin enviar nada. Para leer o escribir tablas de un equipo real se
+sigue usando plcommpro.dll.
+
+Si una respuesta llega incompleta (timeout, conexión cortada o CRC inválido),
+el flujo TCP queda desincronizado: la sesión se cierra y la siguiente llamada
+con el mismo handle vuelve a conectarse antes de enviar su comando.
+"""
+import ctypes
+import socket
+import struct
+import threading
+from datetime import datetime
+
+MESSAGE_START = 0xAA
+MESSAGE_END = 0x55
+PROTOCOL_VERSION = 0x01
+
+CMD_CONNECT = 0x76
+CMD_DISCONNECT = 0x02
+CMD_SETPARAM = 0x03
+CMD_GETPARAM = 0x04
+CMD_CONTROL = 0x05
+CMD_SETDATA = 0x07
+CMD_GETDATA = 0x08
+CMD_DATACOUNT = 0x09
+CMD_RTLOG = 0x0B
+REPLY_OK = 0xC8
+REPLY_ERROR = 0xC9
+
+RTLOG_RECORD = struct.Struct("<IIBBBBI")  # tarjeta, pin, verificación, puerta, evento, entrada/salida, hora
+HEADER = struct.Struct("<BBBH")
+SESSION = struct.Struct("<HH")
+PAGE = struct.Struct("<IB")  # Tablas: registros de la página (o primer registro pedido) y si quedan más
+MAX_FRAME_DATA = 0xFFFF
+EMULATOR_TAG = b"ZKEMU"  # Respuesta de conexión de emulator.py: ID de sesión + EMULATOR_TAG
+
+ERROR_NOT_SENT = -1
+ERROR_NO_REPLY = -2
+ERROR_BUFFER_SMALL = -3
+ERROR_CRC = -9
+ERROR_BAD_DATA = -10
+ERROR_UNAVAILABLE = -13
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def crc16(data):
+    crc = 0
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def encode_frame(command, data=b""):
+    """Arma una trama completa a partir del comando y los datos"""
+    body = bytes((PROTOCOL_VERSION, command)) + struct.pack("<H", len(data)) + data
+    return bytes((MESSAGE_START,)) + body + struct.pack("<H", crc16(body)) + bytes((MESSAGE_END,))
+
+
+def encode_time(moment):
+    """datetime -> entero empaquetado del controlador"""
+    days = ((moment.year - 2000) * 12 + moment.month - 1) * 31 + moment.day - 1
+    return ((days * 24 + moment.hour) * 60 + moment.minute) * 60 + moment.second
+
+
+def decode_time(value):
+    """Entero empaquetado del controlador -> "AAAA-MM-DD HH:MM:SS" """
+    second = value % 60
+    value //= 60
+    minute = value % 60
+    value //= 60
+    hour = value % 24
+    value //= 24
+    day = value % 31 + 1
+    value //= 31
+    month = value % 12 + 1
+    year = value // 12 + 2000
+    return f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
+
+
+def pack_rtlog_record(card, pin, door, event_type, in_out, verify_mode, moment=None):
+    return RTLOG_RECORD.pack(int(card), int(pin), verify_mode, door, event_type, in_out,
+                             encode_time(moment or datetime.now()))
+
+
+def rtlog_to_text(data):
+    """Registros binarios de 16 bytes -> texto de GetRTLog (Time,Pin,CardNo,Door,EventType,InOutState,VerifyMode)"""
+    lines = []
+    for card, pin, verify_mode, door, event_type, in_out, moment in RTLOG_RECORD.iter_unpack(data):
+        lines.append(f"{decode_time(moment)},{pin},{card},{door},{event_type},{in_out},{verify_mode}\r\n")
+    return "".join(lines)
+
+
+def parse_connect_string(params):
+    """ "protocol=TCP,ipaddress=...,port=...,timeout=...,passwd=" -> dict"""
+    if not isinstance(params, (str, bytes)):
+        params = params.value
+    if isinstance(params, bytes):
+        params = params.decode("utf-8", errors="ignore")
+    values = {}
+    for pair in params.split(","):
+        key, _, value = pair.partition("=")
+        values[key.strip().lower()] = value.strip()
+    return values
+
+
+def _text(arg):
+    if arg is None:
+        return b""
+    if isinstance(arg, str):
+        return arg.encode()
+    if isinstance(arg, (bytes, bytearray)):
+        return bytes(arg)
+    return arg.value
+
+
+class _Session:
+    """Conexión TCP con su buffer de recepción reutilizable"""
+
+    def __init__(self, address, timeout, password, recv_size=64 * 1024):
+        self.address = address
+        self.timeout = timeout
+        self.password = password
+        self.sock = None  # None: sin conexión (nunca abierta o descartada tras una respuesta incompleta)
+        self.session_id = 0
+        self.request_nr = 0
+        self.reconnects = 0
+        self.emulator = False  # El equipo es emulator.py: entiende los comandos de tablas
+        self.rtlog_pending = b""  # Texto de GetRTLog ya borrado del equipo que no entró en el buffer
+        self.buffer = bytearray(recv_size)
+        self.view = memoryview(self.buffer)
+        self.lock = threading.Lock()
+
+    def open(self):
+        """Conecta y negocia la sesión. Devuelve 0 o un código de error negativo"""
+        try:
+            sock = socket.create_connection(self.address, self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, ValueError):
+            return ERROR_NOT_SENT
+        self.sock = sock
+        self.session_id = 0
+        try:
+            reply, offset, length = self.request(CMD_CONNECT, self.password.encode())
+        except (OSError, ValueError):
+            self.drop()
+            return ERROR_NO_REPLY
+        if reply != REPLY_OK or length < 2:
+            code = struct.unpack_from("<b", self.buffer, offset)[0] if length else -8
+            self.drop()
+            return code
+        self.session_id = struct.unpack_from("<H", self.buffer, offset)[0]
+        self.emulator = self.buffer[offset + 2:offset + length] == EMULATOR_TAG
+        return 0
+
+    def drop(self):
+        """Cierra el socket; los bytes pendientes de una respuesta a medias se descartan con él"""
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.session_id = 0
+
+    def _recv_exact(self, offset, size):
+        if offset + size > len(self.buffer):
+            # Respuesta más grande que el buffer: crecer una vez y conservarlo para las siguientes
+            grown = bytearray(max(offset + size, len(self.buffer) * 2))
+            grown[:offset] = self.buffer[:offset]
+            self.buffer = grown
+            self.view = memoryview(grown)
+        end = offset + size
+        while offset < end:
+            received = self.sock.recv_into(self.view[offset:end])
+            if not received:
+                raise ConnectionError("Conexión cerrada por el dispositivo")
+            offset += received
+
+    def request(self, command, data=b""):
+        """Envía un comando y devuelve (comando de respuesta, inicio y largo de los datos en self.buffer)"""
+        self.request_nr = (self.request_nr + 1) & 0xFFFF
+        payload = SESSION.pack(self.session_id, self.request_nr) + data if self.session_id else data
+        self.sock.sendall(encode_frame(command, payload))
+        self._recv_exact(0, 5)
+        start, version, reply, length = HEADER.unpack_from(self.buffer, 0)
+        if start != MESSAGE_START:
+            raise ValueError("Trama inválida")
+        self._recv_exact(5, length + 3)
+        crc, end = struct.unpack_from("<HB", self.buffer, 5 + length)
+        if end != MESSAGE_END or crc != crc16(self.view[1:5 + length]):
+            raise ValueError("CRC inválido")
+        offset = 5
+        if self.session_id and length >= SESSION.size:
+            offset += SESSION.size
+            length -= SESSION.size
+        return reply, offset, length
+
+
+class SocketCommpro:
+    """Reemplazo de plcommpro.dll que habla el protocolo TCP del controlador"""
+
+    def __init__(self, recv_size=64 * 1024):
+        self.recv_size = recv_size
+        self.last_error = 0
+        self._sessions = {}
+        self._next_handle = 1
+        self._lock = threading.Lock()
+
+    def _fail(self, error_code):
+        self.last_error = error_code
+        return error_code
+
+    def _call(self, hcommpro, command, data=b""):
+        """Ejecuta un comando; devuelve (sesión, inicio, largo) o un código de error negativo"""
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        if session.sock is None:
+            code = session.open()
+            if code:
+                return self._fail(code)
+            session.reconnects += 1
+        try:
+            reply, offset, length = session.request(command, data)
+        except socket.timeout:
+            session.drop()
+            return self._fail(ERROR_NO_REPLY)
+        except ValueError:
+            session.drop()
+            return self._fail(ERROR_CRC)
+        except OSError:
+            session.drop()
+            return self._fail(ERROR_NOT_SENT)
+        if reply == REPLY_ERROR:
+            code = struct.unpack_from("<b", session.buffer, offset)[0] if length else -99
+            return self._fail(code if code < 0 else -code)
+        return session, offset, length
+
+    def _copy_out(self, session, offset, length, buffer, buffer_size):
+        """Copia los datos de la respuesta al buffer de ctypes del llamador, sin copias intermedias"""
+        target = getattr(buffer, "_obj", buffer)
+        capacity = min(buffer_size, ctypes.sizeof(target)) - 1
+        if length > capacity:
+            return self._fail(ERROR_BUFFER_SMALL)
+        source = (ctypes.c_char * length).from_buffer(session.buffer, offset)
+        ctypes.memmove(target, source, length)
+        ctypes.memset(ctypes.addressof(target) + length, 0, 1)
+        del source  # Libera la referencia al bytearray para que pueda crecer
+        return length
+
+    def Connect(self, params):
+        values = parse_connect_string(params)
+        try:
+            timeout = int(values.get("timeout") or 4000) / 1000
+            address = (values.get("ipaddress", ""), int(values.get("port") or 4370))
+        except ValueError:
+            self.last_error = ERROR_NOT_SENT
+            return 0
+        session = _Session(address, timeout, values.get("passwd", ""), self.recv_size)
+        code = session.open()
+        if code:
+            self.last_error = code
+            return 0
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._sessions[handle] = session
+        return handle
+
+    def Disconnect(self, hcommpro):
+        session = self._sessions.pop(hcommpro, None)
+        if session is None:
+            return
+        with session.lock:
+            if session.sock is not None:
+                try:
+                    session.request(CMD_DISCONNECT)
+                except (OSError, ValueError):
+                    pass
+            session.drop()
+
+    def PullLastError(self):
+        return self.last_error
+
+    def GetDeviceParam(self, hcommpro, buffer, buffer_size, items):
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        with session.lock:
+            result = self._call(hcommpro, CMD_GETPARAM, _text(items))
+            if isinstance(result, int):
+                return result
+            ret = self._copy_out(*result, buffer, buffer_size)
+        return 0 if ret >= 0 else ret
+
+    def SetDeviceParam(self, hcommpro, items):
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        with session.lock:
+            result = self._call(hcommpro, CMD_SETPARAM, _text(items))
+        return result if isinstance(result, int) else 0
+
+    def GetRTLog(self, hcommpro, buffer, buffer_size):
+        """Devuelve la cantidad de registros, con el mismo texto que la DLL.
+
+        Escribe tantos registros completos como entren en el buffer; el resto queda en la sesión
+        para las llamadas siguientes. -3 solo si no entra ni un registro.
+        """
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        target = getattr(buffer, "_obj", buffer)
+        capacity = min(buffer_size, ctypes.sizeof(target)) - 1
+        with session.lock:
+            if not session.rtlog_pending:
+                result = self._call(hcommpro, CMD_RTLOG)
+                if isinstance(result, int):
+                    return result
+                _, offset, length = result
+                session.rtlog_pending = rtlog_to_text(session.view[offset:offset + length]).encode()
+            text = session.rtlog_pending
+            if len(text) > capacity:
+                end = text.rfind(b"\r\n", 0, capacity) + 2
+                if end < 2:
+                    return self._fail(ERROR_BUFFER_SMALL)
+                text = text[:end]
+            session.rtlog_pending = session.rtlog_pending[len(text):]
+        ctypes.memmove(target, text + b"\0", len(text) + 1)
+        return text.count(b"\r\n")
+
+    def GetHIDEventCardNumAsStr(self, card_buffer):
+        # El protocolo TCP no tiene esta consulta; las tarjetas llegan por GetRTLog
+        return 0
+
+    def ControlDevice(self, hcommpro, operation_id, door_id, index, state, reserved, options):
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        data = bytes((operation_id & 0xFF, door_id & 0xFF, index & 0xFF, state & 0xFF, reserved & 0xFF))
+        with session.lock:
+            result = self._call(hcommpro, CMD_CONTROL, data)
+        return result if isinstance(result, int) else 0
+
+    def GetDeviceDataCount(self, hcommpro, table, filter_text, options):
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        if not session.emulator:
+            return self._fail(ERROR_UNAVAILABLE)
+        with session.lock:
+            result = self._call(hcommpro, CMD_DATACOUNT, b"\0".join((_text(table), _text(filter_text), _text(options))))
+            if isinstance(result, int):
+                return result
+            return struct.unpack_from("<I", session.buffer, result[1])[0]
+
+    def GetDeviceData(self, hcommpro, buffer, buffer_size, table, fieldnames, filter_text, options):
+        """Lee la tabla por páginas (cada trama admite hasta 64 KB) y la entrega completa en el buffer"""
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        if not session.emulator:
+            return self._fail(ERROR_UNAVAILABLE)
+        query = b"\0".join((_text(table), _text(fieldnames), _text(filter_text), _text(options)))
+        target = getattr(buffer, "_obj", buffer)
+        capacity = min(buffer_size, ctypes.sizeof(target)) - 1
+        written = 0
+        records = 0
+        with session.lock:
+            while True:
+                result = self._call(hcommpro, CMD_GETDATA, PAGE.pack(records, 0) + query)
+                if isinstance(result, int):
+                    return result
+                _, offset, length = result
+                rows, more = PAGE.unpack_from(session.buffer, offset)
+                offset += PAGE.size
+                length -= PAGE.size
+                if records:
+                    # Las páginas siguientes repiten la cabecera: se omite
+                    header_end = session.buffer.find(b"\r\n", offset, offset + length) + 2
+                    length -= header_end - offset
+                    offset = header_end
+                if written + length > capacity:
+                    return self._fail(ERROR_BUFFER_SMALL)
+                source = (ctypes.c_char * length).from_buffer(session.buffer, offset)
+                ctypes.memmove(ctypes.addressof(target) + written, source, length)
+                del source
+                written += length
+                records += rows
+                if not more:
+                    break
+        ctypes.memset(ctypes.addressof(target) + written, 0, 1)
+        return records
+
+    def SetDeviceData(self, hcommpro, table, data, options):
+        """Envía las filas en tramas de hasta 64 KB, cortando siempre entre filas"""
+        session = self._sessions.get(hcommpro)
+        if session is None:
+            return self._fail(ERROR_NO_REPLY)
+        if not session.emulator:
+            return self._fail(ERROR_UNAVAILABLE)
+        prefix = _text(table) + b"\0"
+        suffix = b"\0" + _text(options)
+        limit = MAX_FRAME_DATA - SESSION.size - len(prefix) - len(suffix)
+        data = _text(data)
+        with session.lock:
+            start = 0
+            while start < len(data):
+                end = start + limit
+                if end < len(data):
+                    end = data.rfind(b"\r\n", start, end) + 2
+                    if end <= start + 1:
+                        return self._fail(ERROR_BAD_DATA)  # Una sola fila no entra en una trama
+                result = self._call(hcommpro, CMD_SETDATA, prefix + data[start:end] + suffix)
+                if isinstance(result, int):
+                    return result
+                start = end
+        return 0
@@ -1,53 +1,197 @@
 """
 Módulo optimizado para la conexión y lectura de tarjetas RFID de un molinete ZKTeco C2-260
 basado en las funciones disponibles detectadas en el dispositivo específico.
+
+Importarlo no tiene efectos: pywin32 y la interfaz COM se cargan en el primer connect.
+
+La interfaz zkemkeeper queda ligada al apartamento (STA) del hilo que la crea y
+no es reentrante. Por eso la crea y la usa un único hilo (ComApartment); self.zkem
+es un intermediario con la misma interfaz cuyas llamadas se ejecutan en ese hilo,
+en orden. Así la carga de información en segundo plano, el EventPoller de
+ComDriver o la flota pueden usarla desde cualquier hilo, sin CoInitialize ni
+marshalling, y nunca hay dos llamadas a la vez sobre el mismo objeto.
 """
+import os
+import queue
+import threading
 import time
 import sys
+from concurrent.futures import Future
 from datetime import datetime
 
-try:
-    import pythoncom
-    import win32com.client
-except ImportError:
-    print("Este script requiere PyWin32. Instálelo con: pip install pywin32")
-    print("Ejecutando: pip install pywin32")
-    import subprocess
-    subprocess.call([sys.executable, "-m", "pip", "install", "pywin32"])
-    print("Por favor, reinicie el script después de la instalación.")
-    sys.exit(1)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from auth_cache import normalize_card
+from capability_profile import CARD_SOURCES, ProfileStore, ensure_profile, probe_com
+from card_dedup import CardDeduplicator
+from device_params import STATIC_TTL, ParamStore
+from device_tables import iter_table_rows
+
+# Información del dispositivo: clave de device_info -> llamada COM (cada una es un viaje al dispositivo)
+DEVICE_INFO_CALLS = {
+    "firmware": lambda zkem, machine: zkem.GetFirmwareVersion(machine),
+    "mac": lambda zkem, machine: zkem.GetDeviceMAC(machine),
+    "serial": lambda zkem, machine: zkem.GetSerialNumber(machine),
+    "ip": lambda zkem, machine: zkem.GetDeviceIP(machine),
+    "product_code": lambda zkem, machine: zkem.GetProductCode(machine),
+    "vendor": lambda zkem, machine: zkem.GetVendor(),
+    "platform": lambda zkem, machine: zkem.GetPlatform(machine),
+}
+
+class ComApartment:
+    """Hilo dueño de la interfaz COM: la crea en su propio STA y ejecuta todas sus llamadas"""
+
+    def __init__(self, progid="zkemkeeper.ZKEM.1"):
+        self.progid = progid
+        self.error = None  # Excepción si no se pudo crear la interfaz
+        self._zkem = None
+        self._calls = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self, timeout=30.0):
+        """Crea el hilo y la interfaz. True si quedó lista"""
+        self._thread = threading.Thread(target=self._run, name="zkemkeeper-com", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            self.error = TimeoutError("la interfaz COM no respondió")
+        return self.error is None
+
+    def _run(self):
+        import pythoncom
+        import win32com.client
+        
+        pythoncom.CoInitialize()
+        try:
+            try:
+                self._zkem = win32com.client.Dispatch(self.progid)
+            except Exception as e:
+                self.error = e
+                return
+            finally:
+                self._ready.set()
+            while True:
+                try:
+                    item = self._calls.get(timeout=0.1)
+                except queue.Empty:
+                    pythoncom.PumpWaitingMessages()  # Un STA debe atender sus mensajes
+                    continue
+                if item is None:
+                    break
+                future, name, args = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    future.set_result(getattr(self._zkem, name)(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            self._zkem = None
+            pythoncom.CoUninitialize()
+
+    def call(self, name, *args):
+        """Ejecuta zkem.<name>(*args) en el hilo dueño y devuelve su resultado (o lanza su excepción)"""
+        if threading.current_thread() is self._thread:
+            return getattr(self._zkem, name)(*args)
+        future = Future()
+        self._calls.put((future, name, args))
+        return future.result()
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._calls.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+class ComDispatch:
+    """Misma interfaz que zkemkeeper; cada método se ejecuta en el hilo de ComApartment"""
+
+    def __init__(self, apartment):
+        self._apartment = apartment
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        apartment = self._apartment
+
+        def call(*args):
+            return apartment.call(name, *args)
+
+        self.__dict__[name] = call
+        return call
+
 
 class ConnectionTurnstile:
-    def __init__(self):
-        """Inicializa la conexión con el molinete ZKTeco"""
+    def __init__(self, profile_store=None, metrics=None, label=None):
+        """Inicializa la conexión con el molinete ZKTeco.
+        
+        profile_store: ProfileStore con los perfiles de capacidades (por defecto en default_profile_path()).
+        metrics: SdkMetrics opcional que mide cada llamada COM bajo el nombre label (o la IP).
+        """
+        self.metrics = metrics
+        self.label = label
         self.device_id = 1  # ID de dispositivo por defecto
-        self.zkem = None
+        self.zkem = None  # ComDispatch sobre el hilo de ComApartment
         self.connected = False
         self.device_info = {}
-        
-        # Inicializar COM
+        self.params = ParamStore(self._fetch_info, ttl=STATIC_TTL)  # La información no cambia mientras está conectado
+        self.profile_store = profile_store
+        self.profile = None
+        self.card_sources = CARD_SOURCES  # Fuentes de tarjeta a consultar; las ajusta el perfil
+        self._info_thread = None
+        self._apartment = None
+    
+    def _init_com(self):
+        """Inicializa la interfaz COM zkemkeeper en su hilo propio (pywin32 se importa recién aquí)"""
+        if self.zkem is not None:
+            return True
         try:
-            pythoncom.CoInitialize()
-            self.zkem = win32com.client.Dispatch("zkemkeeper.ZKEM.1")
-            print("Interfaz COM zkemkeeper inicializada correctamente")
-        except Exception as e:
-            print(f"Error al inicializar zkemkeeper: {e}")
-            sys.exit(1)
+            import pythoncom  # noqa: F401
+            import win32com.client  # noqa: F401
+        except ImportError:
+            print("Este módulo requiere PyWin32. Instálelo con: pip install pywin32")
+            return False
+        
+        apartment = ComApartment()
+        if not apartment.start():
+            print(f"Error al inicializar zkemkeeper: {apartment.error}")
+            apartment.stop()
+            return False
+        self._apartment = apartment
+        self.zkem = ComDispatch(apartment)
+        print("Interfaz COM zkemkeeper inicializada correctamente")
+        return True
     
-    def connect(self, ip="192.168.0.201", port=14370):
-        """Conectar al dispositivo ZKTeco usando los parámetros proporcionados"""
-        if not self.zkem:
+    def connect(self, ip="192.168.0.201", port=14370, background_info=False):
+        """
+        Conectar al dispositivo ZKTeco usando los parámetros proporcionados.
+        
+        Args:
+            background_info: True para volver apenas se establece la conexión; la información
+                del dispositivo y el perfil de capacidades se cargan en un hilo
+                (wait_device_info() espera a que terminen).
+        """
+        if not self._init_com():
             print("La interfaz COM no está inicializada.")
             return False
+        if self.metrics is not None:
+            self.zkem = self.metrics.wrap_com(self.zkem, self.label or ip)
         
         try:
             print(f"Conectando a {ip}:{port}...")
             if self.zkem.Connect_Net(ip, port):
                 self.connected = True
+                self.params.invalidate()
                 print("✓ Conexión establecida exitosamente")
                 
                 # Obtener información básica del dispositivo
-                self._get_device_info()
+                if background_info:
+                    self._info_thread = threading.Thread(target=self._background_info, name="device-info",
+                                                         daemon=True)
+                    self._info_thread.start()
+                else:
+                    self._get_device_info()
+                    self._load_profile()
                 
                 # Habilitar el dispositivo para recibir eventos
                 if self.zkem.EnableDevice(self.device_id, True):
@@ -69,6 +213,7 @@ class ConnectionTurnstile:
         """Desconectar del dispositivo"""
         if self.connected and self.zkem:
             try:
+                self.wait_device_info(timeout=5)
                 self.zkem.Disconnect()
                 print("Dispositivo desconectado")
                 self.connected = False
@@ -83,14 +228,11 @@ class ConnectionTurnstile:
             return
         
         try:
-            # Usar las funciones que sabemos que funcionan según las pruebas
-            self.device_info["firmware"] = self.zkem.GetFirmwareVersion(self.device_id)[1]
-            self.device_info["mac"] = self.zkem.GetDeviceMAC(self.device_id)[1]
-            self.device_info["serial"] = self.zkem.GetSerialNumber(self.device_id)[1]
-            self.device_info["ip"] = self.zkem.GetDeviceIP(self.device_id)[1]
-            self.device_info["product_code"] = self.zkem.GetProductCode(self.device_id)[1]
-            self.device_info["vendor"] = self.zkem.GetVendor()[1]
-            self.device_info["platform"] = self.zkem.GetPlatform(self.device_id)[1]
+            # Usar las funciones que sabemos que funcionan según las pruebas (desde el caché si ya se leyeron)
+            info = self.params.get(list(DEVICE_INFO_CALLS))
+            if info is None:
+                raise RuntimeError(f"código {self.params.last_error}")
+            self.device_info.update(info)
             
             print("\n=== Información del Dispositivo ===")
             print(f"Modelo: {self.device_info.get('product_code', 'Desconocido')}")
@@ -105,12 +247,54 @@ class ConnectionTurnstile:
         except Exception as e:
             print(f"Error al obtener información del dispositivo: {e}")
     
-    def read_cards(self, duration=None):
+    def _fetch_info(self, names):
+        """Lectura para ParamStore: una llamada COM por dato (zkemkeeper no las agrupa)"""
+        if not self.connected:
+            return -8, {}
+        return 0, {name: DEVICE_INFO_CALLS[name](self.zkem, self.device_id)[1] for name in names}
+    
+    def _background_info(self):
+        # Las llamadas de este hilo se ejecutan en el hilo de ComApartment, en orden con las de connect
+        try:
+            self._get_device_info()
+            self._load_profile()
+        except Exception as e:
+            print(f"Error al cargar la información del dispositivo en segundo plano: {e}")
+    
+    def wait_device_info(self, timeout=None):
+        """Espera la carga en segundo plano de la información y el perfil. True si terminó"""
+        if self._info_thread is not None:
+            self._info_thread.join(timeout)
+            if self._info_thread.is_alive():
+                return False
+            self._info_thread = None
+        return True
+    
+    def _load_profile(self):
+        """Carga el perfil de capacidades guardado para este serie/firmware (o prueba las funciones
+        una vez si el firmware cambió) y elige las fuentes de tarjeta que funcionan"""
+        serial = self.device_info.get("serial")
+        firmware = self.device_info.get("firmware")
+        if not serial or firmware is None:
+            return
+        if self.profile_store is None:
+            self.profile_store = ProfileStore()
+        
+        start = time.perf_counter()
+        self.profile = ensure_profile(self.profile_store, serial, firmware, "com",
+                                      lambda: probe_com(self.zkem, self.device_id))
+        self.card_sources = tuple(source for source in CARD_SOURCES if self.profile.works(source)) or CARD_SOURCES
+        print(f"Perfil de capacidades cargado en {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"(fuentes de tarjeta: {', '.join(self.card_sources)})")
+    
+    def read_cards(self, duration=None, journal=None, dedup=None):
         """
         Lee tarjetas RFID durante un tiempo específico o indefinidamente.
         
         Args:
             duration: Tiempo en segundos para leer tarjetas. None para leer indefinidamente.
+            journal: EventJournal opcional donde se guarda cada lectura.
+            dedup: CardDeduplicator compartido con otras fuentes o dispositivos (por defecto uno propio).
         """
         if not self.connected:
             print("No hay conexión activa con el dispositivo.")
@@ -127,9 +311,9 @@ class ConnectionTurnstile:
             
             # Variables para seguimiento
             start_time = time.time()
-            last_card = None
             card_timeout = 2  # segundos para considerar lecturas duplicadas
-            last_card_time = 0
+            if dedup is None:
+                dedup = CardDeduplicator(window=card_timeout)
             
             try:
                 while True:
@@ -138,15 +322,18 @@ class ConnectionTurnstile:
                         print(f"\nTiempo de lectura ({duration}s) completado.")
                         break
                     
-                    # Procesamiento de eventos manual
-                    # No usamos GetLastEvent() ni PollCard() porque no funcionan según las pruebas
+                    # Procesamiento de eventos manual, solo con las fuentes que el perfil
+                    # del dispositivo marca como disponibles (ver capability_profile)
                     
-                    # Intentamos usar GetStrCardNumber directamente
-                    result, card_number = self.zkem.GetStrCardNumber()
+                    # GetStrCardNumber directamente
+                    if "GetStrCardNumber" in self.card_sources:
+                        result, card_number = self.zkem.GetStrCardNumber()
+                    else:
+                        result, card_number = False, ""
                     
                     if result and card_number and card_number != "0":
                         # Evitar lecturas duplicadas de la misma tarjeta
-                        if card_number != last_card or time.time() - last_card_time > card_timeout:
+                        if dedup.accept(card_number, self.device_id, "GetStrCardNumber"):
                             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                             
                             print(f"\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -155,14 +342,17 @@ class ConnectionTurnstile:
                             print(f"🕒 Hora: {timestamp}")
                             print(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
                             
-                            last_card = card_number
-                            last_card_time = time.time()
+                            if journal is not None:
+                                journal.append(time.time(), self.device_id, 1, normalize_card(card_number), 0)
                     
-                    # Alternativamente, intentamos usar GetHIDEventCardNumAsStr
-                    result, hid_card = self.zkem.GetHIDEventCardNumAsStr()
+                    # Alternativamente, GetHIDEventCardNumAsStr
+                    if "GetHIDEventCardNumAsStr" in self.card_sources:
+                        result, hid_card = self.zkem.GetHIDEventCardNumAsStr()
+                    else:
+                        result, hid_card = False, ""
                     
                     if result and hid_card:
-                        if hid_card != last_card or time.time() - last_card_time > card_timeout:
+                        if dedup.accept(hid_card, self.device_id, "GetHIDEventCardNumAsStr"):
                             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                             
                             print(f"\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
@@ -171,8 +361,8 @@ class ConnectionTurnstile:
                             print(f"🕒 Hora: {timestamp}")
                             print(f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
                             
-                            last_card = hid_card
-                            last_card_time = time.time()
+                            if journal is not None:
+                                journal.append(time.time(), self.device_id, 1, normalize_card(hid_card), 0)
                     
                     # Pausa corta para no consumir CPU
                     time.sleep(0.1)
@@ -180,6 +370,10 @@ class ConnectionTurnstile:
             except KeyboardInterrupt:
                 print("\nLectura de tarjetas detenida por el usuario")
             
+            if dedup.stats["suppressed"]:
+                print(f"Lecturas duplicadas descartadas: {dedup.stats['suppressed']} "
+                      f"(por fuente: {dict(dedup.suppressed_by_source)})")
+            
         except Exception as e:
             print(f"Error durante la lectura de tarjetas: {e}")
         finally:
@@ -189,8 +383,55 @@ class ConnectionTurnstile:
             except:
                 pass
     
+    def iter_users(self, fields="CardNo\tPin\tPassword\tGroup\tStartTime\tEndTime"):
+        """
+        Genera los usuarios/tarjetas del dispositivo como dicts, uno por vez.
+        
+        Descarga la tabla user completa en una sola petición (SSR_GetDeviceData) y
+        mantiene el dispositivo deshabilitado solo durante la transferencia.
+        Si el firmware no soporta tablas, usa ReadAllUserID + SSR_GetAllUserInfo.
+        """
+        if not self.connected:
+            print("No hay conexión activa con el dispositivo.")
+            return
+        
+        data = None
+        # Si el perfil indica que el firmware no soporta tablas, se va directo al método alternativo
+        bulk = self.profile is None or self.profile.works("SSR_GetDeviceDataCount")
+        self.zkem.EnableDevice(self.device_id, False)
+        try:
+            if bulk:
+                try:
+                    # Dimensionar el buffer según la cantidad de registros
+                    count_result, count = self.zkem.SSR_GetDeviceDataCount(self.device_id, "user", "", "")
+                    buffer_size = max(64 * 1024, (count if count_result else 0) * 128)
+                    result, data = self.zkem.SSR_GetDeviceData(self.device_id, buffer_size, "user", fields, "", "")
+                    if not result:
+                        data = None
+                except Exception:
+                    data = None
+            
+            if data is None:
+                # Método alternativo: ReadAllUserID copia todos los usuarios al SDK de una vez
+                if not self.zkem.ReadAllUserID(self.device_id):
+                    print("⚠ No se pudo leer la información de usuarios")
+                    return
+        finally:
+            self.zkem.EnableDevice(self.device_id, True)
+        
+        if data is not None:
+            yield from iter_table_rows(data)
+            return
+        
+        while True:
+            result, user_id, name, password, privilege, enabled = self.zkem.SSR_GetAllUserInfo(self.device_id)
+            if not result:
+                break
+            card_result, card_number = self.zkem.GetStrCardNumber()
+            yield {"Pin": user_id, "CardNo": card_number if card_result else "", "Name": name}
+    
     def get_users(self):
-        """Intenta obtener la lista de usuarios/tarjetas registradas en el dispositivo"""
+        """Muestra la lista de usuarios/tarjetas registradas en el dispositivo"""
         if not self.connected:
             print("No hay conexión activa con el dispositivo.")
             return
@@ -198,51 +439,13 @@ class ConnectionTurnstile:
         print("\nObteniendo usuarios registrados...")
         
         try:
-            # Limpiar buffer
-            self.zkem.EnableDevice(self.device_id, False)
-            time.sleep(0.5)
-            
-            # Obtener todos los usuarios
-            if not self.zkem.ReadAllUserID(self.device_id):
-                print("⚠ No se pudo leer la información de usuarios")
-                self.zkem.EnableDevice(self.device_id, True)
-                return
-            
             print("\n=== Usuarios/Tarjetas registradas ===")
             count = 0
-            
-            # Utilizar método alternativo para leer usuarios
-            try:
-                while True:
-                    result, user_id = self.zkem.SSR_GetAllUserInfo(self.device_id)
-                    if not result:
-                        break
-                        
-                    # Intentar obtener el número de tarjeta
-                    card_result, card_number = self.zkem.GetStrCardNumber()
-                    
-                    if card_result and card_number and card_number != "0":
-                        count += 1
-                        print(f"Usuario #{count}: ID={user_id}, Tarjeta={card_number}")
-            except:
-                if count == 0:
-                    print("No se encontraron usuarios con el método principal")
-            
-            # Si no se encontraron usuarios, intentar con un método alternativo
-            if count == 0:
-                try:
-                    # Iterar por posibles IDs de usuario
-                    for i in range(1, 100):
-                        user_id = str(i)
-                        # Intentar obtener información del usuario
-                        if self.zkem.SSR_GetUserInfo(self.device_id, user_id):
-                            # Intentar obtener número de tarjeta
-                            card_result, card_number = self.zkem.GetStrCardNumber()
-                            if card_result and card_number and card_number != "0":
-                                count += 1
-                                print(f"Usuario #{count}: ID={user_id}, Tarjeta={card_number}")
-                except:
-                    pass
+            for user in self.iter_users():
+                card_number = user.get("CardNo", "")
+                if card_number and card_number != "0":
+                    count += 1
+                    print(f"Usuario #{count}: ID={user.get('Pin')}, Tarjeta={card_number}")
             
             if count == 0:
                 print("No se encontraron usuarios registrados con tarjetas")
@@ -251,8 +454,6 @@ class ConnectionTurnstile:
             
         except Exception as e:
             print(f"Error al obtener usuarios: {e}")
-        finally:
-            self.zkem.EnableDevice(self.device_id, True)
 
 def main():
     """Función principal para probar la conexión al molinete"""
@@ -1,7 +1,8 @@
 """
 Script para probar las funciones disponibles en la interfaz zkemkeeper COM.
 Utiliza este script para identificar qué funciones son compatibles con tu
-versión específica del SDK ZKTeco.
+versión específica del SDK ZKTeco. El resultado se guarda como perfil del
+dispositivo (capability_profile), que ConnectionTurnstile carga al conectar.
 """
 
 import os
@@ -9,6 +10,9 @@ import sys
 import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from capability_profile import COM_PROBES, CapabilityProfile, ProfileStore, probe_com_call
+
 try:
     import pythoncom
     import win32com.client
@@ -40,48 +44,28 @@ def test_zkemkeeper_functions():
             print("✓ Conectado correctamente al dispositivo")
             machine_id = 1  # ID de dispositivo por defecto
             
-            # Tabla de funciones a probar
-            functions_to_test = [
-                # Funciones básicas
-                ("GetFirmwareVersion", lambda: zkem.GetFirmwareVersion(machine_id)),
-                ("GetDeviceMAC", lambda: zkem.GetDeviceMAC(machine_id)),
-                ("GetSerialNumber", lambda: zkem.GetSerialNumber(machine_id)),
-                ("GetDeviceIP", lambda: zkem.GetDeviceIP(machine_id)),
-                ("GetProductCode", lambda: zkem.GetProductCode(machine_id)),
-                ("GetVendor", lambda: zkem.GetVendor()),
-                ("GetPlatform", lambda: zkem.GetPlatform(machine_id)),
-                ("GetCardFun", lambda: zkem.GetCardFun(machine_id)),
-                
-                # Funciones para control de acceso
-                ("EnableDevice", lambda: zkem.EnableDevice(machine_id, True)),
-                ("DisableDevice", lambda: zkem.DisableDevice(machine_id)),
-                ("GetLastError", lambda: zkem.GetLastError()),
-                
-                # Funciones para eventos en tiempo real
-                ("RegEvent", lambda: zkem.RegEvent(machine_id, 65535)),  # 65535 = todos los eventos
-                ("GetRTLog", lambda: zkem.GetRTLog(machine_id)),
-                
-                # Funciones específicas para tarjetas
-                ("GetStrCardNumber", lambda: zkem.GetStrCardNumber()),
-                ("ReadCard", lambda: zkem.ReadCard(machine_id, "")),
-                ("GetHIDEventCardNumAsStr", lambda: zkem.GetHIDEventCardNumAsStr()),
-                ("PollCard", lambda: zkem.PollCard()),
-                
-                # Función para leer eventos de log
-                ("ReadGeneralLogData", lambda: zkem.ReadGeneralLogData(machine_id)),
+            # Tabla de funciones a probar: las del perfil (sin efectos sobre el dispositivo)
+            # más las que tienen efectos (registrar eventos, consumir el log en tiempo real,
+            # descargar el historial, habilitar/deshabilitar), que solo se prueban en este script
+            functions_to_test = list(COM_PROBES) + [
+                ("RegEvent", lambda zkem, machine: zkem.RegEvent(machine, 65535)),
+                ("GetRTLog", lambda zkem, machine: zkem.GetRTLog(machine)),
+                ("ReadGeneralLogData", lambda zkem, machine: zkem.ReadGeneralLogData(machine)),
+                ("DisableDevice", lambda zkem, machine: zkem.DisableDevice(machine)),
+                ("EnableDevice", lambda zkem, machine: zkem.EnableDevice(machine, True)),
             ]
             
-            # Probar cada función e informar resultado
+            # Probar cada función e informar resultado (zkemkeeper informa los errores con
+            # GetLastError en lugar de lanzar excepciones)
             results = []
             print("\n--- Probando funciones del SDK ---")
             for func_name, func_call in functions_to_test:
-                try:
-                    result = func_call()
+                works, code, result = probe_com_call(zkem, machine_id, func_call)
+                if works:
                     print(f"✓ {func_name}: Disponible (Resultado: {result})")
-                    results.append((func_name, True, str(result)))
-                except Exception as e:
-                    print(f"✗ {func_name}: No disponible o error ({str(e)})")
-                    results.append((func_name, False, str(e)))
+                else:
+                    print(f"✗ {func_name}: No disponible o error ({result}, GetLastError: {code})")
+                results.append((func_name, works, code))
             
             # Test específico para lectura de tarjetas
             print("\n--- Prueba especial: Lectura de tarjeta en tiempo real ---")
@@ -126,9 +110,22 @@ def test_zkemkeeper_functions():
             
             # Resumen de disponibilidad
             print("\n--- Resumen de Funciones ---")
-            available = sum(1 for _, status, _ in results if status)
+            available = sum(1 for _, works, _ in results if works)
             print(f"Funciones disponibles: {available} de {len(functions_to_test)}")
             
+            # Guardar el perfil para no volver a probar al conectar
+            try:
+                probed = {name for name, _ in COM_PROBES}
+                profile = CapabilityProfile(
+                    zkem.GetSerialNumber(machine_id)[1], zkem.GetFirmwareVersion(machine_id)[1], "com",
+                    {name: works for name, works, _ in results if name in probed}, time.time(),
+                    {name: code for name, works, code in results if name in probed and not works})
+                store = ProfileStore()
+                store.save(profile)
+                print(f"Perfil de {profile.serial} (firmware {profile.firmware}) guardado en {store.path}")
+            except Exception as e:
+                print(f"✗ No se pudo guardar el perfil del dispositivo: {e}")
+            
             # Desconectar
             zkem.Disconnect()
             print("\nDispositivo desconectado")
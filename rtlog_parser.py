@@ -0,0 +1,237 @@
+"""
+Parser de una sola pasada para los buffers de GetRTLog.
+
+GetRTLog puede devolver varios registros separados por \\r\\n en una misma
+llamada. Cada registro tiene el formato
+Time,Pin,CardNo,Door,EventType,InOutState,VerifyMode
+y se convierte en un RTLogEvent compacto. También se aceptan registros con
+pares clave=valor ("CardNo=123\\tPin=1...") que entregan algunos firmwares.
+"""
+import time
+from itertools import repeat
+from typing import NamedTuple, Optional
+
+DOOR_STATUS_EVENT = 255  # Registro de estado de puertas/alarmas, no de tarjeta
+
+_KEY_ALIASES = {
+    "time": "time", "pin": "pin",
+    "cardno": "card", "card": "card", "cardnumber": "card",
+    "door": "door", "doorid": "door", "eventaddr": "door",
+    "eventtype": "event_type", "event": "event_type",
+    "inoutstate": "in_out", "inout": "in_out",
+    "verifymode": "verify_mode", "verifytype": "verify_mode", "verified": "verify_mode",
+}
+
+
+class RTLogEvent(NamedTuple):
+    time: str
+    pin: str
+    card: Optional[str]  # None si el evento no trae tarjeta
+    door: int
+    event_type: int
+    in_out: int
+    verify_mode: int
+
+
+class _SmallInts(dict):
+    """Cache texto->int para los campos numéricos cortos (puerta, evento, estado, verificación)"""
+
+    def __missing__(self, key):
+        value = int(key)
+        if len(self) < 4096:
+            self[key] = value
+        return value
+
+
+_small_int = _SmallInts((str(i), i) for i in range(256)).__getitem__
+_CARD_OR_NONE = {"0": None, "": None}
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return -1
+
+
+def _clean_card(card):
+    card = card.strip().replace("-", "")
+    if not card or card == "0" or not card.isdigit():
+        return None
+    return card
+
+
+def _uniform_fields(data):
+    """Campos de todo el buffer si cada registro tiene exactamente 7 (si no, None y ruta general)"""
+    if "=" in data:
+        return None
+    lines = data.split("\r\n")
+    if set(map(str.count, lines, repeat(","))) != {6}:
+        return None
+    return ",".join(lines).split(",")
+
+
+def _clean_cards(cards):
+    """Columna de tarjetas con la misma limpieza que _clean_card; sin llamadas por registro si ya
+    son todas dígitos"""
+    if "".join(cards).isdigit():
+        return map(_CARD_OR_NONE.get, cards, cards)
+    return map(_clean_card, cards)
+
+
+def _parse_key_value(record):
+    """Registro con pares clave=valor separados por tabulador o coma"""
+    values = {}
+    for pair in record.replace("\t", ",").split(","):
+        key, sep, value = pair.partition("=")
+        if sep:
+            field = _KEY_ALIASES.get(key.strip().lower())
+            if field:
+                values[field] = value.strip()
+    if "card" not in values:
+        return None
+    return RTLogEvent(
+        values.get("time", ""), values.get("pin", ""), _clean_card(values["card"]),
+        _to_int(values.get("door", "0")), _to_int(values.get("event_type", "0")),
+        _to_int(values.get("in_out", "0")), _to_int(values.get("verify_mode", "0")),
+    )
+
+
+def _parse_records(data):
+    """Ruta general: registro por registro, admite registros irregulares"""
+    events = []
+    append = events.append
+    for record in data.split("\r\n"):
+        if not record:
+            continue
+        fields = record.split(",")
+        if len(fields) == 7 and "=" not in record:
+            try:
+                append(RTLogEvent(
+                    fields[0], fields[1], _clean_card(fields[2]),
+                    int(fields[3]), int(fields[4]), int(fields[5]), int(fields[6]),
+                ))
+                continue
+            except ValueError:
+                pass
+        if "=" in record:
+            event = _parse_key_value(record.strip())
+            if event:
+                append(event)
+    return events
+
+
+def parse_rt_log(data):
+    """Convierte un buffer completo de GetRTLog (str o bytes) en una lista de RTLogEvent"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).split(b"\0", 1)[0].decode("utf-8", errors="ignore")
+    data = data.strip()
+    if not data:
+        return []
+    # Ruta rápida: todos los registros tienen 7 campos. Se divide el buffer una sola vez
+    # y las columnas se convierten con map/zip, sin bucles de Python por registro.
+    fields = _uniform_fields(data)
+    if fields is not None:
+        try:
+            return list(map(tuple.__new__, repeat(RTLogEvent), zip(
+                fields[0::7], fields[1::7], _clean_cards(fields[2::7]),
+                map(_small_int, fields[3::7]), map(_small_int, fields[4::7]),
+                map(_small_int, fields[5::7]), map(_small_int, fields[6::7]),
+            )))
+        except ValueError:
+            pass
+    return _parse_records(data)
+
+
+def parse_cards(data):
+    """Solo los números de tarjeta de un buffer de GetRTLog, en orden (ruta más liviana)"""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).split(b"\0", 1)[0].decode("utf-8", errors="ignore")
+    data = data.strip()
+    if not data:
+        return []
+    fields = _uniform_fields(data)
+    if fields is not None:
+        return [card for card, event_type in zip(_clean_cards(fields[2::7]), fields[4::7])
+                if card and event_type != "255"]
+    return [event.card for event in _parse_records(data) if event.card and event.event_type != DOOR_STATUS_EVENT]
+
+
+def first_card(events):
+    """Número de tarjeta del primer evento que lo tenga"""
+    for event in events:
+        if event.card and event.event_type != DOOR_STATUS_EVENT:
+            return event.card
+    return None
+
+
+def _legacy_parse_card_event(event_data):
+    """Copia textual de ZKTecoDevice._parse_card_event antes del parser por lotes, solo como
+    referencia del benchmark. No reconoce el formato con comas (devuelve None): mide el costo de
+    su búsqueda por registro, no un resultado equivalente."""
+    try:
+        if not event_data:
+            return None
+        
+        # Buscar CardNo en el evento
+        if "CardNo=" in event_data:
+            # Extraer el número después de CardNo=
+            parts = event_data.split("CardNo=")
+            if len(parts) > 1:
+                card_part = parts[1].split("\t")[0].split(",")[0].strip()
+                if card_part and card_part.isdigit():
+                    return card_part
+        
+        # Intentar otros formatos posibles
+        card_indicators = ["Cardno=", "Card=", "CardNumber="]
+        for indicator in card_indicators:
+            if indicator in event_data:
+                parts = event_data.split(indicator)
+                if len(parts) > 1:
+                    card_part = parts[1].split("\t")[0].split(",")[0].strip()
+                    if card_part and card_part.replace("-", "").isdigit():
+                        return card_part.replace("-", "")
+        
+        return None
+        
+    except Exception as e:
+        print(f"Error al parsear evento de tarjeta: {e}")
+        return None
+
+
+def synthetic_buffer(records, start_card=10000000):
+    """Genera un buffer de GetRTLog con la cantidad de registros indicada"""
+    return "".join(
+        f"2025-03-05 08:{i // 60 % 60:02d}:{i % 60:02d},{i},{start_card + i},{i % 4 + 1},0,{i % 2},1\r\n"
+        for i in range(records)
+    )
+
+
+def _rate(parse, size, min_time):
+    loops = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        parse()
+        loops += 1
+    return loops * size / (time.perf_counter() - start)
+
+
+def benchmark(sizes=(1, 10, 100, 1000), min_time=0.3):
+    """Eventos/segundo: parser anterior registro por registro (sin cambios, ver
+    _legacy_parse_card_event), parse_rt_log (registro tipado completo) y parse_cards (solo tarjetas)"""
+    results = {}
+    print(f"{'registros':>10} {'anterior ev/s':>15} {'tipado ev/s':>15} {'tarjetas ev/s':>15}")
+    for size in sizes:
+        buffer = synthetic_buffer(size)
+        rates = (
+            _rate(lambda: [_legacy_parse_card_event(record) for record in buffer.strip().split("\r\n")], size, min_time),
+            _rate(lambda: parse_rt_log(buffer), size, min_time),
+            _rate(lambda: parse_cards(buffer), size, min_time),
+        )
+        results[size] = rates
+        print(f"{size:>10} {rates[0]:>15,.0f} {rates[1]:>15,.0f} {rates[2]:>15,.0f}")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
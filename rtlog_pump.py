@@ -0,0 +1,192 @@
+"""
+Bomba de eventos en tiempo real (GetRTLog) para dispositivos PullSDK.
+
+Vacía el log en tiempo real del dispositivo hasta que no queden eventos,
+consulta de forma continua mientras hay actividad y espera cada vez más
+cuando el dispositivo está inactivo. Los eventos se entregan a un callback
+o a una cola acotada. Con un Tracer (tracing), los eventos muestreados que se
+entregan al callback registran los tramos poll, parse y wait.
+"""
+import queue
+import threading
+import time
+
+from buffer_pool import BufferPool, buffer_text
+from rtlog_parser import parse_rt_log
+
+
+class AdaptiveBackoff:
+    """Intervalo de espera que crece al estar inactivo y vuelve al mínimo con actividad"""
+
+    def __init__(self, min_interval=0.001, max_interval=0.1, factor=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.interval = min_interval
+
+    def reset(self):
+        self.interval = self.min_interval
+        return self.interval
+
+    def next(self, busy):
+        """Devuelve el tiempo a esperar antes de la próxima consulta"""
+        if busy:
+            return self.reset()
+        self.interval = min(self.interval * self.factor, self.max_interval)
+        return self.interval
+
+
+class RTLogPump:
+    """Lee GetRTLog en un hilo propio y entrega los eventos parseados"""
+
+    def __init__(self, commpro, hcommpro, callback=None, queue_size=1024, parser=parse_rt_log,
+                 buffer_size=4096, max_drain=64, min_interval=0.001, max_interval=0.1, buffers=None,
+                 tracer=None, device_id=0):
+        self.commpro = commpro
+        self.hcommpro = hcommpro
+        self.callback = callback
+        self.events = None if callback else queue.Queue(maxsize=queue_size)
+        self.parser = parser
+        self.buffer_size = buffer_size
+        self.max_drain = max_drain  # Lecturas máximas por ciclo para no acaparar el handle
+        self.backoff = AdaptiveBackoff(min_interval, max_interval)
+        self.stats = {"polls": 0, "events": 0, "dropped": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0}
+        self.buffers = buffers or BufferPool()  # El buffer crece si GetRTLog devuelve -3
+        self.tracer = tracer
+        self.device_id = device_id  # Identifica al dispositivo en las trazas
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _read_batches(self):
+        """Lee GetRTLog hasta que el dispositivo no devuelva más eventos.
+        
+        Genera (eventos parseados, (inicio de la llamada, lectura, fin del parseo)) por cada
+        llamada; la siguiente llamada se hace recién cuando se pide el próximo lote, así que
+        los eventos de un lote se despachan sin esperar al resto del vaciado.
+        """
+        for _ in range(self.max_drain):
+            self.stats["polls"] += 1
+            started_at = time.perf_counter()
+            ret, buffer = self.buffers.call("rtlog", self.buffer_size, self._get_rt_log)
+            if ret <= 0:
+                if ret < 0:
+                    self.stats["errors"] += 1
+                break
+            received_at = time.perf_counter()
+            events = self.parser(buffer_text(buffer))
+            yield events, (started_at, received_at, time.perf_counter())
+
+    def _get_rt_log(self, buffer, size):
+        return self.commpro.GetRTLog(self.hcommpro, buffer, size)
+
+    def drain(self):
+        """Vacía el log en tiempo real y devuelve los RTLogEvent leídos"""
+        return [event for events, _ in self._read_batches() for event in events]
+
+    def poll_once(self):
+        """Vacía el log y despacha los eventos de cada lote antes de leer el siguiente.
+        Devuelve la cantidad de eventos leídos"""
+        count = 0
+        for events, timings in self._read_batches():
+            for event in events:
+                self._dispatch(event, timings)
+            count += len(events)
+        return count
+
+    def _dispatch(self, event, timings):
+        received_at = timings[1]
+        if self.callback:
+            if self.tracer is not None:
+                self.tracer.begin(event, self.device_id, timings)
+            try:
+                self.callback(event)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error en el callback de eventos: {e}")
+            if self.tracer is not None:
+                self.tracer.end()
+        else:
+            try:
+                self.events.put_nowait(event)
+            except queue.Full:
+                self.stats["dropped"] += 1
+                return
+        latency = time.perf_counter() - received_at
+        self.stats["events"] += 1
+        self.stats["latency_total"] += latency
+        if latency > self.stats["latency_max"]:
+            self.stats["latency_max"] = latency
+
+    def run(self):
+        """Bucle principal: consulta sin pausa mientras haya eventos y espera de forma creciente si no"""
+        interval = self.backoff.reset()
+        while not self._stop.is_set():
+            try:
+                busy = self.poll_once() > 0
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error al leer eventos en tiempo real: {e}")
+                busy = False
+            interval = self.backoff.next(busy)
+            if not busy:
+                self._stop.wait(interval)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="rtlog-pump", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def mean_latency(self):
+        """Latencia promedio (segundos) desde la lectura hasta la entrega del evento"""
+        if not self.stats["events"]:
+            return 0.0
+        return self.stats["latency_total"] / self.stats["events"]
+
+
+def measure_tap_latency(taps=200, interval=0.01):
+    """Mide la latencia desde el acercamiento de la tarjeta hasta el callback usando FakeCommpro"""
+    from fake_commpro import FakeCommpro
+    from molinete_test import ZKTecoDevice
+
+    fake = FakeCommpro()
+    device = ZKTecoDevice(commpro=fake)
+    device.connect()
+    latencies = []
+    done = threading.Event()
+
+    def on_event(event):
+        tapped_at = fake.tap_times.get(event.card)
+        if tapped_at is not None:
+            latencies.append(time.perf_counter() - tapped_at)
+        if len(latencies) >= taps:
+            done.set()
+
+    pump = device.start_event_pump(callback=on_event)
+    for i in range(taps):
+        fake.tap(str(10000000 + i))
+        time.sleep(interval)
+    done.wait(5)
+    device.disconnect()
+
+    latencies.sort()
+    if not latencies:
+        print("No se recibieron eventos")
+        return None
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"Eventos: {len(latencies)}  Consultas: {pump.stats['polls']}  "
+          f"Latencia tarjeta->callback p50={p50:.2f} ms p99={p99:.2f} ms")
+    return latencies
+
+
+if __name__ == "__main__":
+    measure_tap_latency()
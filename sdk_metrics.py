@@ -0,0 +1,243 @@
+"""
+Métricas por llamada al SDK: histogramas de latencia y contadores de errores.
+
+SdkMetrics.wrap(commpro, dispositivo) devuelve un objeto con la misma
+interfaz que plcommpro.dll (o SocketCommpro / FakeCommpro) que mide cada
+llamada al SDK (PULLSDK_CALLS); wrap_com() hace lo mismo con la interfaz COM
+zkemkeeper (COM_CALLS). Los demás atributos (FakeCommpro.tap, por ejemplo)
+pasan sin medir. El costo
+por llamada es leer el reloj dos veces y sumar en una lista: los cubos del
+histograma son potencias de dos en nanosegundos (int.bit_length), así que no
+hay búsquedas ni bloqueos en el camino caliente.
+
+Errores: en PullSDK, un resultado negativo (Connect: handle 0) se cuenta
+con el código de PullLastError(); en COM, un resultado falso o una excepción
+se cuentan con el código de GetLastError() ("exception" si no hay código).
+Los códigos que no son errores (COM_NO_ERROR: 0 = sin datos, por ejemplo
+GetStrCardNumber sin tarjeta presentada) no se cuentan.
+
+    metrics = SdkMetrics()
+    device = ZKTecoDevice(metrics=metrics, label="molinete-1")
+    metrics.serve(9108)   # http://127.0.0.1:9108/metrics en formato de texto de Prometheus
+
+    python sdk_metrics.py   # mide el costo agregado por llamada
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from capability_profile import COM_NO_ERROR, com_last_error, com_succeeded
+
+BUCKETS = 64  # Cubo i: llamadas de menos de 2**i ns
+FIRST_EXPORTED = 10  # En la salida, el primer límite es 2**10 ns (~1 µs); los menores se acumulan ahí
+
+# Funciones del SDK que se miden; PullLastError y GetLastError no, porque se llaman al contar errores
+PULLSDK_CALLS = (
+    "Connect", "Disconnect", "GetDeviceParam", "SetDeviceParam", "ControlDevice", "GetRTLog",
+    "GetDeviceData", "GetDeviceDataCount", "SetDeviceData", "DeleteDeviceData",
+    "GetHIDEventCardNumAsStr", "SearchDevice", "ModifyIPAddress",
+)
+COM_CALLS = (
+    "Connect_Net", "Disconnect", "SetCommPassword", "RegEvent", "GetRTLog", "ReadGeneralLogData",
+    "GetLastEvent", "EnableDevice", "DisableDevice", "ACUnlock", "PollCard", "ReadCard",
+    "GetStrCardNumber", "GetHIDEventCardNumAsStr", "GetSerialNumber", "GetFirmwareVersion",
+    "GetDeviceMAC", "GetDeviceIP", "GetProductCode", "GetVendor", "GetPlatform", "GetCardFun",
+    "ReadAllUserID", "SSR_GetAllUserInfo", "SSR_GetDeviceData", "SSR_GetDeviceDataCount",
+)
+
+
+class CallStats:
+    """Histograma y errores de una función en un dispositivo"""
+
+    __slots__ = ("buckets", "total_ns", "errors")
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.total_ns = [0]  # Lista para sumar sin buscar el atributo en cada llamada
+        self.errors = {}  # código -> cantidad
+
+    def error(self, code):
+        self.errors[code] = self.errors.get(code, 0) + 1
+
+
+def _pullsdk_call(fn, stats, last_error, connect=False):
+    buckets = stats.buckets
+    total = stats.total_ns
+    clock = time.perf_counter_ns
+
+    def call(*args):
+        start = clock()
+        ret = fn(*args)
+        elapsed = clock() - start
+        buckets[elapsed.bit_length()] += 1
+        total[0] += elapsed
+        if ret < 0 or (connect and ret == 0):
+            stats.error(last_error() if last_error else ret)
+        return ret
+
+    return call
+
+
+def _com_call(fn, stats, zkem):
+    buckets = stats.buckets
+    total = stats.total_ns
+    clock = time.perf_counter_ns
+
+    def call(*args):
+        start = clock()
+        try:
+            result = fn(*args)
+        except Exception:
+            code = com_last_error(zkem)
+            stats.error("exception" if code is None else code)
+            raise
+        finally:
+            elapsed = clock() - start
+            buckets[elapsed.bit_length()] += 1
+            total[0] += elapsed
+        if not com_succeeded(result):
+            code = com_last_error(zkem)
+            if code not in COM_NO_ERROR:
+                stats.error("false" if code is None else code)
+        return result
+
+    return call
+
+
+class _Instrumented:
+    """Envoltorio con la misma interfaz que el objeto original; cada función del SDK se envuelve
+    una vez, el resto de los atributos se devuelve tal cual"""
+
+    def __init__(self, target, metrics, device, com):
+        self._target = target
+        self._metrics = metrics
+        self._device = device
+        self._com = com
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute) or name not in (COM_CALLS if self._com else PULLSDK_CALLS):
+            return attribute
+        stats = self._metrics.stats(self._device, name)
+        if self._com:
+            wrapped = _com_call(attribute, stats, self._target)
+        else:
+            last_error = getattr(self._target, "PullLastError", None)
+            wrapped = _pullsdk_call(attribute, stats, last_error, connect=name == "Connect")
+        self.__dict__[name] = wrapped  # Las próximas búsquedas no pasan por __getattr__
+        return wrapped
+
+
+class SdkMetrics:
+    """Registro de métricas por (dispositivo, función) con salida en formato Prometheus"""
+
+    def __init__(self, prefix="zk_sdk"):
+        self.prefix = prefix
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def stats(self, device, call):
+        key = (device, call)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = CallStats()
+            return self._stats[key]
+
+    def wrap(self, commpro, device):
+        """commpro (plcommpro.dll, SocketCommpro, FakeCommpro) con cada llamada medida"""
+        if isinstance(commpro, _Instrumented):
+            return commpro
+        return _Instrumented(commpro, self, device, com=False)
+
+    def wrap_com(self, zkem, device):
+        """Interfaz COM zkemkeeper con cada llamada medida"""
+        if isinstance(zkem, _Instrumented):
+            return zkem
+        return _Instrumented(zkem, self, device, com=True)
+
+    def snapshot(self):
+        """{(dispositivo, función): (cantidad, segundos totales, {código: errores})}"""
+        with self._lock:
+            items = list(self._stats.items())
+        return {key: (sum(stats.buckets), stats.total_ns[0] / 1e9, dict(stats.errors)) for key, stats in items}
+
+    def render(self):
+        """Texto de exposición de Prometheus (versión 0.0.4)"""
+        name = f"{self.prefix}_call_duration_seconds"
+        errors = f"{self.prefix}_call_errors_total"
+        lines = [f"# HELP {name} Duración de las llamadas al SDK", f"# TYPE {name} histogram"]
+        error_lines = [f"# HELP {errors} Llamadas al SDK fallidas por código de error", f"# TYPE {errors} counter"]
+        with self._lock:
+            items = sorted(self._stats.items())
+        for (device, call), stats in items:
+            buckets = list(stats.buckets)
+            labels = f'device="{_escape(device)}",call="{_escape(call)}"'
+            count = sum(buckets[:FIRST_EXPORTED])
+            last = max((i for i, value in enumerate(buckets) if value), default=0)
+            for i in range(FIRST_EXPORTED, max(last, FIRST_EXPORTED) + 1):
+                count += buckets[i]
+                lines.append(f'{name}_bucket{{{labels},le="{2 ** i / 1e9:.9g}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {stats.total_ns[0] / 1e9:.9f}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+            for code, value in sorted(stats.errors.items(), key=lambda item: str(item[0])):
+                error_lines.append(f'{errors}{{{labels},code="{_escape(code)}"}} {value}')
+        return "\n".join(lines + error_lines) + "\n"
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """Publica /metrics en un hilo; devuelve el servidor (server.shutdown() lo detiene)"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="sdk-metrics", daemon=True).start()
+        print(f"Métricas del SDK en http://{host}:{self._server.server_port}/metrics")
+        return self._server
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def benchmark(calls=1_000_000):
+    """Costo agregado por llamada: función vacía directa contra la misma función medida"""
+
+    class Noop:
+        def GetRTLog(self, hcommpro, buffer, size):
+            return 0
+
+        def PullLastError(self):
+            return 0
+
+    raw = Noop()
+    wrapped = SdkMetrics().wrap(raw, "bench")
+    results = {}
+    for label, target in (("directa", raw), ("medida", wrapped)):
+        call = target.GetRTLog
+        start = time.perf_counter()
+        for _ in range(calls):
+            call(1, None, 0)
+        results[label] = (time.perf_counter() - start) / calls * 1e9
+    overhead = results["medida"] - results["directa"]
+    print(f"Llamada directa: {results['directa']:.0f} ns  medida: {results['medida']:.0f} ns  "
+          f"costo agregado: {overhead:.0f} ns por llamada")
+    return overhead
+
+
+if __name__ == "__main__":
+    benchmark()
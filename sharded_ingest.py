@@ -0,0 +1,446 @@
+"""
+Ingesta de eventos en varios procesos, con los dispositivos repartidos por grupos.
+
+Con miles de eventos por segundo, leer, parsear, autorizar y registrar todo en
+un solo proceso choca con el GIL. ShardedIngest reparte los dispositivos entre
+procesos. Cada proceso conecta sus propios ZKTecoDevice, corre un RTLogPump
+por dispositivo y hace todo el trabajo por evento: lo anexa a su propio
+EventJournal (directorio/shard-N) y decide el acceso con su propia copia del
+CardAuthCache (un snapshot() tomado al arrancar; los cambios posteriores del
+caché no llegan a los procesos). Con open_seconds también abre la puerta. Al
+coordinador solo le llegan los contadores de cada proceso (eventos,
+autorizados, denegados) en la cabecera de un segmento de memoria compartida.
+
+Solo si se pasa un callback, los procesos además copian cada evento a un
+anillo en esa memoria compartida (registros BODY de event_journal, 32 bytes:
+microsegundos, tarjeta, dispositivo, evento, puerta, sentido) y el
+coordinador los entrega como JournalRecord; ese es el único trabajo por
+registro que queda en el coordinador. Cada anillo tiene un solo productor y
+un solo consumidor: el productor copia los registros y recién después
+publica el índice de escritura. Python no expone barreras de memoria, así que
+eso alcanza solo donde el hardware mantiene el orden de las escrituras (x86 y
+x86-64); en ARM el consumidor podría ver el índice antes que los registros.
+Si el anillo está lleno, el proceso de lectura espera en vez de descartar
+eventos.
+
+    targets = {1: {"ip_address": "192.168.0.201"}, 2: {"ip_address": "192.168.0.202"}}
+    ingest = ShardedIngest(targets, processes=4, cache=cache, journal_directory="diario")
+    ingest.start()
+    ...
+    ingest.stop()
+
+    python sharded_ingest.py --devices 16 --procesos 1,2,4   # escalado sobre el emulador
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import struct
+import tempfile
+import threading
+import time
+from multiprocessing import shared_memory
+
+from auth_cache import CardAuthCache, normalize_card
+from event_journal import BODY, EventJournal, JournalRecord, event_timestamp, pack_body
+from rtlog_parser import DOOR_STATUS_EVENT
+from rtlog_pump import AdaptiveBackoff
+
+RECORD = BODY  # Mismo registro que el diario, sin el CRC
+RING_HEADER = 128  # Índice de escritura en 0, de lectura en 64 (líneas de caché distintas)
+INDEX = struct.Struct("<Q")
+# En 8: esperas por anillo lleno, dispositivos conectados y fallidos, eventos, autorizados y denegados
+COUNTERS = struct.Struct("<QIIQQQ")
+EVENT_COUNTERS = struct.Struct("<QQQ")
+WRITE_OFFSET = 0
+COUNTERS_OFFSET = 8
+EVENTS_OFFSET = 24
+READ_OFFSET = 64
+
+
+class EventRing:
+    """Anillo de registros de ancho fijo en memoria compartida, un productor y un consumidor"""
+
+    def __init__(self, capacity=65536, name=None):
+        """Sin name crea el segmento; con name se conecta al que creó otro proceso"""
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None,
+                                              size=RING_HEADER + capacity * RECORD.size)
+        self.name = self.shm.name
+        self.buf = self.shm.buf
+        if name is None:
+            self.buf[:RING_HEADER] = bytes(RING_HEADER)
+        self._write = INDEX.unpack_from(self.buf, WRITE_OFFSET)[0]  # Solo lo usa el productor
+        self._read = INDEX.unpack_from(self.buf, READ_OFFSET)[0]  # Solo lo usa el consumidor
+        self._full_waits = 0
+
+    def __len__(self):
+        return INDEX.unpack_from(self.buf, WRITE_OFFSET)[0] - INDEX.unpack_from(self.buf, READ_OFFSET)[0]
+
+    def _copy(self, index, data):
+        """Copia registros completos a partir de la posición index (dando la vuelta si hace falta)"""
+        position = index % self.capacity
+        first = min(len(data), (self.capacity - position) * RECORD.size)
+        start = RING_HEADER + position * RECORD.size
+        self.buf[start:start + first] = data[:first]
+        if first < len(data):
+            self.buf[RING_HEADER:RING_HEADER + len(data) - first] = data[first:]
+
+    def write(self, data):
+        """Anexa registros ya empaquetados (bytes de RECORD). Si el anillo está lleno espera a que
+        el consumidor libere lugar"""
+        view = memoryview(data)
+        while view:
+            free = self.capacity - (self._write - INDEX.unpack_from(self.buf, READ_OFFSET)[0])
+            if not free:
+                self._full_waits += 1
+                struct.pack_into("<Q", self.buf, COUNTERS_OFFSET, self._full_waits)
+                time.sleep(0.0005)
+                continue
+            chunk = view[:free * RECORD.size]
+            self._copy(self._write, chunk)
+            self._write += len(chunk) // RECORD.size
+            INDEX.pack_into(self.buf, WRITE_OFFSET, self._write)  # Publica después de copiar
+            view = view[len(chunk):]
+
+    def read(self):
+        """Tuplas de RECORD de todo lo pendiente (lista vacía si no hay nada)"""
+        available = INDEX.unpack_from(self.buf, WRITE_OFFSET)[0] - self._read
+        if not available:
+            return []
+        position = self._read % self.capacity
+        first = min(available, self.capacity - position)
+        start = RING_HEADER + position * RECORD.size
+        data = bytes(self.buf[start:start + first * RECORD.size])
+        if first < available:
+            data += bytes(self.buf[RING_HEADER:RING_HEADER + (available - first) * RECORD.size])
+        self._read += available
+        INDEX.pack_into(self.buf, READ_OFFSET, self._read)
+        return list(RECORD.iter_unpack(data))
+
+    def counters(self):
+        """(esperas por anillo lleno, dispositivos conectados, dispositivos que no conectaron,
+        eventos, autorizados, denegados)"""
+        return COUNTERS.unpack_from(self.buf, COUNTERS_OFFSET)
+
+    def set_devices(self, connected, failed):
+        struct.pack_into("<II", self.buf, COUNTERS_OFFSET + 8, connected, failed)
+
+    def set_events(self, events, granted, denied):
+        EVENT_COUNTERS.pack_into(self.buf, EVENTS_OFFSET, events, granted, denied)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def pack_event(event, device_id):
+    """RTLogEvent -> registro del anillo (mismos campos y límites que el diario)"""
+    timestamp = event_timestamp(event.time) or time.time()
+    return pack_body(timestamp, device_id, event.door, normalize_card(event.card), event.event_type, event.in_out)
+
+
+def _event_handler(device, device_id, cache, journal, open_seconds, pending, counts):
+    """Callback de la bomba de un dispositivo: diario, decisión (y apertura) en el proceso de lectura.
+    counts = [eventos, autorizados, denegados] de este dispositivo (solo lo escribe su bomba)"""
+    append = pending.append if pending is not None else None
+
+    def handle(event):
+        counts[0] += 1
+        if journal is not None:
+            journal.append_event(event, device_id)
+        if cache is not None and event.card and event.event_type != DOOR_STATUS_EVENT:
+            if cache.is_allowed(event.card, event.door):
+                counts[1] += 1
+                if open_seconds:
+                    device.control_device(operation_id=1, door_id=event.door, index=1, state=open_seconds)
+            else:
+                counts[2] += 1
+        if append is not None:
+            append((device_id, event))
+
+    return handle
+
+
+def _run_shard(shard, ring_name, capacity, targets, commpro, pump_options, flush_interval, go, stop, verbose,
+               grants, journal_directory, open_seconds, forward):
+    """Proceso de lectura: conecta sus dispositivos, espera go y procesa sus eventos; con forward
+    también los pasa al anillo"""
+    from molinete_test import ZKTecoDevice
+
+    ring = EventRing(capacity, name=ring_name)
+    if commpro == "socket":
+        from pullsdk_socket import SocketCommpro
+        shared = SocketCommpro()
+    else:
+        shared = None  # ZKTecoDevice carga plcommpro.dll en este proceso
+    cache = None
+    if grants is not None:
+        cache = CardAuthCache()
+        cache.load_grants(grants)
+    journal = None
+    if journal_directory is not None:
+        journal = EventJournal(os.path.join(journal_directory, f"shard-{shard}"))
+    pending = [] if forward else None
+    devices = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for device_id, connect_params in targets:
+            device = ZKTecoDevice(commpro=shared)
+            if device.connect(**connect_params):
+                devices.append((device_id, device))
+    ring.set_devices(len(devices), len(targets) - len(devices))
+    if verbose:
+        print(f"Proceso {shard} (pid {os.getpid()}): {len(devices)}/{len(targets)} dispositivos conectados")
+
+    def publish():
+        ring.set_events(*(sum(column) for column in zip((0, 0, 0), *counts)))
+
+    go.wait()
+    counts = []
+    for device_id, device in devices:
+        counts.append([0, 0, 0])
+        device.start_event_pump(_event_handler(device, device_id, cache, journal, open_seconds, pending, counts[-1]),
+                                **pump_options)
+    try:
+        while not stop.is_set():
+            publish()
+            if not pending:
+                stop.wait(flush_interval)
+                continue
+            count = len(pending)  # Los hilos de las bombas solo agregan al final
+            batch = pending[:count]
+            del pending[:count]
+            ring.write(b"".join([pack_event(event, device_id) for device_id, event in batch]))
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _, device in devices:
+                device.disconnect()
+        if pending:
+            ring.write(b"".join([pack_event(event, device_id) for device_id, event in pending]))
+        publish()
+        if journal is not None:
+            journal.close()
+        ring.close()
+
+
+class ShardedIngest:
+    """Coordinador: reparte dispositivos entre procesos de lectura y junta sus contadores"""
+
+    def __init__(self, targets, processes=None, callback=None, cache=None, journal_directory=None,
+                 open_seconds=None, ring_records=65536, commpro="dll", pump_options=None, flush_interval=0.001,
+                 verbose=True):
+        """targets: {device_id (int): parámetros de ZKTecoDevice.connect()}.
+
+        cache (CardAuthCache): cada proceso decide con una copia; con open_seconds además abre la
+        puerta de los autorizados. journal_directory: cada proceso anexa a su EventJournal en
+        journal_directory/shard-N. callback(registros) recibe en el coordinador cada tanda como
+        lista de JournalRecord. commpro: "dll" (plcommpro.dll) o "socket" (SocketCommpro).
+        """
+        self.targets = dict(targets)
+        self.processes = max(1, min(processes or os.cpu_count() or 1, len(self.targets)))
+        self.callback = callback
+        self.cache = cache
+        self.journal_directory = journal_directory
+        self.open_seconds = open_seconds
+        self.ring_records = ring_records
+        self.commpro = commpro
+        self.pump_options = {"buffer_size": 64 * 1024, **(pump_options or {})}
+        self.flush_interval = flush_interval
+        self.verbose = verbose
+        self.counters = {"forwarded": 0, "batches": 0, "callback_errors": 0}  # Lo que pasa por los anillos
+        self._context = multiprocessing.get_context("spawn")  # Igual en Windows y Linux
+        self._rings = []
+        self._ring_counters = []  # Últimos contadores de cada anillo, leídos al detener
+        self._workers = []
+        self._go = self._context.Event()
+        self._stop = self._context.Event()
+        self._done = threading.Event()
+        self._thread = None
+
+    def shards(self):
+        """[[(device_id, parámetros), ...] por proceso]: grupos de tamaño parejo por ID de dispositivo"""
+        groups = [[] for _ in range(self.processes)]
+        for i, device_id in enumerate(sorted(self.targets)):
+            groups[i % self.processes].append((device_id, self.targets[device_id]))
+        return groups
+
+    def start(self, timeout=30.0):
+        """Arranca los procesos, espera a que conecten y libera la lectura en todos a la vez.
+        Devuelve la cantidad de dispositivos conectados"""
+        grants = self.cache.snapshot() if self.cache is not None else None
+        forward = self.callback is not None
+        for shard, group in enumerate(self.shards()):
+            ring = EventRing(self.ring_records if forward else 1)
+            worker = self._context.Process(
+                target=_run_shard, name=f"ingest-{shard}", daemon=True,
+                args=(shard, ring.name, ring.capacity, group, self.commpro, self.pump_options,
+                      self.flush_interval, self._go, self._stop, self.verbose, grants, self.journal_directory,
+                      self.open_seconds, forward))
+            worker.start()
+            self._rings.append(ring)
+            self._workers.append(worker)
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            reported = sum(sum(ring.counters()[1:3]) for ring in self._rings)
+            if reported >= len(self.targets) or not any(worker.is_alive() for worker in self._workers):
+                break
+            time.sleep(0.01)
+        connected = sum(ring.counters()[1] for ring in self._rings)
+        if self.verbose:
+            print(f"Ingesta en {self.processes} procesos: {connected}/{len(self.targets)} dispositivos conectados")
+        self._go.set()
+        if forward:
+            self._thread = threading.Thread(target=self._consume, name="ingest-coordinator", daemon=True)
+            self._thread.start()
+        return connected
+
+    def _deliver(self, records):
+        self.counters["forwarded"] += len(records)
+        self.counters["batches"] += 1
+        try:
+            self.callback([JournalRecord(micros / 1_000_000, device_id, door, card, event_code, direction)
+                           for micros, card, device_id, event_code, door, direction in records])
+        except Exception as e:
+            self.counters["callback_errors"] += 1
+            print(f"Error en el callback de ingesta: {e}")
+
+    def _drain(self):
+        if self.callback is None:
+            return 0
+        count = 0
+        for ring in self._rings:
+            records = ring.read()
+            if records:
+                self._deliver(records)
+                count += len(records)
+        return count
+
+    def events(self):
+        """Eventos procesados hasta ahora por todos los procesos"""
+        counters = [ring.counters() for ring in self._rings] or self._ring_counters
+        return sum(counter[3] for counter in counters)
+
+    def _consume(self):
+        backoff = AdaptiveBackoff(0.0005, 0.01)
+        while not self._done.is_set():
+            busy = self._drain() > 0
+            interval = backoff.next(busy)
+            if not busy:
+                self._done.wait(interval)
+
+    def stop(self, timeout=5.0):
+        """Detiene los procesos, consume lo que quedó en los anillos y libera la memoria compartida"""
+        self._stop.set()
+        self._go.set()  # Por si algún proceso todavía espera la largada
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._done.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._drain()
+        self._ring_counters = [ring.counters() for ring in self._rings]
+        for ring in self._rings:
+            ring.close()
+            ring.unlink()
+        self._rings = []
+        self._workers = []
+        return self.stats()
+
+    def stats(self):
+        """Eventos procesados en total y por proceso, autorizados y denegados, esperas por anillo
+        lleno y dispositivos conectados"""
+        result = dict(self.counters)
+        counters = [ring.counters() for ring in self._rings] or self._ring_counters
+        if counters:
+            waits, connected, failed, events, granted, denied = (sum(column) for column in zip(*counters))
+            result.update(events=events, granted=granted, denied=denied, ring_full_waits=waits,
+                          connected=connected, failed=failed)
+            result["per_shard"] = [counter[3] for counter in counters]
+        return result
+
+
+def _serve_emulator(devices, taps, first_card, pipe, stop):
+    """Proceso del emulador: dispositivos con taps acercamientos ya cargados en su log"""
+    from emulator import EmulatorServer
+
+    server = EmulatorServer(devices=devices, rtlog_capacity=max(taps, 1))
+    for i, device in enumerate(server.devices):
+        for n in range(taps):
+            device.tap(first_card + i * taps + n)
+    server.start_in_thread()
+    pipe.send(server.ports)
+    stop.wait()
+    server.stop()
+
+
+def benchmark(devices=16, taps=20_000, process_counts=(1, 2, 4), emulator_processes=2, timeout=120.0):
+    """Eventos/segundo al vaciar devices dispositivos del emulador (taps eventos cada uno) con
+    1, 2, 4... procesos de lectura, cada uno con su diario y su copia del caché de autorizaciones
+    (todas las tarjetas autorizadas, sin abrir puertas). El emulador corre en procesos aparte"""
+    context = multiprocessing.get_context("spawn")
+    total = devices * taps
+    cache = CardAuthCache()
+    for card in range(20_000_000, 20_000_000 + total):
+        cache.upsert(card)
+    print(f"Núcleos: {os.cpu_count()}  Dispositivos: {devices}  Eventos: {total} "
+          f"({taps} por dispositivo, emulador en {emulator_processes} procesos)")
+    print(f"{'procesos':>8} {'eventos/s':>12} {'escala':>8} {'autorizados':>12}")
+    results = {}
+    for processes in process_counts:
+        stop = context.Event()
+        emulators = []
+        targets = {}
+        per_emulator = -(-devices // emulator_processes)
+        for first in range(0, devices, per_emulator):
+            count = min(per_emulator, devices - first)
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve_emulator, daemon=True,
+                                      args=(count, taps, 20_000_000 + first * taps, child, stop))
+            process.start()
+            for port in parent.recv():
+                targets[len(targets) + 1] = {"ip_address": "127.0.0.1", "port": port}
+            emulators.append(process)
+
+        directory = tempfile.TemporaryDirectory(prefix="ingest-")
+        ingest = ShardedIngest(targets, processes=processes, cache=cache, journal_directory=directory.name,
+                               commpro="socket", verbose=False)
+        ingest.start()
+        start = time.perf_counter()
+        deadline = start + timeout
+        while ingest.events() < total and time.perf_counter() < deadline:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        received = ingest.events()
+        stats = ingest.stop()
+        directory.cleanup()
+        stop.set()
+        for process in emulators:
+            process.join(10)
+
+        rate = received / elapsed
+        results[processes] = rate
+        first_rate = results[process_counts[0]]
+        print(f"{processes:>8} {rate:>12,.0f} {rate / first_rate:>7.2f}x {stats['granted']:>12}"
+              + ("" if received == total else f"  ({received}/{total} recibidos)"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escalado de la ingesta multiproceso sobre el emulador")
+    parser.add_argument("--devices", type=int, default=16)
+    parser.add_argument("--eventos", type=int, default=20_000, help="eventos cargados por dispositivo")
+    parser.add_argument("--procesos", default="1,2,4", help="cantidades de procesos de lectura a comparar")
+    parser.add_argument("--emuladores", type=int, default=2, help="procesos del emulador")
+    args = parser.parse_args(argv)
+    benchmark(args.devices, args.eventos, tuple(int(n) for n in args.procesos.split(",")), args.emuladores)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+from async_device import AsyncZKTecoDevice
+from fake_commpro import FakeCommpro
+
+
+class CountingCommpro(FakeCommpro):
+    """FakeCommpro que registra cuántas llamadas con latencia se superponen"""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.active = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def _delay(self):
+        with self._count_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            super()._delay()
+        finally:
+            with self._count_lock:
+                self.active -= 1
+
+
+def test_slow_connects_do_not_block_the_loop():
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        devices = [AsyncZKTecoDevice(commpro=FakeCommpro(latency=0.2)) for _ in range(5)]
+        task = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await asyncio.gather(*(device.connect() for device in devices))
+        elapsed = time.perf_counter() - start
+        task.cancel()
+        await asyncio.gather(*(device.disconnect() for device in devices))
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(scenario())
+    assert results == [True] * 5
+    assert elapsed < 0.6  # En paralelo, no 5 x 0.2 s
+    assert ticks >= 10
+
+
+def test_calls_on_one_handle_are_serialized():
+    async def scenario():
+        device = AsyncZKTecoDevice(commpro=CountingCommpro(latency=0.005))
+        assert await device.connect()
+        results = await asyncio.gather(*(device.control_device(door_id=door, state=5) for door in (1, 2, 3, 4) * 3))
+        await device.disconnect()
+        return device.device.commpro, results
+
+    commpro, results = asyncio.run(scenario())
+    assert all(results)
+    assert len(commpro.commands) == 12
+    assert commpro.peak == 1
+
+
+def test_read_card_returns_the_tapped_card_and_lets_other_calls_through():
+    async def scenario():
+        fake = FakeCommpro(latency=0.001)
+        device = AsyncZKTecoDevice(commpro=fake)
+        assert await device.connect()
+        reading = asyncio.create_task(device.read_card(timeout=2))
+        await asyncio.sleep(0.05)
+        opened = await device.control_device(state=5)  # No espera a que termine la lectura
+        assert not reading.done()
+        fake.tap(10000077)
+        card = await reading
+        await device.disconnect()
+        return opened, card
+
+    opened, card = asyncio.run(scenario())
+    assert opened
+    assert card == "10000077"
+
+
+def test_read_card_times_out():
+    async def scenario():
+        device = AsyncZKTecoDevice(commpro=FakeCommpro())
+        assert await device.connect()
+        card = await device.read_card(timeout=0.05)
+        await device.disconnect()
+        return card
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_calls_without_connection_fail_cleanly():
+    async def scenario():
+        device = AsyncZKTecoDevice(commpro=FakeCommpro())
+        return await device.read_card(timeout=0.05), await device.control_device(state=5)
+
+    assert asyncio.run(scenario()) == (None, False)
@@ -0,0 +1,56 @@
+import pickle
+
+from auth_cache import CardAuthCache, CardGrant, normalize_card
+
+
+def test_normalize_card():
+    assert normalize_card(" 0012-345 ") == 12345
+    assert normalize_card("0") is None and normalize_card("abc") is None and normalize_card(None) is None
+
+
+def test_door_mask_and_validity():
+    cache = CardAuthCache()
+    cache.upsert("10000001", pin="1", doors=0b0101)
+    cache.upsert(10000002, pin="2", end=20000101)
+    assert cache.is_allowed("10000001", 1) and cache.is_allowed(10000001, 3)
+    assert not cache.is_allowed(10000001, 2)
+    assert not cache.is_allowed(10000001, 0) and not cache.is_allowed(10000001, -1)
+    assert not cache.is_allowed(10000002, 1)  # Vencida
+    assert not cache.is_allowed(99999999, 1)
+
+
+def test_load_rows_with_authorizations():
+    cache = CardAuthCache()
+    users = [{"CardNo": "10000001", "Pin": "1"}, {"CardNo": "0", "Pin": "2"}, {"CardNo": "10000003", "Pin": "3"}]
+    authorizations = [{"Pin": "1", "AuthorizeDoorId": "1"}, {"Pin": "1", "AuthorizeDoorId": "4"}]
+    assert cache.load_rows(users, authorizations) == 2
+    assert cache.is_allowed(10000001, 1) and cache.is_allowed(10000001, 3)
+    assert not cache.is_allowed(10000003, 1)  # Sin autorización
+
+
+def test_snapshot_loads_into_another_cache():
+    cache = CardAuthCache()
+    cache.upsert(10000001, pin="7", doors=0b10)
+    cache.upsert(10000002, pin="7")
+    snapshot = pickle.loads(pickle.dumps(cache.snapshot()))  # Así viaja a otro proceso
+    assert snapshot[10000001] == CardGrant("7", 0b10, 0, 0)
+
+    copy = CardAuthCache()
+    invalidated = []
+    copy.add_invalidation_hook(invalidated.append)
+    assert copy.load_grants(snapshot) == 2
+    assert invalidated == [None]
+    assert copy.is_allowed(10000001, 2) and not copy.is_allowed(10000001, 1)
+    assert copy.remove_pin("7") == 2  # El índice por pin se reconstruye
+    assert len(copy) == 0
+
+
+def test_snapshot_is_a_copy():
+    cache = CardAuthCache()
+    cache.upsert(10000001)
+    snapshot = cache.snapshot()
+    cache.remove(10000001)
+    assert 10000001 in snapshot
+    cache.load_grants(snapshot)
+    snapshot.clear()
+    assert cache.is_allowed(10000001, 1)
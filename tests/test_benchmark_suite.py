@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import benchmark_suite
+from benchmark_suite import (
+    EmulatorBackend, FakeBackend, bench_end_to_end, bench_rtlog_drain, compare, flatten, percentile, summarize,
+)
+
+
+def test_percentile_and_summarize():
+    values = [i / 1000 for i in range(1, 101)]  # 1 ms .. 100 ms
+    assert percentile([], 0.5) is None
+    assert percentile(values, 0.50) == 0.051
+    assert percentile(values, 0.99) == 0.1
+    summary = summarize(reversed(values))
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == pytest.approx(51)
+    assert summary["p99_ms"] == pytest.approx(100)
+    assert summary["max_ms"] == pytest.approx(100)
+    assert summary["mean_ms"] == pytest.approx(50.5)
+    assert summarize([]) == {"count": 0}
+
+
+def test_flatten_and_compare(capsys):
+    previous = {"results": {"connect": {"p50_ms": 2.0, "count": 20}, "ok": True}}
+    current = {"results": {"connect": {"p50_ms": 3.0, "count": 20}, "parse": {"1": {"ns_per_call": 500}}}}
+    assert flatten(current["results"]) == {"connect.p50_ms": 3.0, "connect.count": 20, "parse.1.ns_per_call": 500}
+    assert flatten(previous["results"]) == {"connect.p50_ms": 2.0, "connect.count": 20}  # Sin booleanos
+    compare(previous, current)
+    lines = capsys.readouterr().out.splitlines()
+    assert "+50.0%" in next(line for line in lines if line.startswith("connect.p50_ms"))
+    assert " - " in next(line for line in lines if line.startswith("parse.1.ns_per_call"))
+
+
+@pytest.mark.parametrize("backend_class", [FakeBackend, EmulatorBackend])
+def test_rtlog_drain_receives_every_event(backend_class):
+    result = bench_rtlog_drain(backend_class, events=500)
+    assert result["events"] == 500
+    assert result["events_per_second"] > 0
+
+
+def test_end_to_end_opens_for_every_tap():
+    result = bench_end_to_end(FakeBackend, devices=2, taps_per_second=50, duration=0.2)
+    assert result["taps"] == 10
+    assert result["count"] == 10
+    assert result["open_errors"] == 0
+    assert 0 < result["p50_ms"] <= result["p99_ms"] <= result["max_ms"]
+
+
+def test_main_writes_report_and_compares(tmp_path, capsys):
+    output = tmp_path / "resultados.json"
+    args = ["--devices", "1", "--duration", "0.2", "--tap-rate", "50", "--output", str(output)]
+    benchmark_suite.main(args)
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert report["meta"]["backend"] == "fake"
+    assert set(report["results"]) == {"connect", "rtlog_drain", "parse", "read_card", "end_to_end"}
+    assert report["results"]["end_to_end"]["1"]["taps"] == 10
+    capsys.readouterr()
+
+    benchmark_suite.main(args + ["--compare", str(output)])  # Mismo archivo de entrada y salida
+    assert "variación" in capsys.readouterr().out
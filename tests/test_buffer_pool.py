@@ -0,0 +1,62 @@
+import ctypes
+
+from buffer_pool import BUFFER_TOO_SMALL, BufferPool, buffer_text
+
+
+def needs(size, calls):
+    """Función del SDK que devuelve -3 mientras el buffer sea menor que size"""
+
+    def fn(buffer, buffer_size):
+        calls.append(buffer_size)
+        if buffer_size < size:
+            return BUFFER_TOO_SMALL
+        text = b"x" * (size - 1)
+        ctypes.memmove(buffer, text + b"\0", size)
+        return 1
+
+    return fn
+
+
+def test_buffer_is_reused_per_name():
+    pool = BufferPool()
+    rtlog = pool.get("rtlog", 4096)
+    assert pool.get("rtlog", 1024) is rtlog  # Uno más chico sirve
+    assert pool.get("params", 4096) is not rtlog
+    assert len(pool.get("rtlog", 8192)) == 8192
+
+
+def test_call_grows_on_buffer_too_small_and_keeps_the_larger_buffer():
+    pool = BufferPool()
+    calls = []
+    ret, buffer = pool.call("rtlog", 1024, needs(5000, calls))
+    assert ret == 1
+    assert calls == [1024, 2048, 4096, 8192]
+    assert pool.grown == 3
+    assert buffer_text(buffer) == "x" * 4999
+    assert pool.get("rtlog", 1024) is buffer
+
+    calls.clear()
+    assert pool.call("rtlog", 1024, needs(5000, calls))[0] == 1
+    assert calls == [8192]  # La siguiente llamada ya no repite el crecimiento
+    assert pool.grown == 3
+
+
+def test_call_stops_growing_at_max_size():
+    pool = BufferPool(max_size=4096)
+    calls = []
+    ret, buffer = pool.call("rtlog", 1024, needs(10_000, calls))
+    assert ret == BUFFER_TOO_SMALL
+    assert calls == [1024, 2048, 4096]
+    assert len(buffer) == 4096
+    assert pool.grow("rtlog") is None
+
+
+def test_buffer_text_small_and_large():
+    small = ctypes.create_string_buffer(b"Pin=1\r\n", 64)
+    assert buffer_text(small) == "Pin=1\r\n"
+    large = ctypes.create_string_buffer(64 * 1024)
+    ctypes.memmove(large, b"CardNo=123\0basura", 17)
+    assert buffer_text(large) == "CardNo=123"
+    full = ctypes.create_string_buffer(2048)
+    ctypes.memset(full, ord("a"), 2048)  # Sin NUL: hasta el final
+    assert buffer_text(full) == "a" * 2048
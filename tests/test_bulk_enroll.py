@@ -0,0 +1,63 @@
+from bulk_enroll import ERROR_DATA_OVER_LIMIT, _payload, enroll_cards, iter_chunks
+from fake_commpro import FakeCommpro
+from molinete_test import ZKTecoDevice
+
+
+def connected_device(**options):
+    fake = FakeCommpro(**options)
+    device = ZKTecoDevice(commpro=fake)
+    assert device.connect()
+    return fake, device
+
+
+def cards(count, first=1):
+    return [(str(pin), str(20_000_000 + pin)) for pin in range(first, first + count)]
+
+
+def test_chunks_stay_under_the_limit_and_keep_every_row():
+    chunks = list(iter_chunks(cards(2000), 4096))
+    assert len(chunks) > 1
+    assert all(len(_payload(chunk)) <= 4096 for chunk in chunks)
+    assert [row["Pin"] for chunk in chunks for row, _ in chunk] == [str(pin) for pin in range(1, 2001)]
+
+
+def test_10k_cards_in_seconds_with_a_size_limited_backend():
+    fake, device = connected_device(latency=0.01, max_payload=64 * 1024)
+    progress = []
+    result = enroll_cards(device, iter(cards(10_000)), max_bytes=256 * 1024, doors=3,
+                          progress=lambda sent, failed: progress.append((sent, failed)))
+    device.disconnect()
+    assert result.sent == 10_000 and result.failed == []
+    assert result.elapsed < 5
+    assert len(fake.tables["user"]) == 10_000
+    assert {row["AuthorizeDoorId"] for row in fake.tables["userauthorize"]} == {"3"}
+    assert progress[-1] == (10_000, 0)
+    assert [sent for sent, _ in progress] == sorted(sent for sent, _ in progress)
+
+
+def test_oversized_chunks_are_split_and_later_chunks_shrink():
+    fake, device = connected_device(max_payload=16 * 1024)
+    calls = []
+    set_device_data = device.set_device_data
+
+    def record(table, data, options=""):
+        ret = set_device_data(table, data, options)
+        calls.append((len(data), ret))
+        return ret
+
+    device.set_device_data = record
+    result = enroll_cards(device, cards(3000), max_bytes=128 * 1024)
+    assert result.sent == 3000
+    assert any(ret == ERROR_DATA_OVER_LIMIT for _, ret in calls)
+    assert all(size <= 16 * 1024 for size, ret in calls if ret == 0)
+    assert len(fake.tables["user"]) == 3000
+
+
+def test_rejected_rows_are_reported_one_by_one():
+    fake, device = connected_device()
+    bad = [("x", "1"), ("", "2")]
+    result = enroll_cards(device, cards(50) + bad + cards(50, first=51))
+    assert result.sent == 100
+    assert [row for row, _ in result.failed] == [{"Pin": "x", "CardNo": "1"}, {"Pin": "", "CardNo": "2"}]
+    assert all(code < 0 for _, code in result.failed)
+    assert len(fake.tables["user"]) == 100
@@ -0,0 +1,84 @@
+import json
+
+import device_driver
+from capability_profile import CapabilityProfile, ProfileStore, default_profile_path, ensure_profile
+from device_driver import FakeDriver
+
+
+def make_probe(calls, functions=None, errors=None):
+    def probe():
+        calls.append(1)
+        return dict(functions or {"GetStrCardNumber": True, "PollCard": False}), dict(errors or {"PollCard": -100})
+    return probe
+
+
+def test_profiles_persist_per_backend_and_serial(tmp_path):
+    path = tmp_path / "perfiles" / "device_profiles.json"  # El directorio se crea al guardar
+    store = ProfileStore(str(path))
+    calls = []
+    profile = ensure_profile(store, "SN1", "Ver 6.60", "com", make_probe(calls))
+    assert profile.works("GetStrCardNumber") and not profile.works("PollCard") and not profile.works("Otra")
+    ensure_profile(store, "SN1", "AC Ver 4.3.4", "pullsdk", make_probe(calls, {"GetDeviceDataCount": True}, {}))
+    assert len(calls) == 2
+
+    reloaded = ProfileStore(str(path))
+    assert reloaded.get("com", "SN1") == profile
+    assert reloaded.get("com", "SN1").errors == {"PollCard": -100}
+    assert reloaded.get("pullsdk", "SN1").works("GetDeviceDataCount")
+    assert reloaded.get("com", "SN2") is None
+    assert set(json.loads(path.read_text(encoding="utf-8"))) == {"com:SN1", "pullsdk:SN1"}
+
+    assert ensure_profile(reloaded, "SN1", "Ver 6.60", "com", make_probe(calls)) == profile
+    assert len(calls) == 2  # Sin volver a probar
+    assert not (tmp_path / "perfiles" / "device_profiles.json.tmp").exists()
+
+
+def test_firmware_change_probes_again(tmp_path, capsys):
+    store = ProfileStore(str(tmp_path / "p.json"))
+    calls = []
+    ensure_profile(store, "SN1", "Ver 6.60", "com", make_probe(calls))
+    assert store.get("com", "SN1", "Ver 6.70") is None
+    updated = ensure_profile(store, "SN1", "Ver 6.70", "com", make_probe(calls, {"PollCard": True}, {}))
+    assert len(calls) == 2
+    assert "cambió" in capsys.readouterr().out
+    assert ProfileStore(store.path).get("com", "SN1") == updated
+
+
+def test_unreadable_file_is_probed_again(tmp_path, capsys):
+    path = tmp_path / "p.json"
+    path.write_text("{no es json", encoding="utf-8")
+    store = ProfileStore(str(path))
+    assert store.get("com", "SN1") is None
+    assert "ilegibles" in capsys.readouterr().out
+    store.save(CapabilityProfile("SN1", "1", "com", {"ReadCard": True}, 0.0))
+    assert ProfileStore(str(path)).get("com", "SN1").works("ReadCard")
+
+
+def test_default_profile_path(monkeypatch, tmp_path):
+    monkeypatch.setenv("ZK_DEVICE_PROFILES", str(tmp_path / "x.json"))
+    assert default_profile_path() == str(tmp_path / "x.json")
+    monkeypatch.delenv("ZK_DEVICE_PROFILES")
+    monkeypatch.setattr("sys.platform", "linux")
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path))
+    assert default_profile_path() == str(tmp_path / "zkteco" / "device_profiles.json")
+
+
+def test_driver_loads_the_saved_profile_without_probing(tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path / "p.json"))
+    first = FakeDriver(serial_number="FAKE1")
+    assert first.connect()
+    profile = first.load_profile(store)
+    assert profile.works("GetDeviceDataCount")
+    first.disconnect()
+
+    def probe(device):
+        raise AssertionError("el perfil tiene que salir del archivo")
+
+    monkeypatch.setattr(device_driver, "probe_pullsdk", probe)
+    second = FakeDriver(serial_number="FAKE1")
+    assert second.connect()
+    try:
+        assert second.load_profile(ProfileStore(store.path)) == profile
+    finally:
+        second.disconnect()
+    assert second.capabilities.filtered_table_read == profile.works("FilteredTransactionRead")
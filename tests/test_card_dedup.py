@@ -0,0 +1,54 @@
+from card_dedup import CardDeduplicator
+from rtlog_parser import RTLogEvent
+
+
+def test_duplicates_within_the_window_are_suppressed_across_sources_and_devices():
+    dedup = CardDeduplicator(window=2.0)
+    assert dedup.accept("10000001", device_id=1, source="GetStrCardNumber", now=0.0)
+    assert not dedup.accept(10000001, device_id=1, source="HID", now=0.5)
+    assert not dedup.accept("0010000001", device_id=2, source="GetRTLog", now=1.9)  # Mismo número normalizado
+    assert dedup.accept("10000002", now=1.0)
+    assert dedup.stats["suppressed"] == 2
+    assert dict(dedup.suppressed_by_source) == {"HID": 1, "GetRTLog": 1}
+    assert not dedup.accept("", now=1.0) and not dedup.accept(None, now=1.0)
+
+
+def test_window_expiry_evicts_from_the_front():
+    dedup = CardDeduplicator(window=2.0)
+    for i in range(5):
+        dedup.accept(10000000 + i, now=i * 0.5)  # 0.0, 0.5, 1.0, 1.5, 2.0
+    assert len(dedup) == 4  # La primera venció justo al cumplirse la ventana
+    assert dedup.stats["expired"] == 1
+    assert dedup.accept(10000000, now=2.1)  # Vencida: se acepta de nuevo
+    assert not dedup.accept(10000004, now=3.9)
+    assert dedup.accept(10000004, now=4.0)
+    assert dedup.stats["expired"] == 5  # 0.5, 1.0, 1.5 y 2.0 vencidas en 4.0
+    assert len(dedup) == 2  # 10000000 (2.1) y 10000004 (4.0)
+
+
+def test_suppressed_read_does_not_extend_the_window():
+    dedup = CardDeduplicator(window=2.0)
+    assert dedup.accept(10000001, now=0.0)
+    assert not dedup.accept(10000001, now=1.5)
+    assert dedup.accept(10000001, now=2.0)
+
+
+def test_max_cards_bounds_memory():
+    dedup = CardDeduplicator(window=60.0, max_cards=3)
+    for i in range(5):
+        assert dedup.accept(10000000 + i, now=float(i))
+    assert len(dedup) == 3
+    assert dedup.stats["evicted"] == 2
+    assert dedup.accept(10000000, now=5.0)  # La menos reciente se descartó antes de vencer
+    assert not dedup.accept(10000004, now=5.0)
+
+
+def test_per_device_keys_and_events():
+    dedup = CardDeduplicator(window=2.0, per_device=True)
+    event = RTLogEvent("2026-10-17 08:00:00", "1", "10000001", 1, 0, 0, 1)
+    assert dedup.accept_event(event, device_id=1)
+    assert dedup.accept_event(event, device_id=2)  # Otro molinete: no es duplicado
+    assert not dedup.accept_event(event, device_id=1)
+    assert dedup.suppressed_by_source["GetRTLog"] == 1
+    dedup.clear()
+    assert len(dedup) == 0 and dedup.accept_event(event, device_id=1)
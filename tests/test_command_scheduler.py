@@ -0,0 +1,111 @@
+import queue
+
+import pytest
+
+import command_scheduler
+from command_scheduler import BACKGROUND, EMERGENCY, NORMAL, CommandQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(command_scheduler, "time", clock)
+    return clock
+
+
+def pop_name(commands):
+    command, wait = commands.pop()
+    return (command.args[0] if command else None), wait
+
+
+def test_priorities_and_arrival_order(clock):
+    commands = CommandQueue()
+    commands.push(print, ("info",), priority=BACKGROUND)
+    commands.push(print, ("abrir 1",))
+    commands.push(print, ("abrir 2",))
+    commands.push(print, ("cancelar alarma",), priority=EMERGENCY)
+    assert [pop_name(commands)[0] for _ in range(4)] == ["cancelar alarma", "abrir 1", "abrir 2", "info"]
+    assert commands.pop() == (None, 0.0)
+
+
+def test_repeated_opens_coalesce_until_the_key_is_released(clock):
+    commands = CommandQueue()
+    longest = lambda pending, new: (max(pending[0], new[0]),)  # noqa: E731
+    first = commands.push(print, (3,), key=("open", 1), merge=longest)
+    assert commands.push(print, (8,), key=("open", 1), merge=longest) is first
+    assert commands.push(print, (5,), key=("open", 1), merge=longest) is first
+    assert commands.push(print, (4,), key=("open", 2), merge=longest) is not first
+    assert commands.stats()["coalesced"] == 2
+
+    commands.release_key(("open", 1))  # Ya empezó a ejecutarse: la próxima es otra apertura
+    second = commands.push(print, (2,), key=("open", 1), merge=longest)
+    assert second is not first
+    assert pop_name(commands)[0] == 8  # Duración más larga de las fusionadas
+    # Sacar el comando liberado no borra la clave del nuevo pendiente
+    assert commands.push(print, (9,), key=("open", 1), merge=longest) is second
+    assert [pop_name(commands)[0] for _ in range(2)] == [4, 9]
+
+
+def test_rate_limit_lets_unlimited_commands_pass(clock):
+    commands = CommandQueue(rate=2.0, burst=1)
+    for door in (1, 2, 3):
+        commands.push(print, (f"abrir {door}",), rate_limited=True)
+    commands.push(print, ("leer eventos",))
+    commands.push(print, ("info",), priority=BACKGROUND)
+    emergency = commands.push(print, ("normal abierto",), priority=EMERGENCY)
+
+    assert pop_name(commands) == ("normal abierto", 0.0)  # La emergencia no espera ficha
+    assert not emergency.done()
+    assert pop_name(commands) == ("abrir 1", 0.0)
+    assert pop_name(commands) == ("leer eventos", 0.0)  # Sin límite de ritmo: pasa delante
+    assert pop_name(commands) == ("info", 0.0)  # Menor prioridad, tampoco espera
+    assert pop_name(commands) == (None, 0.5)
+    clock.now += 0.5
+    assert pop_name(commands) == ("abrir 2", 0.0)
+    assert pop_name(commands) == (None, 0.5)
+    clock.now += 0.5
+    assert pop_name(commands) == ("abrir 3", 0.0)
+    assert commands.stats()["rate_limited"] == 2
+
+
+def test_full_queue_and_expected_wait_reject_early(clock):
+    commands = CommandQueue(max_pending=2)
+    commands.push(print, ("a",))
+    commands.push(print, ("b",))
+    rejected = commands.push(print, ("c",))
+    with pytest.raises(queue.Full):
+        rejected.result(0)
+    assert not commands.push(print, ("emergencia",), priority=EMERGENCY).done()  # Nunca se rechaza
+    assert commands.stats()["rejected"] == 1
+
+    slow = CommandQueue(max_wait=1.5)
+    slow.done(1.0)  # Cada comando tarda 1 s
+    slow.push(print, ("a",))
+    assert not slow.push(print, ("b",)).done()  # Espera estimada 1 s
+    with pytest.raises(queue.Full, match="espera estimada"):
+        slow.push(print, ("c",)).result(0)  # 2 s
+
+
+def test_stats_report_depth_and_waits(clock):
+    commands = CommandQueue()
+    commands.push(print, ("a",))
+    commands.push(print, ("b",), priority=BACKGROUND)
+    assert commands.stats()["depth"] == {"emergency": 0, "normal": 1, "background": 1}
+    clock.now += 0.25
+    commands.pop()
+    commands.done(0.01)
+    commands.done(0.02)
+    stats = commands.stats()
+    assert stats["wait_avg_ms"]["normal"] == pytest.approx(250)
+    assert stats["wait_max_ms"]["normal"] == pytest.approx(250)
+    assert stats["service_ms"] == pytest.approx(12)  # 0.8 * 10 + 0.2 * 20
+    assert stats["executed"] == 2
+    assert stats["depth"]["normal"] == 0 and len(commands) == 1
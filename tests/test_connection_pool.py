@@ -0,0 +1,92 @@
+import time
+
+from connection_pool import ConnectionManager
+from fake_commpro import FakeCommpro
+from molinete_test import ZKTecoDevice
+
+
+def run(manager):
+    for future in manager.run_once():
+        future.result(5)
+
+
+def managed(check_interval=60.0, **options):
+    fake = FakeCommpro()
+    manager = ConnectionManager(check_interval=check_interval, backoff_initial=0.05, **options)
+    manager.add("molinete", ZKTecoDevice(commpro=fake))
+    return fake, manager
+
+
+def test_first_pass_connects_and_lease_hands_out_the_device():
+    fake, manager = managed()
+    try:
+        with manager.lease("molinete") as device:
+            assert device is None  # Todavía no conectó
+        run(manager)
+        assert manager.wait_ready("molinete")
+        with manager.lease("molinete") as device:
+            assert device.control_device(state=5)
+        assert manager.status() == {"molinete": (True, 0, 0)}
+    finally:
+        manager.stop()
+
+
+def test_report_failure_reconnects_on_the_next_pass():
+    fake, manager = managed()
+    try:
+        run(manager)
+        manager.report_failure("molinete")
+        assert not manager.wait_ready("molinete")
+        run(manager)
+        assert manager.status() == {"molinete": (True, 0, 1)}
+        assert len(fake.handles) == 1  # El handle anterior se cerró
+    finally:
+        manager.stop()
+
+
+def test_dead_handle_found_by_the_check_backs_off_until_the_device_returns():
+    fake, manager = managed(check_interval=0.0)
+    try:
+        run(manager)
+        fake.simulate_outage()
+        run(manager)  # ping falla y el primer intento de reconexión también
+        assert manager.status() == {"molinete": (False, 1, 0)}
+        run(manager)  # Dentro de la espera: no se intenta
+        assert manager.status()["molinete"][1] == 1
+        fake.restore()
+        time.sleep(0.06)
+        run(manager)
+        assert manager.status() == {"molinete": (True, 0, 1)}
+    finally:
+        manager.stop()
+
+
+def test_background_thread_repairs_an_outage():
+    fake, manager = managed(check_interval=0.05)
+    manager.start()
+    try:
+        assert manager.wait_ready("molinete", wait=2)
+        fake.simulate_outage()
+        deadline = time.monotonic() + 2
+        while manager.status()["molinete"][0] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        fake.restore()
+        assert manager.wait_ready("molinete", wait=2)
+        with manager.lease("molinete") as device:
+            assert device.control_device(state=5)
+        assert manager.status()["molinete"][2] >= 1
+    finally:
+        manager.stop()
+
+
+def test_a_slow_device_does_not_delay_the_others():
+    manager = ConnectionManager(check_interval=60.0)
+    manager.add("lento", ZKTecoDevice(commpro=FakeCommpro(latency=0.5)))
+    manager.add("rapido", ZKTecoDevice(commpro=FakeCommpro()))
+    try:
+        manager.run_once()
+        assert manager.wait_ready("rapido", wait=0.3)
+        assert not manager.wait_ready("lento")
+        assert manager.wait_ready("lento", wait=2)
+    finally:
+        manager.stop()
@@ -0,0 +1,54 @@
+import pytest
+
+from device_driver import DRIVERS, Capabilities, ComDriver, DeviceDriver, FakeDriver, open_driver
+
+
+class Turnstile:
+    """Lo mínimo de ConnectionTurnstile que usa ComDriver"""
+
+    def __init__(self, connected):
+        self.connected = connected
+        self.device_id = 1
+        self.profile = None
+        self.card_sources = ()
+        self.users = [{"CardNo": "10000001", "Pin": "1"}]
+
+    def iter_users(self):
+        return iter(self.users)
+
+
+def test_every_driver_implements_the_table_methods():
+    for driver_class in DRIVERS.values():
+        assert not driver_class.__abstractmethods__
+
+    class Partial(DeviceDriver):
+        connect = disconnect = ping = get_device_info = test_device_communication = None
+        read_card = read_events = control_device = start_event_pump = stop_event_pump = None
+
+    assert {"load_profile", "get_device_data", "get_device_data_count", "set_device_data"} <= Partial.__abstractmethods__
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_capabilities_have_no_undeclared_paths():
+    assert "event_push" not in Capabilities._fields
+    assert ComDriver.default_capabilities.event_polling
+
+
+def test_com_driver_tables_when_disconnected_and_connected():
+    driver = ComDriver(turnstile=Turnstile(connected=False))
+    assert driver.get_device_data("user") is None
+    assert driver.get_device_data_count("user") == -8
+    assert driver.set_device_data("user", "Pin=1") == -13
+
+    driver = ComDriver(turnstile=Turnstile(connected=True))
+    assert driver.get_device_data("user", "CardNo\tPin") == "CardNo,Pin\r\n10000001,1\r\n"
+    assert driver.get_device_data("transaction") is None
+
+
+def test_open_driver():
+    driver = open_driver("fake")
+    assert isinstance(driver, FakeDriver)
+    assert driver.supports("bulk_table_read") and driver.supports("door_control")
+    with pytest.raises(ValueError):
+        open_driver("serie")
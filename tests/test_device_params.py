@@ -0,0 +1,133 @@
+import threading
+import time
+
+import device_params
+from device_params import ParamStore, format_params, parse_params
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Device:
+    """fetch(nombres) con registro de las llamadas; gate permite retener una lectura en curso"""
+
+    def __init__(self):
+        self.values = {f"P{i}": str(i) for i in range(100)}
+        self.values.update({"DeviceID": "1", "~SerialNumber": "SN1"})
+        self.calls = []
+        self.code = 0
+        self.gate = None
+        self.entered = threading.Event()
+
+    def fetch(self, names):
+        self.calls.append(list(names))
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(2)
+        if self.code < 0:
+            return self.code, {}
+        return 0, {name: self.values[name] for name in names if name in self.values}
+
+
+def test_parse_and_format():
+    assert parse_params("DeviceID=1,IPAddress=10.0.0.1,basura") == {"DeviceID": "1", "IPAddress": "10.0.0.1"}
+    assert format_params({"A": "1", "B": "x=y"}) == "A=1,B=x=y"
+    assert parse_params(format_params({"A": "1", "B": "x=y"})) == {"A": "1", "B": "x=y"}
+
+
+def test_cache_hits_and_forced_reads(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(device_params, "time", clock)
+    device = Device()
+    store = ParamStore(device.fetch, ttl=30)
+    assert store.get("DeviceID,~SerialNumber") == {"DeviceID": "1", "~SerialNumber": "SN1"}
+    assert store.get(["DeviceID"]) == {"DeviceID": "1"}
+    assert len(device.calls) == 1 and store.stats["hits"] == 1
+    assert store.get(["DeviceID"], max_age=0) == {"DeviceID": "1"}
+    assert len(device.calls) == 2
+
+    clock.now += 31  # DeviceID vence; el número de serie (estático) no
+    device.values["DeviceID"] = "2"
+    assert store.get(["DeviceID", "~SerialNumber"]) == {"DeviceID": "2", "~SerialNumber": "SN1"}
+    assert device.calls[-1] == ["DeviceID"]
+
+
+def test_requests_are_split_in_batches_of_max_items():
+    device = Device()
+    store = ParamStore(device.fetch, max_items=30)
+    names = [f"P{i}" for i in range(65)]
+    assert len(store.get(names)) == 65
+    assert [len(call) for call in device.calls] == [30, 30, 5]
+    assert store.stats["calls"] == 3
+
+
+def test_expired_keys_ride_along_in_the_last_batch(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(device_params, "time", clock)
+    device = Device()
+    store = ParamStore(device.fetch, ttl=10, max_items=4)
+    store.get(["P0", "P1", "P2"])
+    clock.now += 11
+    store.get(["P3"])
+    assert device.calls[-1] == ["P3", "P0", "P1", "P2"]  # Una sola llamada renueva las cuatro
+    assert store.stats["piggybacked"] == 3
+    store.get(["P0", "P1", "P2", "P3"])
+    assert len(device.calls) == 2
+    assert store.stats["hits"] == 4
+
+
+def test_concurrent_requests_for_the_same_key_share_one_call():
+    device = Device()
+    store = ParamStore(device.fetch)
+    store.get(["DeviceID"])  # Ya en caché
+    device.calls.clear()
+    device.entered.clear()
+    device.gate = threading.Event()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.get(["P1"]))) for _ in range(4)]
+    threads[0].start()
+    assert device.entered.wait(2)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while store.stats["shared"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    # Mientras la lectura está retenida, lo vigente en caché se responde sin esperar
+    assert store.get(["DeviceID"]) == {"DeviceID": "1"}
+    device.gate.set()
+    for thread in threads:
+        thread.join(2)
+    assert results == [{"P1": "1"}] * 4
+    assert device.calls == [["P1"]]
+    assert store.stats["shared"] == 3
+
+
+def test_failed_read_returns_none_and_is_retried():
+    device = Device()
+    store = ParamStore(device.fetch)
+    device.code = -2
+    assert store.get(["DeviceID"]) is None
+    assert store.last_error == -2 and store.stats["errors"] == 1
+    device.code = 0
+    assert store.get(["DeviceID"]) == {"DeviceID": "1"}
+    assert len(device.calls) == 2
+
+
+def test_snapshot_diff_and_invalidate():
+    device = Device()
+    store = ParamStore(device.fetch)
+    store.get(["P1", "P2"])
+    assert store.snapshot() == {"P1": "1", "P2": "2"}
+    device.values["P1"] = "uno"
+    store.invalidate(["P1"])
+    assert store.diff() == {}  # Descartada: no cuenta como cambio hasta volver a leerla
+    store.get(["P1", "P3"])
+    assert store.diff() == {"P1": ("1", "uno"), "P3": (None, "3")}
+    store.invalidate()
+    store.get(["P2"])
+    assert len(device.calls) == 3
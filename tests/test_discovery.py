@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from discovery import DeviceRecord, DiscoveryEngine, UdpResponder, UdpSearch, broadcast_address, parse_search_reply
+
+
+def device(i):
+    return DeviceRecord(f"00:17:61:00:{i:02x}:01", f"10.{i}.0.201", f"SN{i:04d}", "TS2011",
+                        "255.255.255.0", f"10.{i}.0.1", "AC Ver 4.3.4")
+
+
+@pytest.fixture
+def responders():
+    started = []
+
+    def start(records, delay=0.0):
+        responder = UdpResponder(records, delay=delay)
+        started.append(responder)
+        return responder, "%s:%d" % responder.address
+
+    yield start
+    for responder in started:
+        responder.close()
+
+
+class CountingSearch:
+    def __init__(self, search):
+        self.search = search
+        self.calls = []
+
+    def __call__(self, target):
+        self.calls.append(target)
+        return self.search(target)
+
+
+def test_parse_search_reply():
+    text = ("MAC=00:17:61:00:00:01,IP=192.168.0.201,NetMask=255.255.255.0,GATEIPAddress=192.168.0.1,"
+            "SN=DGD9190019050335134,Device=C2-260,Ver=AC Ver 4.3.4\r\nbasura\r\n\r\nIP=192.168.0.202")
+    first, second = parse_search_reply(text)
+    assert first == DeviceRecord("00:17:61:00:00:01", "192.168.0.201", "DGD9190019050335134", "C2-260",
+                                 "255.255.255.0", "192.168.0.1", "AC Ver 4.3.4")
+    assert second == DeviceRecord("", "192.168.0.202", "", "")
+
+
+def test_broadcast_address():
+    assert broadcast_address("10.20.0.0/16") == "10.20.255.255"
+    assert broadcast_address("192.168.0.201") == "192.168.0.201"
+
+
+def test_udp_search_returns_structured_records(responders):
+    _, target = responders([device(1), device(2)])
+    assert sorted(UdpSearch(timeout=0.2)(target)) == [device(1), device(2)]
+
+
+def test_targets_are_scanned_in_parallel(responders):
+    targets = [responders([device(i)], delay=0.2)[1] for i in range(6)]
+    engine = DiscoveryEngine(UdpSearch(timeout=0.4))
+    start = time.perf_counter()
+    devices = engine.discover(targets)
+    elapsed = time.perf_counter() - start
+    assert sorted(devices.values()) == [device(i) for i in range(6)]
+    assert elapsed < 1.2  # Uno tras otro serían 6 x 0.4 s
+
+
+def test_repeat_lookups_come_from_the_cache(responders):
+    targets = [responders([device(i)])[1] for i in range(3)]
+    search = CountingSearch(UdpSearch(timeout=0.1))
+    engine = DiscoveryEngine(search, ttl=60)
+    first = engine.discover(targets)
+    start = time.perf_counter()
+    again = engine.discover(targets)
+    assert time.perf_counter() - start < 0.05
+    assert again == first
+    assert sorted(search.calls) == sorted(targets)
+
+    _, extra = responders([device(9)])
+    engine.discover(targets + [extra])
+    assert search.calls[3:] == [extra]  # Solo el destino nuevo
+    assert engine.last_added == [device(9)]
+
+
+def test_expired_targets_are_rescanned_and_deltas_reported(responders):
+    responder, target = responders([device(1), device(2)])
+    engine = DiscoveryEngine(UdpSearch(timeout=0.1), ttl=0)
+    engine.discover([target])
+    responder.records = [device(2), device(3)]
+    devices = engine.discover([target])
+    assert sorted(devices.values()) == [device(2), device(3)]
+    assert engine.last_added == [device(3)]
+    assert engine.last_removed == [device(1)]
+
+
+def test_failed_scan_keeps_the_cached_result(responders):
+    _, target = responders([device(1)])
+    engine = DiscoveryEngine(UdpSearch(timeout=0.1), ttl=0)
+    engine.discover([target])
+
+    def fail(target):
+        raise OSError("red caída")
+
+    engine.search = fail
+    assert list(engine.discover([target]).values()) == [device(1)]
+    assert engine.last_removed == []
@@ -0,0 +1,127 @@
+import gc
+import time
+
+import pytest
+
+from device_tables import iter_table_rows
+from emulator import EmulatorServer
+from molinete_test import ZKTecoDevice
+from pullsdk_socket import SocketCommpro
+
+
+@pytest.fixture
+def emulator():
+    servers = []
+
+    def start(devices=1, **options):
+        server = EmulatorServer(devices=devices, **options).start_in_thread()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def connect(server, index=0, commpro=None):
+    device = ZKTecoDevice(commpro=commpro or SocketCommpro())
+    assert device.connect("127.0.0.1", server.ports[index])
+    return device
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_params_control_and_rt_log(emulator):
+    server = emulator()
+    device = connect(server)
+    try:
+        assert "DeviceID=1" in device.get_device_info()
+        emulated = server.devices[0]
+        for card in (10000001, 10000002, 10000003):
+            server.call_in_loop(emulated.tap, card)
+        assert wait_for(lambda: len(emulated.rt_log) == 3)
+        assert [event.card for event in device.read_events()] == ["10000001", "10000002", "10000003"]
+        assert device.control_device(door_id=1, state=5)
+        assert emulated.stats["opens"] == 1
+    finally:
+        device.disconnect()
+
+
+def test_user_tables(emulator):
+    server = emulator(users=500)
+    device = connect(server)
+    try:
+        assert device.get_device_data_count("user") == 500
+        rows = list(iter_table_rows(device.get_device_data("user", "CardNo\tPin")))
+        assert len(rows) == 500
+        assert rows[0] == {"CardNo": "10000001", "Pin": "1"}
+        assert device.set_device_data("user", "CardNo=20000001\tPin=501") == 0
+        assert device.get_device_data_count("user") == 501
+    finally:
+        device.disconnect()
+
+
+def test_injected_errors_use_sdk_codes(emulator):
+    server = emulator(error_rate=1.0, error_codes=(-104,))
+    commpro = SocketCommpro()
+    device = connect(server, commpro=commpro)  # Connect nunca falla por inyección
+    try:
+        assert not device.control_device(state=5)
+        assert commpro.PullLastError() == -104
+        assert device.get_device_data_count("user") < 0
+        assert server.devices[0].stats["errors_injected"] >= 2
+    finally:
+        device.disconnect()
+
+
+def test_latency_is_applied_per_request(emulator):
+    server = emulator(latency=0.05)
+    device = connect(server)
+    try:
+        start = time.perf_counter()
+        assert device.control_device(state=5)
+        assert time.perf_counter() - start >= 0.05
+    finally:
+        device.disconnect()
+
+
+def test_tap_rate_generates_events_across_devices(emulator):
+    server = emulator(devices=4, tap_rate=1000)
+    assert wait_for(lambda: all(device.stats["taps"] >= 20 for device in server.devices))
+    device = connect(server, 3)
+    try:
+        events = device.read_events()
+    finally:
+        device.disconnect()
+    assert events and all(event.card for event in events)
+
+
+def test_hundreds_of_devices_on_one_host(emulator):
+    server = emulator(devices=200)
+    assert len(set(server.ports)) == 200
+    commpro = SocketCommpro()
+    devices = [connect(server, index, commpro) for index in range(0, 200, 20)]
+    try:
+        assert all(device.control_device(state=5) for device in devices)
+    finally:
+        for device in devices:
+            device.disconnect()
+    assert sum(device.stats["opens"] for device in server.devices) == 10
+
+
+def test_stop_closes_open_connections(caplog):
+    server = EmulatorServer(tap_rate=100).start_in_thread()
+    device = connect(server)
+    loop = server._loop
+    server.stop()
+    gc.collect()
+    assert not server._clients
+    assert loop.is_closed() and not server._thread.is_alive()
+    assert not [record for record in caplog.records if record.name == "asyncio"]
+    assert not device.control_device(state=5)  # El emulador cerró la conexión
+    device.disconnect()
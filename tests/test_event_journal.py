@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import zlib
+
+from event_journal import (
+    CRC, HEADER, HEADER_SIZE, RECORD_SIZE, UNKNOWN_DOOR, EventJournal, JournalRecord, pack_body, pack_record,
+    unpack_record,
+)
+from rtlog_parser import RTLogEvent
+
+NOW = 1_700_000_000.0
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def small_journal(directory, records=10, **options):
+    return EventJournal(str(directory), segment_size=HEADER_SIZE + records * RECORD_SIZE, **options)
+
+
+def test_pack_and_unpack_record():
+    data = pack_record(NOW, 3, 2, 10000001, 0, 1)
+    assert len(data) == RECORD_SIZE
+    assert unpack_record(data) == JournalRecord(NOW, 3, 2, 10000001, 0, 1)
+    assert unpack_record(bytes(RECORD_SIZE)) is None  # Registro vacío
+    corrupted = bytearray(data)
+    corrupted[8] ^= 0xFF
+    assert unpack_record(bytes(corrupted)) is None
+    record = unpack_record(pack_record(NOW, 1, -1, None, -1, 7))
+    assert (record.door, record.card, record.event_code) == (UNKNOWN_DOOR, 0, 0xFFFF)
+
+
+def test_append_and_read_back(tmp_path):
+    journal = small_journal(tmp_path, records=100)
+    for i in range(5):
+        journal.append(NOW + i, device_id=i, door=1, card=10000000 + i, event_code=0)
+    event = RTLogEvent("2024-01-02 03:04:05", "7", "0012345", 2, 27, 1, 1)
+    journal.append_event(event, device_id=9)
+    records = list(journal.read())  # Incluye lo anexado sin confirmar
+    assert [record.card for record in records] == [10000000, 10000001, 10000002, 10000003, 10000004, 12345]
+    assert records[-1][1:] == (9, 2, 12345, 27, 1)
+    assert [record.device_id for record in journal.read(since=NOW + 3)] == [3, 4, 9]
+    journal.close()
+
+    reopened = small_journal(tmp_path, records=100)
+    assert list(reopened.read()) == records
+    assert reopened.stats["recovered_discarded"] == 0
+    reopened.close()
+
+
+def test_segments_rotate_and_retention_keeps_the_newest(tmp_path):
+    journal = small_journal(tmp_path, records=10)
+    for i in range(25):
+        journal.append(NOW + i, 1, 1, 10000000 + i, 0)
+    journal.commit()
+    assert journal.stats["rotations"] == 2
+    assert len(segments(tmp_path)) == 3
+    assert [record.card - 10000000 for record in journal.read()] == list(range(25))
+    journal.close()
+    # Los segmentos completos quedan recortados a sus registros
+    full = os.path.join(tmp_path, segments(tmp_path)[0])
+    assert os.path.getsize(full) == HEADER_SIZE + 10 * RECORD_SIZE
+
+    limited = small_journal(tmp_path, records=10, max_segments=1)
+    for i in range(25, 40):
+        limited.append(NOW + i, 1, 1, 10000000 + i, 0)
+    limited.commit()
+    # Se siguió anexando en el segmento abierto (20..29); queda el actual más uno completo
+    assert len(segments(tmp_path)) == 2
+    assert [record.card - 10000000 for record in limited.read()] == list(range(20, 40))
+    limited.close()
+
+
+def test_sync_appends_share_one_commit(tmp_path):
+    journal = small_journal(tmp_path, records=100, commit_interval=60)
+    returned = []
+
+    def writer(i):
+        returned.append(journal.append(NOW, i, 1, 10000000 + i, 0, sync=True))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(5)]
+    with journal._commit_lock:  # Retiene el fsync hasta que los cinco estén esperando
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 2
+        while journal.stats["appended"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert journal.stats["appended"] == 5
+        assert not returned
+    for thread in threads:
+        thread.join(2)
+    assert sorted(returned) == [1, 2, 3, 4, 5]
+    assert journal.stats["commits"] == 1
+    path = os.path.join(tmp_path, segments(tmp_path)[0])
+    with open(path, "rb") as f:
+        assert HEADER.unpack_from(f.read(HEADER_SIZE), 0)[4] == 5  # Confirmados en la cabecera
+    journal.close()
+
+
+def write_at(path, index, data):
+    with open(path, "r+b") as f:
+        f.seek(HEADER_SIZE + index * RECORD_SIZE)
+        f.write(data)
+
+
+def test_recovery_truncates_torn_and_corrupted_records(tmp_path):
+    journal = small_journal(tmp_path, records=100)
+    for i in range(3):
+        journal.append(NOW + i, 1, 1, 10000000 + i, 0)
+    journal.close()
+    path = os.path.join(tmp_path, segments(tmp_path)[0])
+
+    # Escrito sin confirmar pero completo: se conserva
+    write_at(path, 3, pack_record(NOW + 3, 1, 1, 10000003, 0, 0))
+    # CRC inválido: desde aquí se trunca, incluido el registro válido que le sigue
+    body = pack_body(NOW + 4, 1, 1, 10000004, 0, 0)
+    write_at(path, 4, body + CRC.pack(zlib.crc32(body) ^ 1))
+    write_at(path, 5, pack_record(NOW + 5, 1, 1, 10000005, 0, 0))
+
+    reopened = small_journal(tmp_path, records=100)
+    assert reopened.stats["recovered_discarded"] == 2
+    assert [record.card - 10000000 for record in reopened.read()] == [0, 1, 2, 3]
+    # Los siguientes registros se anexan donde terminó lo válido
+    reopened.append(NOW + 6, 1, 1, 10000006, 0)
+    reopened.close()
+
+    # Registro a medias (escritura cortada)
+    write_at(path, 5, pack_record(NOW + 7, 1, 1, 10000007, 0, 0)[:20])
+    again = small_journal(tmp_path, records=100)
+    assert again.stats["recovered_discarded"] == 1
+    assert [record.card - 10000000 for record in again.read()] == [0, 1, 2, 3, 6]
+    again.close()
+    with open(path, "rb") as f:
+        f.seek(HEADER_SIZE + 5 * RECORD_SIZE)
+        assert f.read(RECORD_SIZE) == bytes(RECORD_SIZE)  # Puesto en ceros
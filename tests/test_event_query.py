@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from event_journal import EventJournal  # noqa: E402
+from event_query import EventStore, synthetic_store  # noqa: E402
+
+BASE = datetime(2026, 10, 17, 8, 0).timestamp()
+
+
+def store_from(events):
+    """events: (segundos desde BASE, dispositivo, puerta, tarjeta, evento, sentido)"""
+    columns = list(zip(*events))
+    return EventStore(
+        np.array([int((BASE + offset) * 1_000_000) for offset in columns[0]], np.int64),
+        np.array(columns[1], np.uint32), np.array(columns[2], np.uint8), np.array(columns[3], np.int64),
+        np.array(columns[4], np.uint16), np.array(columns[5], np.uint8),
+    )
+
+
+EVENTS = [
+    (0, 1, 1, 111, 0, 0),  # 08:00 entra 111 por la puerta 1
+    (60, 1, 2, 222, 0, 0),  # 08:01 entra 222 por la puerta 2
+    (3700, 2, 1, 111, 0, 1),  # 09:01 sale 111
+    (3800, 2, 1, 333, 27, 0),  # 09:03 333 denegada (no cuenta como paso)
+    (7300, 1, 2, 111, 0, 0),  # 10:01 vuelve a entrar 111
+    (30, 1, 1, 333, 0, 0),  # 08:00 entra 333 (fuera de orden: se ordena al cargar)
+]
+
+
+def test_card_events_in_time_order_and_range():
+    store = store_from(EVENTS)
+    events = store.card_events(111)
+    assert [(moment.hour, device_id, door, direction) for moment, device_id, door, _, direction in events] == [
+        (8, 1, 1, 0), (9, 2, 1, 1), (10, 1, 2, 0)]
+    assert len(store.card_events(111, since=BASE + 1, until=BASE + 7300)) == 1
+    assert [event[3] for event in store.card_events(333)] == [0, 27]
+    assert store.card_events(999) == []
+
+
+def test_hourly_counts_by_door():
+    result = store_from(EVENTS).hourly_counts()
+    assert result.hours.tolist() == [BASE, BASE + 3600, BASE + 7200]
+    assert result.doors.tolist() == [1, 2]
+    assert result.counts.tolist() == [[2, 1, 0], [1, 0, 1]]
+
+    everything = store_from(EVENTS).hourly_counts(event_codes=None)
+    assert everything.counts.tolist() == [[2, 2, 0], [1, 0, 1]]
+    assert store_from(EVENTS).hourly_counts(since=BASE + 3600, until=BASE + 7200).counts.tolist() == [[1]]
+    empty = store_from(EVENTS).hourly_counts(since=BASE + 10 * 3600)
+    assert empty.hours.size == 0 and empty.counts.shape == (0, 0)
+
+
+def test_hourly_counts_match_a_per_event_count():
+    store = synthetic_store(events=20_000, cards=500, devices=4, days=2, seed=1)
+    result = store.hourly_counts()
+    expected = {}
+    for micros, door, code in zip(store.micros.tolist(), store.door.tolist(), store.event_code.tolist()):
+        if code == 0:
+            key = (door, micros // 3_600_000_000 * 3600)
+            expected[key] = expected.get(key, 0) + 1
+    got = {(int(door), int(hour)): int(result.counts[i, j])
+           for i, door in enumerate(result.doors) for j, hour in enumerate(result.hours) if result.counts[i, j]}
+    assert got == expected
+
+
+def test_inside_at():
+    store = store_from(EVENTS)
+    at = datetime.fromtimestamp(BASE + 3750)  # 09:02:30
+    assert store.inside_at(at).tolist() == [222, 333]  # 111 ya salió; el rechazo de 333 no cuenta
+    assert store.inside_at(datetime.fromtimestamp(BASE + 8000)).tolist() == [111, 222, 333]
+    assert store.inside_at(datetime.fromtimestamp(BASE + 8000), lookback=1000).tolist() == [111]
+
+
+def test_from_journal(tmp_path):
+    journal = EventJournal(str(tmp_path))
+    for offset, device_id, door, card, event_code, direction in EVENTS:
+        journal.append(BASE + offset, device_id, door, card, event_code, direction)
+    journal.close()
+    store = EventStore.from_journal(str(tmp_path))
+    assert len(store) == len(EVENTS)
+    assert store.hourly_counts().counts.tolist() == store_from(EVENTS).hourly_counts().counts.tolist()
@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from fake_commpro import FakeCommpro
+from fleet import TurnstileFleet
+from molinete_test import ZKTecoDevice
+
+
+def make_fleet(devices, latency=0.0, **options):
+    fleet = TurnstileFleet(**options)
+    fakes = {}
+    for i in range(devices):
+        fakes[i] = FakeCommpro(latency=latency)
+        fleet.add_device(i, ZKTecoDevice(commpro=fakes[i]))
+    assert all(fleet.connect_all(timeout=5).values())
+    return fleet, fakes
+
+
+def block_lane(fleet, device_id):
+    """Ocupa la línea del dispositivo hasta que se libere el Event devuelto"""
+    gate = threading.Event()
+    started = threading.Event()
+
+    def wait(device):
+        started.set()
+        gate.wait(5)
+
+    fleet.submit(device_id, wait)
+    assert started.wait(2)
+    return gate
+
+
+def test_commands_reach_each_device():
+    fleet, fakes = make_fleet(3)
+    try:
+        assert fleet.control_device(1, door_id=2, state=5).result(2)
+        assert "DeviceID=1" in fleet.get_device_info(2).result(2)
+        fakes[0].tap(10000001)
+        events = fleet.read_all_events(timeout=2)
+    finally:
+        fleet.shutdown()
+    assert [command[:4] for command in fakes[1].commands] == [(1, 2, 1, 5)]
+    assert fakes[0].commands == fakes[2].commands == []
+    assert [event.card for event in events[0]] == ["10000001"]
+    assert events[1] == events[2] == []
+
+
+def test_calls_on_one_device_are_serialized():
+    fleet, _ = make_fleet(2)
+    active = {0: 0, 1: 0}
+    peak = {0: 0, 1: 0}
+    lock = threading.Lock()
+
+    def call(device, device_id):
+        with lock:
+            active[device_id] += 1
+            peak[device_id] = max(peak[device_id], active[device_id])
+        time.sleep(0.002)
+        with lock:
+            active[device_id] -= 1
+
+    try:
+        futures = [fleet.submit(device_id, call, device_id) for _ in range(20) for device_id in (0, 1)]
+        for future in futures:
+            future.result(5)
+    finally:
+        fleet.shutdown()
+    assert peak == {0: 1, 1: 1}
+
+
+def test_slow_device_does_not_block_the_others():
+    fleet, fakes = make_fleet(3)
+    try:
+        gate = block_lane(fleet, 0)
+        slow = fleet.control_device(0, state=5)
+        assert fleet.control_device(1, state=5).result(2)
+        assert fleet.control_device(2, state=5).result(2)
+        assert not slow.done()
+        gate.set()
+        assert slow.result(2)
+    finally:
+        fleet.shutdown()
+
+
+def test_fleet_outpaces_sequential_calls_on_50_devices():
+    devices, commands, latency = 50, 4, 0.005
+    fleet, _ = make_fleet(devices, latency=latency, max_workers=64)
+    try:
+        start = time.perf_counter()
+        futures = [fleet.control_device(device_id, door_id=door, state=5)
+                   for door in range(1, commands + 1) for device_id in fleet.device_ids()]
+        assert all(future.result(10) for future in futures)
+        elapsed = time.perf_counter() - start
+    finally:
+        fleet.shutdown()
+    sequential = devices * commands * latency  # Mínimo de hacer los mismos comandos uno por uno
+    assert elapsed < sequential / 4
+
+
+def test_full_queue_rejects_immediately():
+    fleet, _ = make_fleet(1, max_pending=2)
+    try:
+        gate = block_lane(fleet, 0)
+        accepted = [fleet.submit(0, lambda device: True) for _ in range(2)]
+        rejected = fleet.submit(0, lambda device: True)
+        with pytest.raises(queue.Full):
+            rejected.result(0)
+        gate.set()
+        assert all(future.result(2) for future in accepted)
+    finally:
+        fleet.shutdown()
+
+
+def test_timed_opens_coalesce_but_close_and_normal_open_do_not():
+    fleet, fakes = make_fleet(1)
+    try:
+        gate = block_lane(fleet, 0)
+        first = fleet.control_device(0, state=5)
+        merged = fleet.control_device(0, state=8)
+        close = fleet.control_device(0, state=0)
+        after_close = fleet.control_device(0, state=3)
+        normal_open = fleet.control_device(0, state=255)
+        gate.set()
+        for future in (first, merged, close, after_close, normal_open):
+            assert future.result(2)
+    finally:
+        fleet.shutdown()
+    assert first is merged
+    assert after_close is not first
+    assert [command[3] for command in fakes[0].commands] == [8, 0, 3, 255]
@@ -0,0 +1,16 @@
+from import_budget import GATEWAY_MODULES, check, import_time_ms
+
+
+def test_gateway_modules_import_within_budget(capsys):
+    ok = check(GATEWAY_MODULES, runs=3)
+    report = capsys.readouterr().out
+    assert ok, f"Módulos fuera del presupuesto de importación:\n{report}"
+
+
+def test_check_reports_failures(capsys):
+    assert import_time_ms("modulo_que_no_existe", runs=1) is None
+    assert not check(("modulo_que_no_existe",), runs=1)
+    assert not check(("auth_cache",), budget_ms=0.001, runs=1)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("✗ modulo_que_no_existe") and "falló" in lines[0]
+    assert lines[1].startswith("✗ auth_cache") and "presupuesto" in lines[1]
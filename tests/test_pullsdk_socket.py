@@ -0,0 +1,94 @@
+import ctypes
+import time
+
+import pytest
+
+import emulator as emulator_module
+from device_driver import SocketDriver
+from emulator import EmulatorServer
+from molinete_test import ZKTecoDevice
+from pullsdk_socket import SocketCommpro, pack_rtlog_record, rtlog_to_text
+
+
+@pytest.fixture
+def emulator():
+    servers = []
+
+    def start(devices=1, **options):
+        server = EmulatorServer(devices=devices, **options).start_in_thread()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def tap_burst(server, cards):
+    emulated = server.devices[0]
+    for card in cards:
+        server.call_in_loop(emulated.tap, card)
+    deadline = time.monotonic() + 2
+    while len(emulated.rt_log) < len(cards) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(emulated.rt_log) == len(cards)
+
+
+def test_rtlog_burst_larger_than_buffer_is_not_lost(emulator):
+    server = emulator()
+    cards = [str(10_000_000 + i) for i in range(200)]
+    tap_burst(server, cards)
+    device = ZKTecoDevice(commpro=SocketCommpro())
+    assert device.connect("127.0.0.1", server.ports[0])
+    try:
+        events = device.read_events()  # 200 registros no entran en el buffer de 4096 bytes
+    finally:
+        device.disconnect()
+    assert [event.card for event in events] == cards
+    assert not server.devices[0].rt_log
+
+
+def test_rtlog_keeps_leftover_records_in_the_session(emulator):
+    server = emulator()
+    tap_burst(server, [10000001, 10000002, 10000003])
+    commpro = SocketCommpro()
+    handle = commpro.Connect(server.connect_string(0).encode())
+    assert handle
+    try:
+        tiny = ctypes.create_string_buffer(8)
+        assert commpro.GetRTLog(handle, tiny, len(tiny)) == -3  # No entra ni un registro: se conserva
+        record = len(rtlog_to_text(pack_rtlog_record(10000001, 0, 1, 0, 0, 1)))
+        buffer = ctypes.create_string_buffer(record * 2)  # Entra un solo registro (más el NUL)
+        lines = []
+        for _ in range(3):
+            assert commpro.GetRTLog(handle, buffer, len(buffer)) == 1
+            lines.append(buffer.value.decode())
+        assert commpro.GetRTLog(handle, buffer, len(buffer)) == 0
+        assert [line.split(",")[2] for line in lines] == ["10000001", "10000002", "10000003"]
+        assert all(line.endswith("\r\n") for line in lines)
+    finally:
+        commpro.Disconnect(handle)
+
+
+def test_table_calls_are_unavailable_on_other_devices(emulator, monkeypatch):
+    monkeypatch.setattr(emulator_module, "EMULATOR_TAG", b"")  # Conecta como un controlador real
+    server = emulator(users=10)
+    commpro = SocketCommpro()
+    handle = commpro.Connect(server.connect_string(0).encode())
+    assert handle
+    try:
+        buffer = ctypes.create_string_buffer(4096)
+        assert commpro.GetDeviceDataCount(handle, b"user", b"", b"") == -13
+        assert commpro.GetDeviceData(handle, buffer, len(buffer), b"user", b"*", b"", b"") == -13
+        assert commpro.SetDeviceData(handle, b"user", b"CardNo=1\tPin=1", b"") == -13
+        assert commpro.PullLastError() == -13
+        assert server.devices[0].stats["requests"] == 0  # Nada se envió al equipo
+    finally:
+        commpro.Disconnect(handle)
+
+
+def test_socket_driver_declares_no_table_paths():
+    assert not SocketDriver.capabilities.bulk_table_read
+    assert not SocketDriver.capabilities.bulk_table_write
+    assert not SocketDriver.capabilities.filtered_table_read
+    assert SocketDriver.capabilities.event_polling
@@ -0,0 +1,55 @@
+from rtlog_parser import (
+    DOOR_STATUS_EVENT, RTLogEvent, _clean_cards, _legacy_parse_card_event, _parse_records, _uniform_fields,
+    parse_cards, parse_rt_log, synthetic_buffer,
+)
+
+
+def test_uniform_fields_only_for_seven_field_records():
+    assert _uniform_fields("a,b,c,d,e,f,g\r\nh,i,j,k,l,m,n") == list("abcdefghijklmn")
+    assert _uniform_fields("a,b,c,d,e,f,g\r\nh,i,j,k,l,m,n,o") is None  # Ancho mixto
+    assert _uniform_fields("a,b,c,d,e,f,g\r\n\r\nh,i,j,k,l,m,n") is None  # Línea vacía
+    assert _uniform_fields("CardNo=1,Pin=2,a,b,c,d,e") is None
+
+
+def test_clean_cards_matches_the_per_record_cleanup():
+    assert list(_clean_cards(["123", "0", "", "456"])) == ["123", None, None, "456"]
+    assert list(_clean_cards(["12-34", " 56 ", "abc", "0"])) == ["1234", "56", None, None]
+
+
+def test_fast_path_matches_the_general_path():
+    buffer = synthetic_buffer(50) + "2025-03-05 09:00:00,0,0,1,255,2,200\r\n"
+    assert parse_rt_log(buffer) == _parse_records(buffer.strip())
+    assert len(parse_rt_log(buffer)) == 51
+
+
+def test_mixed_width_batch_keeps_the_valid_records():
+    data = ("2025-03-05 08:00:00,1,10000001,1,0,0,1\r\n"
+            "2025-03-05 08:00:01,2,10000002,1,0,0,1,extra\r\n"
+            "\r\n"
+            "2025-03-05 08:00:02,3,10000003,2,0,1,1\r\n")
+    assert [event.card for event in parse_rt_log(data)] == ["10000001", "10000003"]
+    assert parse_cards(data) == ["10000001", "10000003"]
+
+
+def test_malformed_numeric_fields_fall_back_without_losing_good_records():
+    data = "2025-03-05 08:00:00,1,10000001,x,0,0,1\r\n2025-03-05 08:00:01,2,10000002,1,0,0,1"
+    assert parse_rt_log(data) == [RTLogEvent("2025-03-05 08:00:01", "2", "10000002", 1, 0, 0, 1)]
+
+
+def test_door_status_events_have_no_card_for_parse_cards():
+    data = "2025-03-05 08:00:00,0,0,1,255,2,200\r\n2025-03-05 08:00:01,1,10000001,1,0,0,1"
+    events = parse_rt_log(data)
+    assert events[0].card is None and events[0].event_type == DOOR_STATUS_EVENT
+    assert parse_cards(data) == ["10000001"]
+
+
+def test_key_value_records_and_raw_buffers():
+    assert parse_rt_log(b"CardNo=10000009\tPin=9\tDoorID=2\tEventType=0\x00basura") == [
+        RTLogEvent("", "9", "10000009", 2, 0, 0, 0)]
+    assert parse_rt_log("") == parse_rt_log(b"\x00") == parse_cards("  \r\n") == []
+
+
+def test_legacy_reference_is_the_original_parser():
+    assert _legacy_parse_card_event("CardNo=123\tPin=1") == "123"
+    assert _legacy_parse_card_event("Card=12-34,Pin=1") == "1234"
+    assert _legacy_parse_card_event("2025-03-05 08:00:00,1,10000001,1,0,0,1") is None  # No conocía este formato
@@ -0,0 +1,134 @@
+import threading
+
+from fake_commpro import FakeCommpro
+from molinete_test import ZKTecoDevice
+from rtlog_pump import AdaptiveBackoff, RTLogPump, measure_tap_latency
+
+
+def connected_fake(**options):
+    fake = FakeCommpro(**options)
+    return fake, fake.Connect(b"protocol=TCP,ipaddress=127.0.0.1,port=4370,timeout=4000,passwd=")
+
+
+def test_backoff_grows_while_idle_and_resets_with_activity():
+    backoff = AdaptiveBackoff(0.001, 0.008)
+    assert [backoff.next(False) for _ in range(5)] == [0.002, 0.004, 0.008, 0.008, 0.008]
+    assert backoff.next(True) == 0.001
+
+
+def test_poll_once_drains_the_whole_log():
+    fake, handle = connected_fake()
+    received = []
+    pump = RTLogPump(fake, handle, callback=received.append, buffer_size=256)
+    for card in range(10000000, 10000050):
+        fake.tap(card, door=2)
+    assert pump.poll_once() == 50
+    assert [event.card for event in received] == [str(card) for card in range(10000000, 10000050)]
+    assert {event.door for event in received} == {2}
+    assert fake.pending_events() == 0
+    assert pump.poll_once() == 0
+
+
+def test_queue_is_bounded_and_counts_dropped_events():
+    fake, handle = connected_fake()
+    pump = RTLogPump(fake, handle, queue_size=3)
+    for card in range(10000000, 10000005):
+        fake.tap(card)
+    assert pump.poll_once() == 5
+    assert pump.events.qsize() == 3
+    assert pump.stats["dropped"] == 2
+    assert pump.events.get_nowait().card == "10000000"
+
+
+def test_read_errors_are_counted():
+    fake, handle = connected_fake()
+    pump = RTLogPump(fake, handle, callback=lambda event: None)
+    fake.simulate_outage()
+    assert pump.poll_once() == 0
+    assert pump.stats["errors"] == 1
+
+
+def test_callback_errors_do_not_stop_the_pump():
+    fake, handle = connected_fake()
+
+    def fail(event):
+        raise RuntimeError("callback")
+
+    pump = RTLogPump(fake, handle, callback=fail)
+    fake.tap(10000000)
+    fake.tap(10000001)
+    assert pump.poll_once() == 2
+    assert pump.stats["errors"] == 2
+
+
+def test_device_pump_delivers_taps_in_background():
+    fake = FakeCommpro()
+    device = ZKTecoDevice(commpro=fake)
+    assert device.connect()
+    received = []
+    done = threading.Event()
+
+    def on_event(event):
+        received.append(event.card)
+        if len(received) == 3:
+            done.set()
+
+    pump = device.start_event_pump(callback=on_event, max_interval=0.01)
+    try:
+        for card in ("10000001", "10000002", "10000003"):
+            fake.tap(card)
+        assert done.wait(2)
+    finally:
+        device.disconnect()
+    assert received == ["10000001", "10000002", "10000003"]
+    assert pump.stats["events"] == 3
+    assert 0 < pump.mean_latency() <= pump.stats["latency_max"]
+
+
+def test_tap_to_callback_latency_is_measured():
+    latencies = measure_tap_latency(taps=20, interval=0.002)
+    assert len(latencies) == 20
+    assert all(0 < latency < 1.0 for latency in latencies)
+
+
+class OverlapCommpro(FakeCommpro):
+    """FakeCommpro que registra si dos llamadas con latencia se superponen en el handle"""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.active = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def _delay(self):
+        with self._count_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            super()._delay()
+        finally:
+            with self._count_lock:
+                self.active -= 1
+
+
+def test_pump_and_other_calls_never_overlap_on_the_handle():
+    fake = OverlapCommpro(latency=0.001)
+    device = ZKTecoDevice(commpro=fake)
+    assert device.connect()
+    received = []
+    device.start_event_pump(callback=received.append, min_interval=0, max_interval=0.001)
+    workers = [threading.Thread(target=lambda: [device.control_device(state=5) for _ in range(20)]),
+               threading.Thread(target=lambda: [device.ping() for _ in range(20)]),
+               threading.Thread(target=lambda: [device.test_device_communication() for _ in range(10)])]
+    try:
+        for worker in workers:
+            worker.start()
+        for card in range(10000000, 10000020):
+            fake.tap(card)
+        for worker in workers:
+            worker.join(5)
+    finally:
+        device.disconnect()
+    assert fake.peak == 1
+    assert len(fake.commands) == 20
+    assert device.buffers.get("ping", 64) is not device.buffers.get("params", 64)
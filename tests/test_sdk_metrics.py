@@ -0,0 +1,159 @@
+import urllib.request
+
+import pytest
+
+import sdk_metrics
+from sdk_metrics import SdkMetrics
+
+
+class Clock:
+    """perf_counter_ns que avanza lo indicado en durations por cada llamada medida"""
+
+    def __init__(self):
+        self.now = 0
+        self.durations = []
+        self._starting = True
+
+    def perf_counter_ns(self):
+        if not self._starting:
+            self.now += self.durations.pop(0)
+        self._starting = not self._starting
+        return self.now
+
+
+class Commpro:
+    def __init__(self):
+        self.results = []
+        self.last_error = 0
+        self.serial = "SN1"
+
+    def Connect(self, params):
+        return 0  # Falla: handle 0
+
+    def GetRTLog(self, hcommpro, buffer, size):
+        return self.results.pop(0)
+
+    def PullLastError(self):
+        return self.last_error
+
+
+class Zkem:
+    def __init__(self):
+        self.code = 0
+
+    def GetStrCardNumber(self):
+        return False, ""
+
+    def ACUnlock(self, machine, delay):
+        return False
+
+    def GetSerialNumber(self, machine):
+        raise RuntimeError("COM")
+
+    def GetLastError(self):
+        if self.code is None:
+            raise RuntimeError("sin código")
+        return True, self.code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sdk_metrics, "time", clock)
+    return clock
+
+
+def test_pullsdk_calls_are_timed_and_errors_use_pull_last_error(clock):
+    metrics = SdkMetrics()
+    commpro = Commpro()
+    wrapped = metrics.wrap(commpro, "molinete-1")
+    assert metrics.wrap(wrapped, "otro") is wrapped
+    assert wrapped.serial == "SN1"  # Atributos que no son del SDK pasan sin medir
+    commpro.results = [3, 0, -2]
+    commpro.last_error = -2
+    clock.durations = [500, 3000, 1_500_000, 2000]
+    assert [wrapped.GetRTLog(1, None, 0) for _ in range(3)] == [3, 0, -2]
+    commpro.last_error = -307
+    assert wrapped.Connect(b"") == 0
+    snapshot = metrics.snapshot()
+    count, seconds, errors = snapshot[("molinete-1", "GetRTLog")]
+    assert count == 3 and seconds == pytest.approx(1_503_500e-9)
+    assert errors == {-2: 1}
+    assert snapshot[("molinete-1", "Connect")][2] == {-307: 1}
+    assert "PullLastError" not in {call for _, call in snapshot}
+
+
+def test_com_errors_skip_no_data_codes(clock):
+    metrics = SdkMetrics()
+    zkem = Zkem()
+    wrapped = metrics.wrap_com(zkem, "com-1")
+    clock.durations = [1000] * 4
+    assert wrapped.GetStrCardNumber() == (False, "")  # Código 0: sin tarjeta, no es error
+    zkem.code = -100
+    assert wrapped.ACUnlock(1, 30) is False
+    zkem.code = None
+    with pytest.raises(RuntimeError):
+        wrapped.GetSerialNumber(1)
+    assert wrapped.ACUnlock(1, 30) is False
+    snapshot = metrics.snapshot()
+    assert snapshot[("com-1", "GetStrCardNumber")][2] == {}
+    assert snapshot[("com-1", "ACUnlock")][2] == {-100: 1, "false": 1}
+    assert snapshot[("com-1", "GetSerialNumber")] == (1, 1e-6, {"exception": 1})
+
+
+def parse(text):
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_render_prometheus_histogram_and_error_counters(clock):
+    metrics = SdkMetrics()
+    commpro = Commpro()
+    wrapped = metrics.wrap(commpro, 'sala "A"')
+    commpro.results = [0, 0, 0, -2]
+    commpro.last_error = -2
+    clock.durations = [100, 1500, 3000, 2 ** 12]  # < 2**10, < 2**11, < 2**12, < 2**13 ns
+    for _ in range(4):
+        wrapped.GetRTLog(1, None, 0)
+    text = metrics.render()
+    assert text.endswith("\n")
+    assert "# TYPE zk_sdk_call_duration_seconds histogram" in text
+    assert "# TYPE zk_sdk_call_errors_total counter" in text
+    samples = parse(text)
+    labels = 'device="sala \\"A\\"",call="GetRTLog"'
+
+    def bucket(le):
+        return "zk_sdk_call_duration_seconds_bucket{" + labels + f',le="{le}"}}'
+
+    assert samples[bucket("1.024e-06")] == 1  # Los menores a 1 µs se acumulan en el primero
+    assert samples[bucket("2.048e-06")] == 2
+    assert samples[bucket("4.096e-06")] == 3
+    assert samples[bucket("8.192e-06")] == 4
+    assert samples[bucket("+Inf")] == 4
+    assert bucket("1.6384e-05") not in samples  # Sin cubos vacíos al final
+    assert samples["zk_sdk_call_duration_seconds_count{" + labels + "}"] == 4
+    assert samples["zk_sdk_call_duration_seconds_sum{" + labels + "}"] == pytest.approx(8696e-9)
+    assert samples["zk_sdk_call_errors_total{" + labels + ',code="-2"}'] == 1
+
+
+def test_serve_metrics_over_http():
+    metrics = SdkMetrics(prefix="prueba")
+    commpro = Commpro()
+    commpro.results = [0]
+    metrics.wrap(commpro, "m1").GetRTLog(1, None, 0)
+    server = metrics.serve(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert "version=0.0.4" in response.headers["Content-Type"]
+            body = response.read().decode()
+        assert 'prueba_call_duration_seconds_count{device="m1",call="GetRTLog"} 1' in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/otra")
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from auth_cache import CardAuthCache
+from emulator import EmulatorServer
+from event_journal import EventJournal, pack_body
+from sharded_ingest import RECORD, EventRing, ShardedIngest
+
+FIRST_CARD = 20_000_000
+
+
+def record(n):
+    return pack_body(1_700_000_000 + n, n % 7 + 1, 1, FIRST_CARD + n, 0, 0)
+
+
+def cards(records):
+    return [card for _, card, _, _, _, _ in records]
+
+
+def test_ring_wraps_around():
+    ring = EventRing(4)
+    try:
+        ring.write(b"".join(record(n) for n in range(3)))
+        assert len(ring) == 3
+        assert cards(ring.read()) == [FIRST_CARD, FIRST_CARD + 1, FIRST_CARD + 2]
+        ring.write(b"".join(record(n) for n in range(3, 6)))  # Posiciones 3, 0 y 1
+        assert len(ring) == 3
+        records = ring.read()
+        assert cards(records) == [FIRST_CARD + 3, FIRST_CARD + 4, FIRST_CARD + 5]
+        assert b"".join(RECORD.pack(*fields) for fields in records) == b"".join(record(n) for n in range(3, 6))
+        assert ring.read() == [] and len(ring) == 0
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def test_full_ring_waits_for_the_consumer():
+    ring = EventRing(4)
+    reader = EventRing(4, name=ring.name)
+    try:
+        writer = threading.Thread(target=ring.write, args=(b"".join(record(n) for n in range(10)),))
+        writer.start()
+        time.sleep(0.05)
+        assert writer.is_alive() and len(reader) == 4
+        received = []
+        deadline = time.monotonic() + 2.0
+        while len(received) < 10 and time.monotonic() < deadline:
+            received.extend(reader.read())
+            time.sleep(0.005)
+        writer.join(1.0)
+        assert cards(received) == [FIRST_CARD + n for n in range(10)]
+        assert reader.counters()[0] > 0
+    finally:
+        reader.close()
+        ring.close()
+        ring.unlink()
+
+
+def test_emulator_devices_across_two_processes(tmp_path):
+    devices, taps = 4, 30
+    server = EmulatorServer(devices=devices)
+    for i, emulated in enumerate(server.devices):
+        for n in range(taps):
+            emulated.tap(FIRST_CARD + i * taps + n)
+    server.start_in_thread()
+    total = devices * taps
+    cache = CardAuthCache()
+    for card in range(FIRST_CARD, FIRST_CARD + total, 3):  # Una de cada tres autorizada
+        cache.upsert(card)
+    granted = len(range(FIRST_CARD, FIRST_CARD + total, 3))
+    received = []
+    targets = {i + 1: {"ip_address": "127.0.0.1", "port": port} for i, port in enumerate(server.ports)}
+    ingest = ShardedIngest(targets, processes=2, callback=received.extend, cache=cache,
+                           journal_directory=str(tmp_path), ring_records=8, commpro="socket", verbose=False)
+    try:
+        assert ingest.start() == devices
+        deadline = time.monotonic() + 30.0
+        while ingest.events() < total and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stats = ingest.stop()
+        server.stop()
+
+    assert stats["events"] == total and stats["connected"] == devices and stats["failed"] == 0
+    assert stats["granted"] == granted and stats["denied"] == total - granted
+    assert stats["per_shard"] == [total // 2, total // 2]
+    assert stats["forwarded"] == total and stats["callback_errors"] == 0
+    assert sorted(record.card for record in received) == list(range(FIRST_CARD, FIRST_CARD + total))
+    for record in received:
+        assert (record.card - FIRST_CARD) // taps == record.device_id - 1
+    # Los IDs ordenados se reparten en ronda: el proceso 0 lee 1 y 3, el 1 lee 2 y 4
+    for shard, device_ids in enumerate(((1, 3), (2, 4))):
+        journal = EventJournal(str(tmp_path / f"shard-{shard}"))
+        try:
+            journaled = list(journal.read())
+        finally:
+            journal.close()
+        assert sorted(record.card for record in journaled) == sorted(
+            FIRST_CARD + (device_id - 1) * taps + n for device_id in device_ids for n in range(taps))
+        assert {record.device_id for record in journaled} == set(device_ids)
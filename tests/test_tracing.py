@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from rtlog_parser import RTLogEvent
+from tracing import Tracer, _percentile, load_spans, print_summary, summarize
+
+EVENT = RTLogEvent("2026-10-17 08:00:00", "1", "10000001", 2, 0, 0, 1)
+
+
+def trace_one(tracer, device_id=7, start=10.0):
+    trace = tracer.begin(EVENT, device_id, (start, start + 0.002, start + 0.0025))
+    if trace is not None:
+        current = tracer.current()
+        current.add("authorize", start + 0.003, start + 0.0031)
+        current.add("control", start + 0.0031, start + 0.008)
+    tracer.end()
+    return trace
+
+
+def test_sampled_event_is_written_as_chrome_trace_events(tmp_path):
+    path = tmp_path / "trazas.json"
+    tracer = Tracer(str(path), sample_rate=1.0, flush_every=1000)
+    trace = trace_one(tracer)
+    assert tracer.current() is None
+    assert load_spans(str(path)) == []  # Pendiente hasta flush_every o close
+    tracer.close()
+
+    text = path.read_text(encoding="utf-8")
+    assert text.startswith("[\n") and text.endswith(",\n")  # Arreglo sin cerrar, como admite el formato
+    spans = load_spans(str(path))
+    assert [span["name"] for span in spans] == ["poll", "parse", "wait", "authorize", "control", "access"]
+    assert {span["ph"] for span in spans} == {"X"} and {span["tid"] for span in spans} == {7}
+    assert {span["args"]["event_id"] for span in spans} == {trace.event_id}
+    assert spans[0]["args"] == {"event_id": trace.event_id, "card": "10000001", "door": 2, "event_type": 0}
+    poll, parse, _, authorize, control, access = spans
+    assert poll["ts"] == pytest.approx(10_000_000) and poll["dur"] == pytest.approx(2000)
+    assert parse["ts"] == pytest.approx(10_002_000) and parse["dur"] == pytest.approx(500)
+    assert authorize["dur"] == pytest.approx(100) and control["dur"] == pytest.approx(4900)
+    assert access["ts"] == poll["ts"]  # Desde el inicio de poll hasta end()
+    assert tracer.stats == {"events": 1, "sampled": 1, "spans": 6}
+
+
+def test_unsampled_events_write_nothing_and_files_are_appended(tmp_path):
+    path = tmp_path / "trazas.json"
+    tracer = Tracer(str(path), sample_rate=0.0)
+    assert trace_one(tracer) is None
+    assert tracer.current() is None
+    tracer.close()
+    assert tracer.stats == {"events": 1, "sampled": 0, "spans": 0}
+    assert load_spans(str(path)) == []
+
+    tracer = Tracer(str(path), sample_rate=1.0, flush_every=6)
+    trace_one(tracer)
+    assert len(load_spans(str(path))) == 6  # flush_every alcanzado: ya está en el archivo
+    tracer.close()
+    again = Tracer(str(path), sample_rate=1.0)  # Se agrega sin volver a escribir "["
+    trace_one(again)
+    again.close()
+    assert path.read_text(encoding="utf-8").count("[") == 1
+    assert len(load_spans(str(path))) == 12
+
+
+def test_load_spans_accepts_closed_arrays_and_objects(tmp_path):
+    closed = tmp_path / "cerrado.json"
+    closed.write_text('[{"name": "poll", "ph": "X", "dur": 1000}]', encoding="utf-8")
+    wrapped = tmp_path / "objeto.json"
+    wrapped.write_text('{"traceEvents": [{"name": "poll", "ph": "X", "dur": 1000}]}', encoding="utf-8")
+    bare = tmp_path / "sueltos.json"
+    bare.write_text('{"name": "poll", "ph": "X", "dur": 1000},\n', encoding="utf-8")
+    expected = [{"name": "poll", "ph": "X", "dur": 1000}]
+    assert load_spans(str(closed)) == load_spans(str(wrapped)) == load_spans(str(bare)) == expected
+    bare.write_text('{"name": "poll", "ph": "X", "dur": 1000}', encoding="utf-8")
+    assert load_spans(str(bare)) == expected
+
+
+def test_percentiles_use_the_nearest_rank():
+    values = list(range(1, 101))
+    assert _percentile(values, 0.50) == 50
+    assert _percentile(values, 0.99) == 99
+    assert _percentile(values, 0.07) == 7
+    assert _percentile(list(range(1, 11)), 0.50) == 5
+    assert _percentile([4.0], 0.99) == 4.0
+
+
+def test_summarize_per_stage(tmp_path, capsys):
+    spans = [{"name": "control", "ph": "X", "dur": ms * 1000} for ms in range(100, 0, -1)]
+    spans += [{"name": "access", "ph": "X", "dur": 5000}, {"name": "poll", "ph": "X", "dur": 2000},
+              {"name": "marca", "ph": "i"}]
+    summary = summarize(spans)
+    assert list(summary) == ["poll", "control", "access"]  # Orden de las etapas, no de aparición
+    assert summary["control"] == (100, 50, 99)
+    assert summary["access"] == (1, 5, 5)
+
+    path = tmp_path / "trazas.json"
+    path.write_text("[\n" + "".join(json.dumps(span) + ",\n" for span in spans), encoding="utf-8")
+    assert print_summary(str(path)) == summary
+    output = capsys.readouterr().out
+    assert "1 eventos muestreados" in output
+    assert "control" in output and "99.000" in output
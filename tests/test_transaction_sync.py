@@ -0,0 +1,110 @@
+from device_tables import render_rows, select_rows
+from transaction_sync import TABLE, TransactionSync, Watermark, WatermarkStore
+
+
+class TransactionLog:
+    """Tabla transaction en memoria con el filtro por Time_second del firmware"""
+
+    def __init__(self):
+        self.rows = []
+        self.profile = None
+        self.reads = []
+
+    def punch(self, moment, card):
+        self.rows.append({"Cardno": str(card), "Pin": "1", "Verified": "1", "DoorID": "1", "EventType": "0",
+                          "InOutState": "0", "Time_second": str(moment)})
+
+    def get_device_data_count(self, table, filter_text="", options=""):
+        return len(self.rows)
+
+    def get_device_data(self, table, fields="*", filter_text="", options=""):
+        self.reads.append(filter_text)
+        return render_rows(select_rows(self.rows, filter_text), fields)
+
+
+def make_sync(tmp_path):
+    stored = []
+    store = WatermarkStore(str(tmp_path / "marcas.json"))
+    sync = TransactionSync(store, lambda device_key, rows: stored.extend(int(row["Cardno"]) for row in rows))
+    return sync, store, stored
+
+
+def test_incremental_sync_skips_rows_already_downloaded(tmp_path):
+    device = TransactionLog()
+    for i in range(3):
+        device.punch(1000 + i, i)
+    device.punch(1002, 3)  # Mismo segundo que la anterior
+    sync, store, stored = make_sync(tmp_path)
+    assert sync.sync("m1", device) == 4
+    assert store.get("m1").time == 1002 and len(store.get("m1").keys) == 2 and store.get("m1").count == 4
+
+    device.punch(1002, 4)
+    device.punch(1003, 5)
+    assert sync.sync("m1", device) == 2
+    assert device.reads[-1] == "Time_second>=1002"
+    assert stored == [0, 1, 2, 3, 4, 5]
+    assert sync.sync("m1", device) == 0
+    assert WatermarkStore(store.path).get("m1") == store.get("m1")  # Persistida
+    assert sync.stats["resets"] == 0
+
+
+def test_cleared_log_resets_the_watermark(tmp_path):
+    device = TransactionLog()
+    for i in range(5):
+        device.punch(2000 + i, i)
+    sync, store, stored = make_sync(tmp_path)
+    assert sync.sync("m1", device) == 5
+
+    # Log borrado y reloj atrasado: las marcaciones nuevas son anteriores a la marca
+    device.rows.clear()
+    assert sync.sync("m1", device) == 0
+    assert store.get("m1") == Watermark()
+    device.punch(1500, 10)
+    device.punch(1501, 11)
+    assert sync.sync("m1", device) == 2
+    assert stored[-2:] == [10, 11]
+    assert store.get("m1").time == 1501
+    assert sync.stats["resets"] == 1
+
+
+def test_newest_record_older_than_watermark_resets(tmp_path):
+    device = TransactionLog()
+    for i in range(3):
+        device.punch(5000 + i, i)
+    sync, store, stored = make_sync(tmp_path)
+    assert sync.sync("m1", device) == 3
+
+    # Otro equipo (o el mismo con el reloj atrasado) con más registros, todos anteriores a la marca
+    other = TransactionLog()
+    for i in range(4):
+        other.punch(100 + i, 20 + i)
+    assert sync.sync("m1", other) == 4
+    assert other.reads == ["Time_second>=5002", ""]  # Filtro vacío y luego la tabla completa
+    assert stored[-4:] == [20, 21, 22, 23]
+    assert store.get("m1") == Watermark(103, store.get("m1").keys, 4)
+    assert sync.stats["resets"] == 1
+
+    other.punch(104, 24)
+    assert sync.sync("m1", other) == 1
+    assert stored[-1] == 24
+
+
+def test_host_side_filter_also_detects_an_old_log(tmp_path):
+    device = TransactionLog()
+    device.punch(5000, 1)
+    sync, store, stored = make_sync(tmp_path)
+    sync.sync("m1", device)
+
+    class NoFilterProfile:
+        def works(self, name):
+            return name != "FilteredTransactionRead"
+
+    other = TransactionLog()
+    other.profile = NoFilterProfile()
+    other.punch(10, 2)
+    other.punch(11, 3)
+    assert sync.sync("m1", other) == 2
+    assert other.reads == [""]  # Una sola lectura completa, filtrada en el host y reutilizada
+    assert stored == [1, 2, 3]
+    assert sync.stats["resets"] == 1
+    assert sync.stats["full_reads"] == 1
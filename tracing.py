@@ -0,0 +1,217 @@
+"""
+Trazas muestreadas del recorrido de un evento de acceso: lectura -> decisión -> apertura.
+
+Para una fracción de los eventos (sample_rate) se registra un tramo por etapa,
+todos con el mismo event_id:
+
+- poll: la llamada GetRTLog que trajo el evento
+- parse: el parseo del texto de esa llamada
+- wait: desde el parseo hasta que el callback empieza con este evento
+  (eventos anteriores de la misma tanda)
+- authorize: la consulta al caché de autorizaciones
+- control: el ControlDevice que abre la puerta
+- access: el recorrido completo, desde el inicio de poll hasta el final
+
+Las trazas se escriben en el formato Trace Event de Chrome (arreglo JSON de
+eventos "X"), que abren chrome://tracing y Perfetto. El archivo puede quedar
+sin el "]" final; el formato lo admite y el resumen también.
+
+    tracer = Tracer("trazas.json", sample_rate=0.05)
+    controller = AccessController(device, cache, tracer=tracer)
+    controller.start()
+    ...
+    python tracing.py trazas.json          # p50/p99 por etapa
+    python tracing.py trazas.json --demo   # genera trazas con FakeCommpro y las resume
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+
+STAGES = ("poll", "parse", "wait", "authorize", "control", "access")
+
+
+class Trace:
+    """Tramos de un evento de acceso muestreado"""
+
+    __slots__ = ("event_id", "device_id", "event", "spans")
+
+    def __init__(self, event_id, device_id, event):
+        self.event_id = event_id
+        self.device_id = device_id
+        self.event = event
+        self.spans = []  # (etapa, inicio, fin) en segundos de perf_counter
+
+    def add(self, stage, start, end):
+        self.spans.append((stage, start, end))
+
+
+class Tracer:
+    """Muestrea eventos y escribe sus tramos en un archivo de trazas"""
+
+    def __init__(self, path, sample_rate=0.01, flush_every=256):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_every = flush_every
+        self.stats = {"events": 0, "sampled": 0, "spans": 0}
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() == 0:
+            self._file.write("[\n")
+
+    def begin(self, event, device_id, timings):
+        """Decide si se muestrea el evento que está por despacharse; timings = (inicio de poll,
+        fin de poll, fin de parse). Devuelve la Trace (también queda como actual en este hilo) o None"""
+        self.stats["events"] += 1
+        if random.random() >= self.sample_rate:
+            self._local.trace = None
+            return None
+        poll_start, poll_end, parse_end = timings
+        trace = Trace(next(self._ids), device_id, event)
+        trace.add("poll", poll_start, poll_end)
+        trace.add("parse", poll_end, parse_end)
+        trace.add("wait", parse_end, time.perf_counter())
+        self._local.trace = trace
+        return trace
+
+    def current(self):
+        """Trace del evento que se está procesando en este hilo, o None si no se muestreó"""
+        return getattr(self._local, "trace", None)
+
+    def end(self):
+        """Cierra la traza actual del hilo y la encola para escribirla"""
+        trace = self.current()
+        if trace is None:
+            return
+        self._local.trace = None
+        trace.add("access", trace.spans[0][1], time.perf_counter())
+        event = trace.event
+        args = {"event_id": trace.event_id, "card": event.card, "door": event.door, "event_type": event.event_type}
+        records = [json.dumps({"name": stage, "cat": "access", "ph": "X", "ts": round(start * 1e6, 3),
+                               "dur": round((end - start) * 1e6, 3), "pid": self._pid, "tid": trace.device_id,
+                               "args": args})
+                   for stage, start, end in trace.spans]
+        with self._lock:
+            self.stats["sampled"] += 1
+            self.stats["spans"] += len(records)
+            self._pending.extend(records)
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._file.write(",\n".join(self._pending) + ",\n")
+            self._file.flush()
+            self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+
+
+def load_spans(path):
+    """Eventos de un archivo Trace Event (admite el arreglo sin cerrar y la coma final)"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        text = text.rstrip(",\n ")
+        if not text.endswith("]"):
+            text += "]"
+    else:
+        try:
+            data = json.loads(text)  # Formato objeto: {"traceEvents": [...]}
+        except ValueError:
+            text = "[" + text.rstrip(",\n ") + "]"  # Eventos sueltos sin el "[" inicial
+        else:
+            if isinstance(data, dict) and "traceEvents" in data:
+                return data["traceEvents"]
+            text = f"[{text}]"
+    return json.loads(text)
+
+
+def _percentile(ordered, fraction):
+    """Rango más cercano sobre una lista ordenada: el valor en la posición ceil(fraction * n)"""
+    rank = math.ceil(round(fraction * len(ordered), 9))  # round: 0.07 * 100 = 7.000000000000001
+    return ordered[min(len(ordered) - 1, max(0, rank - 1))]
+
+
+def summarize(spans):
+    """{etapa: (cantidad, p50 ms, p99 ms)} de los tramos completos ("X")"""
+    durations = {}
+    for span in spans:
+        if span.get("ph") == "X":
+            durations.setdefault(span["name"], []).append(span["dur"] / 1000)
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    result = {}
+    for stage in sorted(durations, key=lambda name: order.get(name, len(STAGES))):
+        values = sorted(durations[stage])
+        result[stage] = (len(values), _percentile(values, 0.50), _percentile(values, 0.99))
+    return result
+
+
+def print_summary(path):
+    summary = summarize(load_spans(path))
+    if not summary:
+        print(f"No hay tramos en {path}")
+        return summary
+    events = summary.get("access", (0,))[0]
+    print(f"{events} eventos muestreados en {path}")
+    print(f"{'etapa':<10} {'tramos':>8} {'p50 ms':>10} {'p99 ms':>10}")
+    for stage, (count, p50, p99) in summary.items():
+        print(f"{stage:<10} {count:>8} {p50:>10.3f} {p99:>10.3f}")
+    return summary
+
+
+def _demo(path, taps=300, latency=0.002, sample_rate=0.5):
+    """Acercamientos simulados con FakeCommpro (latencia por llamada) a través de AccessController"""
+    import contextlib
+    import io
+
+    from access_control import AccessController
+    from auth_cache import CardAuthCache
+    from fake_commpro import FakeCommpro
+    from molinete_test import ZKTecoDevice
+
+    tracer = Tracer(path, sample_rate=sample_rate)
+    cache = CardAuthCache()
+    for card in range(10_000_000, 10_000_000 + taps):
+        cache.upsert(card)
+    fake = FakeCommpro(latency=latency)
+    with contextlib.redirect_stdout(io.StringIO()):
+        device = ZKTecoDevice(commpro=fake)
+        device.connect()
+        controller = AccessController(device, cache, open_seconds=1, device_id=1, tracer=tracer)
+        controller.start()
+        for card in range(10_000_000, 10_000_000 + taps):
+            fake.tap(card)
+            time.sleep(0.01)
+        time.sleep(0.5)
+        device.disconnect()
+    tracer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumen de trazas de eventos de acceso (p50/p99 por etapa)")
+    parser.add_argument("archivo", help="archivo de trazas (formato Trace Event)")
+    parser.add_argument("--demo", action="store_true", help="genera trazas simuladas antes de resumir")
+    args = parser.parse_args(argv)
+    if args.demo:
+        _demo(args.archivo)
+    print_summary(args.archivo)
+
+
+if __name__ == "__main__":
+    main()
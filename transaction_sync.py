@@ -0,0 +1,255 @@
+"""
+Descarga incremental de la tabla transaction (historial de marcaciones) de cada dispositivo.
+
+Por cada dispositivo se guarda una marca de agua: el Time_second más nuevo ya
+descargado, las marcaciones de ese mismo segundo (para no duplicarlas ni
+perderlas) y la cantidad de registros que tenía el dispositivo. Cada
+sincronización pide solo "Time_second>=marca" y entrega las filas nuevas en
+lotes a un destino (por ejemplo un EventJournal); la marca se guarda recién
+cuando todos los lotes fueron aceptados, así un corte a mitad de camino
+repite filas en lugar de perderlas.
+
+La marca solo es un instante, así que se valida en cada sincronización y se
+reinicia (se descarga todo el log del dispositivo) cuando:
+- el dispositivo tiene menos registros que la vez anterior (log borrado o
+  reemplazado), o
+- ningún registro llega a la marca: el más nuevo es anterior a ella (reloj
+  atrasado, otro equipo en la misma dirección), y las marcaciones nuevas se
+  saltearían para siempre.
+Un reinicio puede repetir filas ya entregadas, pero no pierde ninguna. Si el
+firmware no acepta el filtro por Time_second, se lee la tabla completa y se
+filtra en el host.
+
+    store = WatermarkStore("marcas.json")
+    sync = TransactionSync(store, journal_sink(journal))
+    sync.sync_all({"molinete-1": device1, "molinete-2": device2})
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from auth_cache import normalize_card
+from device_tables import iter_table_rows
+from event_journal import event_timestamp
+from pullsdk_socket import decode_time
+
+TABLE = "transaction"
+KEY_FIELDS = ("Pin", "Cardno", "DoorID", "EventType", "InOutState", "Verified")
+
+
+class Watermark(NamedTuple):
+    time: int = 0  # Time_second empaquetado de la marcación más nueva descargada
+    keys: tuple = ()  # Marcaciones ya descargadas con ese mismo Time_second
+    count: int = 0  # Registros en el dispositivo en la última sincronización
+
+
+def row_key(row):
+    return "|".join(row.get(field, "") for field in KEY_FIELDS)
+
+
+class WatermarkStore:
+    """Marcas de agua por dispositivo en un archivo JSON (se reemplaza de forma atómica)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._marks = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self._marks = {key: Watermark(value["time"], tuple(value["keys"]), value["count"])
+                               for key, value in json.load(f).items()}
+
+    def get(self, device_key):
+        return self._marks.get(device_key, Watermark())
+
+    def set(self, device_key, watermark):
+        with self._lock:
+            self._marks[device_key] = watermark
+            data = {key: mark._asdict() for key, mark in self._marks.items()}
+            temporary = f"{self.path}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+
+    def reset(self, device_key):
+        """Olvida la marca: la próxima sincronización descarga todo el log"""
+        self.set(device_key, Watermark())
+
+
+def journal_sink(journal, device_ids=None):
+    """Destino que anexa cada lote a un EventJournal; device_ids mapea clave -> id numérico"""
+    def sink(device_key, rows):
+        device_id = device_ids.get(device_key, 0) if device_ids else 0
+        for row in rows:
+            timestamp = event_timestamp(decode_time(int(row.get("Time_second") or 0))) or 0.0
+            journal.append(timestamp, device_id, int(row.get("DoorID") or 0), normalize_card(row.get("Cardno")),
+                           int(row.get("EventType") or 0), int(row.get("InOutState") or 0))
+        journal.commit()
+    return sink
+
+
+class TransactionSync:
+    """Sincroniza la tabla transaction de uno o varios dispositivos contra sus marcas de agua"""
+
+    def __init__(self, store, sink, batch_size=5000, max_workers=8):
+        self.store = store
+        self.sink = sink  # sink(device_key, filas) guarda un lote; una excepción aborta la sincronización
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.stats = {"synced": 0, "rows": 0, "batches": 0, "resets": 0, "full_reads": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def sync(self, device_key, device):
+        """Descarga las marcaciones nuevas de un dispositivo conectado. Devuelve la cantidad, o None si falla"""
+        mark = self.store.get(device_key)
+        count = device.get_device_data_count(TABLE)
+        if count < 0:
+            print(f"No se pudo contar el log de {device_key}. Código: {count}")
+            self._count("errors")
+            return None
+        if count < mark.count:
+            print(f"El log de {device_key} se borró o rotó ({mark.count} -> {count} registros); se descarga completo")
+            self._count("resets")
+            mark = Watermark()
+        if count == 0:
+            self.store.set(device_key, Watermark())
+            return 0
+
+        # Sin intentar el filtro si el perfil del dispositivo ya sabe que el firmware no lo acepta
+        profile = getattr(device, "profile", None)
+        filtered = mark.time and (profile is None or profile.works("FilteredTransactionRead"))
+        data = device.get_device_data(TABLE, filter_text=f"Time_second>={mark.time}") if filtered else None
+        if data is None:
+            if mark.time:
+                self._count("full_reads")
+            filtered = False
+            data = device.get_device_data(TABLE)
+            if data is None:
+                self._count("errors")
+                return None
+
+        result = self._deliver(device_key, data, mark)
+        if result is None:
+            print(f"El registro más nuevo de {device_key} es anterior a la marca de agua; se descarga completo")
+            self._count("resets")
+            mark = Watermark()
+            if filtered:
+                data = device.get_device_data(TABLE)
+                if data is None:
+                    self._count("errors")
+                    return None
+            result = self._deliver(device_key, data, mark)
+        total, newest, newest_keys = result
+
+        self.store.set(device_key, Watermark(newest, tuple(sorted(newest_keys)), count))
+        self._count("synced")
+        return total
+
+    def _deliver(self, device_key, data, mark):
+        """Entrega en lotes las filas posteriores a la marca: (filas, Time_second más nuevo, sus claves).
+
+        None si ninguna fila llega a la marca (no se entregó nada y la marca ya no sirve).
+        """
+        seen = set(mark.keys)
+        newest, newest_keys = mark.time, set(mark.keys)
+        current = False  # Alguna fila llega a la marca (con >= siempre vuelven las del mismo segundo)
+        batch = []
+        total = 0
+        for row in iter_table_rows(data):
+            moment = int(row.get("Time_second") or 0)
+            if moment < mark.time:
+                continue  # Filtro aplicado en el host (firmware sin filtro por Time_second)
+            current = True
+            key = row_key(row)
+            if moment == mark.time and key in seen:
+                continue
+            if moment > newest:
+                newest, newest_keys = moment, {key}
+            elif moment == newest:
+                newest_keys.add(key)
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                total += self._flush(device_key, batch)
+                batch = []
+        if batch:
+            total += self._flush(device_key, batch)
+        if mark.time and not current:
+            return None
+        return total, newest, newest_keys
+
+    def _flush(self, device_key, rows):
+        self.sink(device_key, rows)
+        self._count("batches")
+        self._count("rows", len(rows))
+        return len(rows)
+
+    def sync_all(self, devices):
+        """Sincroniza {clave: dispositivo} en paralelo. Devuelve {clave: filas nuevas o None}"""
+        def run(item):
+            device_key, device = item
+            try:
+                return device_key, self.sync(device_key, device)
+            except Exception as e:
+                print(f"Error al sincronizar {device_key}: {e}")
+                self._count("errors")
+                return device_key, None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="transaction-sync") as executor:
+            return dict(executor.map(run, devices.items()))
+
+
+def _demo(devices=20, records=100_000):
+    """Primera descarga completa contra el emulador y luego solo las marcaciones nuevas"""
+    import contextlib
+    import io
+    import tempfile
+    from datetime import datetime
+
+    from emulator import EmulatorServer
+    from molinete_test import ZKTecoDevice
+    from pullsdk_socket import SocketCommpro, encode_time
+
+    server = EmulatorServer(devices=devices, users=100, transaction_capacity=records).start_in_thread()
+    oldest = encode_time(datetime.now()) - records // devices
+    for emulated in server.devices:
+        for _ in range(records // devices):
+            emulated.tap()
+        for offset, row in enumerate(emulated.tables[TABLE]):  # Historial repartido en el tiempo
+            row["Time_second"] = str(oldest + offset)
+    commpro = SocketCommpro()
+    handles = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, port in enumerate(server.ports):
+            device = ZKTecoDevice(commpro=commpro)
+            device.connect(ip_address=server.host, port=port)
+            handles[f"molinete-{i}"] = device
+
+    stored = []
+    store = WatermarkStore(os.path.join(tempfile.mkdtemp(prefix="sync-"), "marcas.json"))
+    sync = TransactionSync(store, lambda device_key, rows: stored.extend(rows))
+    for label in ("primera sincronización", "sin novedades", "con 50 marcaciones nuevas"):
+        if label.startswith("con"):
+            for _ in range(50):
+                server.call_in_loop(server.devices[0].tap)
+            time.sleep(0.1)
+        start = time.perf_counter()
+        results = sync.sync_all(handles)
+        print(f"{label}: {sum(results.values()):,} filas en {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"Guardadas: {len(stored):,}  Estadísticas: {sync.stats}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        for device in handles.values():
+            device.disconnect()
+    server.stop()
+
+
+if __name__ == "__main__":
+    _demo()